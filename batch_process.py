@@ -0,0 +1,266 @@
+''' Headless batch processing: decode telemetry, drop duplicate packets, reassemble
+    status, burst and survey products, and write them out -- no Tk, no display.
+
+    e.g., nightly reprocessing of a directory of downlinks:
+        python batch_process.py --in_dir /data/raw --out_dir /data/processed --format xml npz
+
+    or of a time range out of the packet database:
+        python batch_process.py --db packets.db --t1 2020-05-15T00:00:00 --t2 2020-05-16T00:00:00
+
+    A JSON summary (counts, and the time spent in each stage) is printed to stdout,
+    or written to --summary. The exit code is one of the EXIT_* values below.
+'''
+import os
+import sys
+import time
+import json
+import pickle
+import logging
+import argparse
+import datetime
+import contextlib
+import dateutil.parser
+from concurrent.futures import ProcessPoolExecutor
+from scipy.io import savemat
+
+from data_handlers import decode_packets_TLM, decode_packets_CSV, decode_status, decode_survey_data
+from data_handlers import decode_burst_data_between_status_packets, decode_burst_data_by_trailing_status_packet
+from data_handlers import decode_burst_data_by_experiment_number, decode_burst_data_in_range
+from data_handlers import parse_burst_command, remove_scratch_files
+from file_handlers import write_survey_XML, write_burst_XML, write_status_XML, write_products_npz
+from db_handlers import get_packets_within_range
+from packet_handlers import PacketDedupeIndex, PacketStore
+from lshell_handlers import attach_lshell
+
+EXIT_OK = 0         # Everything ran
+EXIT_FAILED = 1     # A stage raised an error (see the summary)
+EXIT_USAGE = 2      # Bad arguments, or missing input (same code argparse uses)
+EXIT_NO_DATA = 3    # Ran fine, but there were no packets in the input
+
+BURST_MODES = ['status', 'trailing', 'exp_num', 'timestamps']
+
+OUTPUT_FORMATS = ['xml', 'mat', 'pkl', 'npz']   # (also the file suffixes)
+
+# (output name, products key, XML writer, Matlab variable name)
+PRODUCT_OUTPUTS = [('survey_data', 'survey', write_survey_XML, 'survey_data'),
+                   ('burst_data',  'burst',  write_burst_XML,  'burst_data'),
+                   ('status_data', 'status', write_status_XML, 'status_messages')]
+
+@contextlib.contextmanager
+def timed_stage(summary, name):
+    ''' Records the wall time of a stage in summary['stages'][name]['seconds'] '''
+    logger = logging.getLogger(__name__ + '.timed_stage')
+    stage = summary['stages'].setdefault(name, dict())
+    logger.info(f'--- {name} ---')
+    tic = time.perf_counter()
+    try:
+        yield stage
+    finally:
+        stage['seconds'] = round(time.perf_counter() - tic, 4)
+        logger.info(f'{name}: {stage["seconds"]:.2f} sec')
+
+def decode_file(task):
+    ''' Decodes one .tlm or .csv file. (A process pool task: task = (data_root, fname)) '''
+    data_root, fname = task
+    if fname.endswith('.tlm'):
+        return decode_packets_TLM(data_root, fname)
+    return decode_packets_CSV(data_root, fname)
+
+def decode_directory(in_dir, workers=None, do_tlm=True, do_csv=True):
+    ''' Decodes every telemetry file in a directory, one file per worker process.
+        Returns a list of (filename, packets), in filename order. '''
+    logger = logging.getLogger(__name__ + '.decode_directory')
+
+    fnames = sorted(x for x in os.listdir(in_dir)
+                    if (do_tlm and x.endswith('.tlm')) or (do_csv and x.endswith('.csv')))
+    logger.info(f'found {len(fnames)} telemetry files in {in_dir}')
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(fnames)))
+
+    tasks = [(in_dir, fname) for fname in fnames]
+    if workers == 1:
+        results = [decode_file(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(decode_file, tasks))
+    return list(zip(fnames, results))
+
+def decode_bursts(packets, args):
+    ''' Reassembles bursts using the selected grouping '''
+    kw = dict(workers=args.workers, scratch_dir=args.scratch_dir)
+    if args.burst_mode == 'status':
+        return decode_burst_data_between_status_packets(packets, **kw)
+    if args.burst_mode == 'trailing':
+        return decode_burst_data_by_trailing_status_packet(packets, **kw)
+
+    burst_cmd = parse_burst_command(args.burst_cmd) if args.burst_cmd else None
+    if args.burst_mode == 'exp_num':
+        return decode_burst_data_by_experiment_number(packets, burst_cmd=burst_cmd,
+                                                      burst_pulses=args.burst_pulses, **kw)
+    ta, tb = args.t1.timestamp(), args.t2.timestamp()
+    return decode_burst_data_in_range(packets.time_range(ta, tb), ta, tb, burst_cmd=burst_cmd,
+                                      burst_pulses=args.burst_pulses, **kw)
+
+def write_products(products, out_dir, formats):
+    ''' Writes each type of product in each format. Returns the files written. '''
+    logger = logging.getLogger(__name__ + '.write_products')
+    written = []
+    for name, key, write_XML, mat_name in PRODUCT_OUTPUTS:
+        outdata = products.get(key)
+        if not outdata:
+            continue
+        for fmt in formats:
+            outpath = os.path.join(out_dir, f'{name}.{fmt}')
+            logger.info(f'saving {len(outdata)} {key} products to {outpath}')
+            if fmt == 'xml':
+                write_XML(outdata, outpath)
+            elif fmt == 'mat':
+                savemat(outpath, {mat_name: outdata})
+            elif fmt == 'pkl':
+                with open(outpath, 'wb') as file:
+                    pickle.dump(outdata, file)
+            elif fmt == 'npz':
+                write_products_npz(outdata, outpath)
+            written.append(outpath)
+    return written
+
+def run(args):
+    ''' Runs the whole pipeline. Returns (exit code, summary dictionary) '''
+    logger = logging.getLogger(__name__ + '.run')
+
+    summary = {'source': args.in_dir or args.db,
+               't1': args.t1.isoformat() if args.t1 else None,
+               't2': args.t2.isoformat() if args.t2 else None,
+               'workers': args.workers,
+               'formats': args.format,
+               'stages': dict(),
+               'outputs': []}
+    tic = time.perf_counter()
+    products = dict()
+
+    try:
+        with timed_stage(summary, 'decode') as stage:
+            if args.in_dir:
+                batches = decode_directory(args.in_dir, args.workers, do_tlm=not args.no_tlm, do_csv=not args.no_csv)
+                stage['files'] = len(batches)
+            else:
+                batches = [(args.db, get_packets_within_range(args.db, t1=args.t1, t2=args.t2))]
+            stage['packets'] = sum(len(b) for _, b in batches)
+
+        with timed_stage(summary, 'dedupe') as stage:
+            index = PacketDedupeIndex()
+            packets = PacketStore()
+            for source, batch in batches:
+                packets.extend(index.add(batch, source=source))
+            if args.in_dir and (args.t1 or args.t2):
+                packets = PacketStore(packets.time_range(args.t1.timestamp() if args.t1 else None,
+                                                         args.t2.timestamp() if args.t2 else None))
+            stage['packets'] = len(packets)
+            stage['duplicates'] = sum(st['duplicates'] for st in index.stats.values())
+            logger.info(index.overlap_report())
+
+        if not packets:
+            logger.warning('No packets to process')
+            summary['status'] = 'no_data'
+            return EXIT_NO_DATA, summary
+
+        with timed_stage(summary, 'status') as stage:
+            products['status'] = decode_status(packets)
+            stage['products'] = len(products['status'])
+
+        if not args.no_burst:
+            with timed_stage(summary, 'burst') as stage:
+                products['burst'], unused = decode_bursts(packets, args)
+                attach_lshell(products['burst'])
+                stage['products'] = len(products['burst'])
+                stage['unused_packets'] = len(unused)
+
+        if not args.no_survey:
+            with timed_stage(summary, 'survey') as stage:
+                products['survey'], unused = decode_survey_data(packets)
+                attach_lshell(products['survey'])
+                stage['products'] = len(products['survey'])
+                stage['unused_packets'] = len(unused)
+
+        with timed_stage(summary, 'write') as stage:
+            os.makedirs(args.out_dir, exist_ok=True)
+            summary['outputs'] = write_products(products, args.out_dir, args.format)
+            stage['files'] = len(summary['outputs'])
+
+    except Exception as e:
+        logger.exception('Processing failed')
+        summary['status'] = 'failed'
+        summary['error'] = f'{type(e).__name__}: {e}'
+        return EXIT_FAILED, summary
+
+    finally:
+        if args.scratch_dir and products.get('burst'):
+            # The out-of-core burst arrays have been written out (or the run failed): don't leave them behind
+            remove_scratch_files(products['burst'])
+        summary['total_seconds'] = round(time.perf_counter() - tic, 4)
+
+    summary['status'] = 'ok'
+    return EXIT_OK, summary
+
+def parse_time(s):
+    ''' ISO-ish time string -> UTC datetime '''
+    return dateutil.parser.parse(s).replace(tzinfo=datetime.timezone.utc)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="VPM Ground Support Software -- headless batch processing")
+
+    g = parser.add_mutually_exclusive_group(required=True)
+    g.add_argument("--in_dir", "--input", "-i", type=str, help="directory of .tlm / .csv telemetry files")
+    g.add_argument("--db", type=str, help="packet database to load from (use --t1 / --t2 to pick a time range)")
+
+    parser.add_argument("--out_dir", "--output", "-o", type=str, default='output', help="output directory")
+    parser.add_argument("--format", nargs='+', choices=OUTPUT_FORMATS, default=['xml'],
+                        help="output format(s): xml, mat (Matlab), pkl (pickle), npz (binary numpy archive)")
+    parser.add_argument("--t1", type=parse_time, default=None, help="start of the time range (header timestamps, UTC)")
+    parser.add_argument("--t2", type=parse_time, default=None, help="end of the time range (header timestamps, UTC)")
+    parser.add_argument("--workers", "-j", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--scratch_dir", type=str, default=None, help="reassemble bursts out-of-core, in this directory (its burst files are removed at the end of the run)")
+
+    parser.add_argument("--burst_mode", choices=BURST_MODES, default='status',
+                        help="how to group burst packets: between status packets, by trailing status packet, "
+                             "by experiment number, or everything between --t1 and --t2")
+    parser.add_argument("--burst_cmd", type=str, default=None, help="burst command, for exp_num / timestamps modes (default: the command echoed in the GPS packets)")
+    parser.add_argument("--burst_pulses", type=int, default=None, help="number of burst pulses, for exp_num / timestamps modes")
+
+    parser.add_argument("--no_tlm", action='store_true', help="skip .tlm files")
+    parser.add_argument("--no_csv", action='store_true', help="skip .csv files")
+    parser.add_argument("--no_burst", action='store_true', help="don't reassemble bursts")
+    parser.add_argument("--no_survey", action='store_true', help="don't reassemble survey data")
+
+    parser.add_argument("--summary", type=str, default='-', help="where to write the JSON summary ('-' for stdout)")
+    parser.add_argument("--logfile", type=str, default=None, help="log filename. If not provided, output is logged to stderr")
+    parser.add_argument("--debug", action='store_true', help="Debug mode (extra chatty)")
+
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO, filename=args.logfile,
+                        format='[%(name)s]\t%(levelname)s\t%(message)s')
+
+    # Catch what we can before doing any work
+    if args.in_dir and not os.path.isdir(args.in_dir):
+        parser.error(f'cannot find input directory {args.in_dir}')
+    if args.db and not os.path.exists(args.db):
+        parser.error(f'cannot find database {args.db}')
+    if args.burst_mode == 'timestamps' and not (args.t1 and args.t2):
+        parser.error('--burst_mode timestamps needs --t1 and --t2')
+
+    code, summary = run(args)
+    summary['exit_code'] = code
+
+    if args.summary == '-':
+        json.dump(summary, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.summary, 'w') as f:
+            json.dump(summary, f, indent=2)
+    return code
+
+if __name__ == '__main__':
+    sys.exit(main())
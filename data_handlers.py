@@ -2,15 +2,156 @@ import numpy as np
 import pickle
 import datetime
 import logging
-from scipy.io import loadmat
 import os
 import struct
 import csv
-import scipy.stats
 import itertools
+import time
+import tempfile
+import functools
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8 -- bursts get pickled across to worker processes instead
+    shared_memory = None
 
 global console_log
 
+# ------- Bit-field tables -------
+# Status packet fields: (name, first byte, number of bytes, bit shift, bit width).
+# Multi-byte words are little-endian. Listed in the order they appear in decode_status's output.
+STATUS_LENGTH = 70
+STATUS_FIELDS = [
+    ('total_commands',     16, 2,  0, 16),
+    ('gps_resets',         20, 4,  0,  3),
+    ('e_deployer_counter', 20, 4, 28,  4),
+    ('b_deployer_counter', 20, 4, 24,  4),
+    ('arm_e',              20, 4, 18,  1),
+    ('arm_b',              20, 4, 17,  1),
+    ('gps_enable',         20, 4, 16,  1),
+    ('e_enable',           20, 4,  5,  1),
+    ('b_enable',           20, 4,  4,  1),
+    ('lcs_enable',         20, 4,  3,  1),
+    ('survey_period',      20, 4,  6,  2),  # index into SURVEY_PERIODS
+    ('burst_pulses',       20, 4,  8,  8),
+    ('survey_total',       24, 4,  0, 32),
+    ('E_total',            28, 4,  0, 32),
+    ('B_total',            32, 4,  0, 32),
+    ('LCS_total',          36, 4,  0, 32),
+    ('GPS_total',          40, 4,  0, 32),
+    ('status_total',       44, 4,  0, 32),
+    ('E_exp_num',          51, 1,  0,  8),
+    ('B_exp_num',          50, 1,  0,  8),
+    ('LCS_exp_num',        49, 1,  0,  8),
+    ('GPS_exp_num',        48, 1,  0,  8),
+    ('survey_exp_num',     55, 1,  0,  8),
+    ('uptime',             56, 4,  0, 32),
+    ('total_bytes_out',    60, 4,  0, 32),
+    ('bytes_in_memory',    64, 4,  0, 32),  # in 4-byte words
+    ('GPS_errors',         68, 2,  0, 16),
+]
+# Survey period bits: 4096 takes precedence over 2048; neither set means 1024
+SURVEY_PERIODS = np.array([1024, 2048, 4096, 4096])
+
+# Three-byte command fields: (name, bit shift, bit width), in a word packed most-significant byte first
+BURST_COMMAND_FIELDS = [
+    ('TD_FD_SELECT',    21, 1),
+    ('WINDOWING',       20, 1),
+    ('WINDOW_MODE',     16, 4),
+    ('DECIMATE_ON',     15, 1),
+    ('DECIMATION_MODE', 13, 2),
+]
+UBBR_COMMAND_FIELDS = [
+    ('E_FILT',   21, 1),
+    ('B_FILT',   20, 1),
+    ('E_CAL',    19, 1),
+    ('B_CAL',    18, 1),
+    ('E_PRE',    17, 1),
+    ('B_PRE',    16, 1),
+    ('E_RST',    15, 1),
+    ('B_RST',    14, 1),
+    ('E_GAIN',   13, 1),
+    ('B_GAIN',   12, 1),
+    ('CALTONE',  11, 1),
+    ('SIG_GEN',  10, 1),
+    ('TONETYPE',  9, 1),
+]
+
+# Table of samples on and off, for time and frequency domain, indexed by WINDOW_MODE
+TD_SAMPLES_ON  = np.array([10, 10, 10, 10,  5,  5, 5, 5,  2,  2, 2, 2,  1,  1, 1, 1])*80000
+TD_SAMPLES_OFF = np.array([30, 10,  5,  2, 30, 10, 5, 2, 30, 10, 5, 2, 30, 10, 5, 2])*80000
+FD_SAMPLES_ON  = np.array([1563, 1563, 1563, 1563,  782,  782, 782, 782,  313,  313, 313, 313,  157,  157, 157, 157])
+FD_SAMPLES_OFF = np.array([4688, 1563,  782,  313, 4688, 1563, 782, 313, 4688, 1563, 782, 313, 4688, 1563, 782, 313])
+DECIMATION_FACTORS = np.array([2, 4, 8, 16])
+
+# Bit-reversed value of each byte
+REVERSED_BYTES = np.array([int(format(x, '08b')[::-1], 2) for x in range(256)])
+
+def extract_bits(words, shift, width):
+    ''' Pulls a width-bit field starting at bit shift out of an int, or an array of ints '''
+    return (words >> shift) & ((1 << width) - 1)
+
+def decode_bit_fields(raw, fields):
+    ''' Decodes a table of bit fields (name, first byte, number of bytes, shift, width)
+        from every row of raw -- an (N, bytes) uint8 array -- at once.
+        Returns a dict of int64 arrays, one per field. '''
+    raw = np.asarray(raw, dtype=np.uint8)
+    words = dict()
+    out = dict()
+    for name, first, n_bytes, shift, width in fields:
+        if (first, n_bytes) not in words:
+            word = np.zeros(len(raw), dtype=np.int64)
+            for j in range(n_bytes):
+                word |= raw[:, first + j].astype(np.int64) << (8*j)
+            words[(first, n_bytes)] = word
+        out[name] = extract_bits(words[(first, n_bytes)], shift, width)
+    return out
+
+def command_word(cmd):
+    ''' Packs a command (a sequence of bytes, most significant first) into an int '''
+    word = 0
+    for x in cmd:
+        word = (word << 8) | (int(x) & 0xFF)
+    return word
+
+def decode_status_fields(packets):
+    ''' Vectorized core of decode_status: decodes every status packet in the list in one go.
+
+        Returns a dict of arrays, one entry per status packet, with the same keys as the
+        decode_status dictionaries (less burst_config and bbr_config). Status packets too
+        short to decode are skipped, with a warning.
+    '''
+    logger = logging.getLogger(__name__ +'.decode_status')
+
+    rows = []
+    timestamps = []
+    for p in filter(lambda packet: packet['dtype'] == 'I', packets):
+        data = p['data'][:p['bytecount']]
+        if len(data) < STATUS_LENGTH:
+            logger.warning(f'Failed to decode a status packet')
+            continue
+        rows.append(data[:STATUS_LENGTH])
+        timestamps.append(p['header_timestamp'])
+
+    raw = np.array(rows, dtype=np.uint8).reshape(-1, STATUS_LENGTH)
+    fields = decode_bit_fields(raw, STATUS_FIELDS)
+
+    out = dict()
+    out['header_timestamp'] = np.array(timestamps, dtype=float)
+    out['source'] = raw[:,3].astype(np.uint32).view('U1')
+    out['prev_command'] = np.ascontiguousarray(raw[:,2::-1])
+    out['prev_bbr_command'] = np.ascontiguousarray(raw[:,6:3:-1])
+    out['prev_burst_command'] = np.ascontiguousarray(raw[:,14:11:-1])
+    out.update(fields)
+    out['survey_period'] = SURVEY_PERIODS[fields['survey_period']]
+    out['bytes_in_memory'] = 4*fields['bytes_in_memory']
+    out['mem_percent_full'] = 100.*out['bytes_in_memory']/(128.*1024*1024)
+
+    return out
+
 def decode_status(packets):
     '''
     Author:     Austin Sousa
@@ -27,112 +168,17 @@ def decode_status(packets):
         Use "print_status(list)" to print a nice string
     '''
 
-    logger = logging.getLogger(__name__ +'.decode_status')
-
+    fields = decode_status_fields(packets)
 
+    # Back out to one dictionary per status packet
+    columns = {k: (v if v.ndim > 1 else v.tolist()) for k, v in fields.items()}
     out_data = []
+    for i in range(len(fields['header_timestamp'])):
+        out_dict = {k: v[i] for k, v in columns.items()}
+        out_dict['burst_config'] = decode_burst_command(out_dict['prev_burst_command'])
+        out_dict['bbr_config'] = decode_uBBR_command(out_dict['prev_bbr_command'])
+        out_data.append(out_dict)
 
-    # get status packets    
-    for p in filter(lambda packet: packet['dtype'] == 'I', packets):
-        try:
-            data = p['data'][:p['bytecount']]
-
-            source = chr(data[3])
-            prev_command = np.array(np.flip(data[0:3]), dtype=np.uint8)
-            prev_bbr_command = np.array(np.flip(data[4:7]), dtype=np.uint8)
-            prev_burst_command = np.array(np.flip(data[12:15]), dtype=np.uint8)
-            total_commands = data[16] + 256*data[17]
-            
-            system_config = np.flip(data[20:24])
-
-            # Cast it to a binary string
-            system_config = ''.join("{0:8b}".format(a) for a in system_config).replace(' ','0')
-
-            gps_resets = int(system_config[29:32],base=2)
-            e_deployer_counter = int(system_config[0:4],base=2)
-            b_deployer_counter = int(system_config[4:8],base=2)
-            arm_e = int(system_config[13])
-            arm_b = int(system_config[14])
-            gps_enable = int(system_config[15])
-            e_enable = int(system_config[26])
-            b_enable = int(system_config[27])
-            lcs_enable=int(system_config[28])
-
-
-            if system_config[24]=='1':
-                survey_period = 4096;
-            elif system_config[25]=='1':
-                survey_period = 2048;
-            else:
-                survey_period = 1024;
-
-            burst_pulses = int(system_config[16:24],base=2)
-
-            # print(gps_resets)
-            survey_total = data[24] + pow(2,8)*data[25] + pow(2,16)*data[26] + pow(2,24)*data[27];
-            E_total = data[28] + pow(2,8)*data[29] + pow(2,16)*data[30] + pow(2,24)*data[31];
-            B_total = data[32] + pow(2,8)*data[33] + pow(2,16)*data[34] + pow(2,24)*data[35];
-            LCS_total = data[36] + pow(2,8)*data[37] + pow(2,16)*data[38] + pow(2,24)*data[39];
-            GPS_total = data[40] + pow(2,8)*data[41] + pow(2,16)*data[42] + pow(2,24)*data[43];
-            status_total = data[44] + pow(2,8)*data[45] + pow(2,16)*data[46] + pow(2,24)*data[47];
-            E_exp_num = data[51];
-            B_exp_num = data[50];
-            LCS_exp_num = data[49];
-            GPS_exp_num = data[48];
-            survey_exp_num = data[55];
-            uptime = data[56]+ pow(2,8)*data[57] + pow(2,16)*data[58] + pow(2,24)*data[59]
-            total_bytes_out = data[60] + pow(2,8)*data[61] + pow(2,16)*data[62] + pow(2,24)*data[63];
-            bytes_in_memory = 4*(data[64] + pow(2,8)*data[65] + pow(2,16)*data[66] + pow(2,24)*data[67]);
-            GPS_errors = data[68] + pow(2,8)*data[69];
-
-            mem_percent_full = 100.*(bytes_in_memory)/(128.*1024*1024);
-
-            # # Decode the burst command:
-            # cfg = decode_burst_command(prev_burst_command)
-
-            out_dict = dict()
-            out_dict['header_timestamp'] = p['header_timestamp']
-            out_dict['source'] = source
-            out_dict['prev_command'] = prev_command
-            out_dict['prev_bbr_command'] = prev_bbr_command
-            out_dict['prev_burst_command'] = prev_burst_command
-            out_dict['total_commands'] = total_commands
-            out_dict['gps_resets'] = gps_resets
-            out_dict['e_deployer_counter'] = e_deployer_counter
-            out_dict['b_deployer_counter'] = b_deployer_counter
-            out_dict['arm_e'] = arm_e
-            out_dict['arm_b'] = arm_b
-            out_dict['gps_enable'] = gps_enable
-            out_dict['e_enable'] = e_enable
-            out_dict['b_enable'] = b_enable
-            out_dict['lcs_enable'] = lcs_enable
-            out_dict['survey_period'] = survey_period
-            out_dict['burst_pulses'] = burst_pulses
-            out_dict['survey_total'] = survey_total
-            out_dict['E_total'] = E_total
-            out_dict['B_total'] = B_total
-            out_dict['LCS_total'] = LCS_total
-            out_dict['GPS_total'] = GPS_total
-            out_dict['status_total'] = status_total
-            out_dict['E_exp_num'] = E_exp_num
-            out_dict['B_exp_num'] = B_exp_num
-            out_dict['LCS_exp_num'] = LCS_exp_num
-            out_dict['GPS_exp_num'] = GPS_exp_num
-            out_dict['survey_exp_num'] = survey_exp_num
-            out_dict['uptime'] = uptime
-            out_dict['total_bytes_out'] = total_bytes_out
-            out_dict['bytes_in_memory'] = bytes_in_memory
-            out_dict['GPS_errors'] = GPS_errors
-            out_dict['mem_percent_full'] = mem_percent_full
-
-            out_dict['burst_config'] = decode_burst_command(prev_burst_command)
-            out_dict['bbr_config'] = decode_uBBR_command(prev_bbr_command)
-
-            # out_data.append(nice_str)
-            out_data.append(out_dict)
-
-        except:
-            logger.warning(f'Failed to decode a status packet')
     return out_data
 
 def print_status(data_list):
@@ -232,53 +278,50 @@ def decode_burst_command(cmd):
     '''
     logger = logging.getLogger(__name__ +'.decode_burst_command')
 
+    # (lazy formatting -- this gets called once per status packet)
+    logger.debug('decoding command: %s', cmd)
+    cmd_bytes = tuple(int(x) for x in cmd)
 
-    logger.debug(f'decoding command: {cmd}')
-    cmd_str = ''.join("{0:8b}".format(x) for x in cmd).replace(' ','0')
-    
-    if not cmd_str[0:2]=='01':
+    if (cmd_bytes[0] >> 6) != 1:
         logger.warning(f'invalid DPU command: {cmd}')
 
-    burst_cmd = dict()
-    burst_cmd['str'] = cmd_str
-    burst_cmd['TD_FD_SELECT'] = int(cmd_str[2])
-    burst_cmd['WINDOWING'] = int(cmd_str[3])
-    burst_cmd['WINDOW_MODE'] = int(cmd_str[4:8],2)
-    burst_cmd['DECIMATE_ON'] = int(cmd_str[8])
-    burst_cmd['DECIMATION_MODE'] = int(cmd_str[9:11],2)
-    burst_cmd['BINS'] = cmd_str[8:24];
+    # Cached per command; hand back a copy, since callers like to add to it
+    return dict(_decode_burst_command(cmd_bytes))
 
+@functools.lru_cache(maxsize=1024)
+def _decode_burst_command(cmd_bytes):
+    ''' decode_burst_command, on a tuple of 3 bytes '''
+    word = command_word(cmd_bytes)
 
-    # Generate derived parameters:
-    # Table of samples on and off, for time and frequency domain
-    td_samples_on_vec  = np.array([10, 10, 10, 10,  5,  5, 5, 5,  2,  2, 2, 2,  1,  1, 1, 1])*80000;
-    td_samples_off_vec = np.array([30, 10,  5,  2, 30, 10, 5, 2, 30, 10, 5, 2, 30, 10, 5, 2])*80000;
-    fd_samples_on_vec  = np.array([1563, 1563, 1563, 1563,  782,  782, 782, 782,  313,  313, 313, 313,  157,  157, 157, 157])
-    fd_samples_off_vec = np.array([4688, 1563,  782,  313, 4688, 1563, 782, 313, 4688, 1563, 782, 313, 4688, 1563, 782, 313]) 
-    decimation_factors = np.array([2, 4, 8, 16])
+    burst_cmd = dict()
+    burst_cmd['str'] = ''.join(format(x, '08b') for x in cmd_bytes)
+    for name, shift, width in BURST_COMMAND_FIELDS:
+        burst_cmd[name] = extract_bits(word, shift, width)
+    burst_cmd['BINS'] = format(extract_bits(word, 0, 16), '016b')
 
+    # Generate derived parameters:
     if burst_cmd['TD_FD_SELECT']==1:
         # Time-domain burst
         if burst_cmd['WINDOWING'] == 1:
-            burst_cmd['SAMPLES_ON']  = td_samples_on_vec[burst_cmd['WINDOW_MODE']]
-            burst_cmd['SAMPLES_OFF'] = td_samples_off_vec[burst_cmd['WINDOW_MODE']]
+            burst_cmd['SAMPLES_ON']  = TD_SAMPLES_ON[burst_cmd['WINDOW_MODE']]
+            burst_cmd['SAMPLES_OFF'] = TD_SAMPLES_OFF[burst_cmd['WINDOW_MODE']]
         else:
             burst_cmd['SAMPLES_ON'] = 30*80000;
             burst_cmd['SAMPLES_OFF'] = 0;
 
         if burst_cmd['DECIMATE_ON'] ==1:
-            burst_cmd['DECIMATION_FACTOR'] = decimation_factors[burst_cmd['DECIMATION_MODE']]
+            burst_cmd['DECIMATION_FACTOR'] = DECIMATION_FACTORS[burst_cmd['DECIMATION_MODE']]
 
     if burst_cmd['TD_FD_SELECT'] ==0:
         # Frequency-domain burst
         if burst_cmd['WINDOWING'] == 1:
-            burst_cmd['FFTS_ON']  = fd_samples_on_vec[burst_cmd['WINDOW_MODE']]
-            burst_cmd['FFTS_OFF'] = fd_samples_off_vec[burst_cmd['WINDOW_MODE']]
+            burst_cmd['FFTS_ON']  = FD_SAMPLES_ON[burst_cmd['WINDOW_MODE']]
+            burst_cmd['FFTS_OFF'] = FD_SAMPLES_OFF[burst_cmd['WINDOW_MODE']]
         else:
             burst_cmd['FFTS_ON'] = 4688;
             burst_cmd['FFTS_OFF']= 0;
 
-    return burst_cmd;
+    return burst_cmd
 
 def generate_burst_command(burst_config):
     # The inverse. Pass in a burst configuration, get an appropriate command!
@@ -300,27 +343,56 @@ def generate_burst_command(burst_config):
 
     cmd_str = cmd_str.tobytes()
 
-    return(cmd_str) 
+    return(cmd_str)
+
+def parse_burst_command(inp_str):
+    ''' Parse a burst command typed in by hand: a hex string ('0x......'),
+        a 24-character binary string, or three ints separated by commas or spaces '''
+    logger = logging.getLogger(__name__ + '.parse_burst_command')
+    inp_str = inp_str.strip(' []{}\t')
+
+    logger.info(f'inp_str: {inp_str}')
+    if inp_str.startswith('0x'):
+        # Hex string
+        logger.info('hex')
+        cmd = [int(inp_str[2:4], 16),int(inp_str[4:6], 16),int(inp_str[6:8], 16)]
+    elif len(inp_str) == 24:
+        # Binary ascii string
+        logger.info('binary')
+        cmd = [int(inp_str[0:8],2), int(inp_str[8:16],2), int(inp_str[16:],2)]
+    else:
+        # 3 ints:
+        logger.info('ints')
+        if ',' in inp_str:
+            cmd = np.fromstring(inp_str, dtype=int, sep=',')
+        else:
+            cmd = np.fromstring(inp_str, dtype=int, sep=' ')
+    logger.info(f'cmd: {cmd}')
+    return cmd
 
 def decode_uBBR_command(cmd):
     '''decode commands sent to the uBBR (passed as 3 uint8s)'''
     
     logger = logging.getLogger(__name__ +'.decode_uBBR_command')
 
-    cmd_str = ''.join("{0:8b}".format(x) for x in cmd).replace(' ','0')[::-1]
-    
-    if len(cmd_str)!=24:
+    cmd_bytes = tuple(int(x) for x in cmd)
+
+    if len(cmd_bytes)!=3:
         logger.warning("invalid uBBR command length")
-    if not (cmd_str[23]=='1' and cmd_str[22] == '0'):
+    word = command_word(cmd_bytes)
+    if not (extract_bits(word, 23, 1)==1 and extract_bits(word, 22, 1)==0):
         logger.warning("invalid uBBR header")
 
-    out = dict()
-    parms = ['E_FILT','B_FILT','E_CAL','B_CAL','E_PRE','B_PRE','E_RST','B_RST','E_GAIN','B_GAIN','CALTONE','SIG_GEN','TONETYPE']
-    inds  = [21,      20,      19,     18,     17,      16,     15,    14,     13,       12,     11,       10,       9 ]
+    return dict(_decode_uBBR_command(word))
 
-    out['TONESTEP'] = int(cmd_str[1:9],2)  # Pretty sure byte zero is unused...
-    for parm, ind in zip(parms,inds):
-        out[parm] = int(cmd_str[ind])    
+@functools.lru_cache(maxsize=1024)
+def _decode_uBBR_command(word):
+    ''' decode_uBBR_command, on the packed command word '''
+    out = dict()
+    # Tone step is sent most-significant bit first, starting at bit 1. Pretty sure bit zero is unused...
+    out['TONESTEP'] = int(REVERSED_BYTES[extract_bits(word, 1, 8)])
+    for name, shift, width in UBBR_COMMAND_FIELDS:
+        out[name] = extract_bits(word, shift, width)
     
     return out
 
@@ -636,42 +708,142 @@ def remove_trailing_nans(arr1d):
         
     return trimmed
 
-def TD_reassemble(vec):
-    ''' Rearranges a byte string into 16-bit values (packed as a double),
-     following time-domain interleaving'''
-    
-    re = vec[:len(vec) - (len(vec)%4)].astype('uint8')
-    re = np.reshape(re, [int(len(re)/4),4])
-    re = np.stack([(re[:,0] + 256*re[:,1]).astype('int16'), (re[:,2] + 256*re[:,3]).astype('int16')],axis=1)
-    re = re.ravel().astype('float')
+def _reassembly_buffer(vec, valid=None):
+    ''' Returns a uint8 byte buffer and a boolean "byte received" mask, trimmed to
+        a multiple of 4 bytes. Accepts either a uint8 buffer plus mask, or the older
+        float vectors with NaNs marking the missing bytes.'''
+    vec = np.asarray(vec)
+    if valid is None:
+        if vec.dtype.kind == 'f':
+            valid = ~np.isnan(vec)
+            vec = np.where(valid, vec, 0)
+        else:
+            valid = np.ones(len(vec), dtype=bool)
+
+    n_bytes = len(vec) - (len(vec)%4)
+    buf = np.ascontiguousarray(vec[:n_bytes], dtype=np.uint8)
+    valid = np.asarray(valid[:n_bytes], dtype=bool)
+
+    return buf, valid
 
-    # Mark off any nans in the output vector
-    out_nan_inds = np.unique(np.floor(np.where(np.isnan(vec))[0]/2).astype('int'))
-    re[out_nan_inds] = np.nan
+def TD_reassemble(vec, valid=None, as_float=False):
+    ''' Rearranges a byte string into 16-bit values, following time-domain interleaving.
 
-    # Returns floats, even though our data is 16-bit ints... but this keeps the 'nan' flags present.
-    return re
+        vec is a uint8 byte buffer, and valid is a boolean mask of the bytes we
+        actually received (a float vector with NaNs for missing bytes also works).
+        The buffer is reinterpreted as little-endian int16 in place -- no copies.
 
-def FD_reassemble(vec):
-    ''' Rearranges a byte string into 16-bit values (packed as a complex double),
-    following time-domain interleaving.
-    Untested as of 10/11/2019, but follows the Matlab code! I need some FD data to try it with.
+        Returns (samples, sample_valid), or if as_float is set, a float vector
+        with NaNs in place of the missing samples.'''
 
-    Added nan mask 10/31/2019, also untested
+    buf, valid = _reassembly_buffer(vec, valid)
+
+    samples = buf.view('<i2')
+    # A sample is only good if both of its bytes showed up
+    sample_valid = valid.reshape(-1, 2).all(axis=1)
+
+    if as_float:
+        return samples_to_float(samples, sample_valid)
+
+    return samples, sample_valid
+
+# Frequency-domain samples are packed as a (real, imaginary) pair of int16s
+FD_SAMPLE_DTYPE = np.dtype([('re', '<i2'), ('im', '<i2')])
+
+def FD_reassemble(vec, valid=None, as_float=False):
+    ''' Rearranges a byte string into 16-bit values, packed as (real, imaginary) pairs,
+    following frequency-domain interleaving.
+
+    Same as TD_reassemble, but each sample is four bytes; samples are returned as
+    a view with fields 're' and 'im'. With as_float set, returns a complex vector
+    with NaNs in place of the missing samples.
     '''
-    re = vec[:len(vec) - (len(vec)%4)].astype('uint8')
-    re = np.reshape(re, [int(len(re)/4),4])
-    re = np.stack([(re[:,0] + 256*re[:,1]).astype('int16'), (re[:,2] + 256*re[:,3]).astype('int16')],axis=1)
+    buf, valid = _reassembly_buffer(vec, valid)
+
+    samples = buf.view(FD_SAMPLE_DTYPE)
+    sample_valid = valid.reshape(-1, 4).all(axis=1)
+
+    if as_float:
+        return samples_to_float(samples, sample_valid)
 
-    re = re[:,0].astype('float') + 1j*re[:,1].astype('float')
+    return samples, sample_valid
 
-    # Mark off any nans in the output vector.
-    out_nan_inds = np.unique(np.floor(np.where(np.isnan(vec))[0]/4).astype('int'))
-    re[out_nan_inds] = np.nan
+def samples_to_float(samples, sample_valid, out=None):
+    ''' Casts reassembled int16 samples (from TD_reassemble or FD_reassemble)
+        to float (or complex), with NaNs marking the missing samples.'''
 
-    return re
+    if samples.dtype == FD_SAMPLE_DTYPE:
+        if out is None:
+            out = np.empty(len(samples), dtype='complex')
+        out.real = samples['re']
+        out.imag = samples['im']
+    else:
+        if out is None:
+            out = np.empty(len(samples), dtype='float')
+        out[:] = samples
+
+    out[~sample_valid] = np.nan
+
+    return out
 
-def decode_burst_data_by_experiment_number(packets, burst_cmd = None, burst_pulses=None):
+class BurstPacketIndex():
+    ''' A sorted index over a set of burst packets (E, B, and GPS), shared by
+        the "Decode burst" methods below.
+
+        Packets are sorted by header timestamp once. Time windows are found with
+        a binary search, packets are grouped by experiment number once, and
+        packets assigned to a burst are flagged as used, rather than rebuilding
+        the list of remaining packets after every burst.
+    '''
+
+    def __init__(self, packets, dtypes=['E','B','G']):
+        burst_packets = [p for p in packets if p['dtype'] in dtypes]
+        times = np.array([p['header_timestamp'] for p in burst_packets], dtype=float)
+        order = np.argsort(times, kind='stable')
+
+        self.packets = [burst_packets[i] for i in order]
+        self.times = times[order]
+        exp_nums = np.array([p['exp_num'] for p in self.packets], dtype=int)
+        self.exp_nums, self.exp_codes = np.unique(exp_nums, return_inverse=True)
+        self.used = np.zeros(len(self.packets), dtype=bool)
+
+    def __len__(self):
+        return len(self.packets)
+
+    def remaining_count(self):
+        ''' Number of packets not yet assigned to a burst '''
+        return len(self.packets) - np.count_nonzero(self.used)
+
+    def window(self, ta, tb):
+        ''' Indices of the unused packets with ta <= header_timestamp <= tb '''
+        i0 = np.searchsorted(self.times, ta, side='left')
+        i1 = np.searchsorted(self.times, tb, side='right')
+        inds = np.arange(i0, i1)
+        return inds[~self.used[i0:i1]]
+
+    def experiment_groups(self):
+        ''' Yields (experiment number, indices of unused packets) for each
+            experiment number, with indices in time order '''
+        order = np.argsort(self.exp_codes, kind='stable')
+        bounds = np.searchsorted(self.exp_codes[order], np.arange(len(self.exp_nums) + 1))
+        for code, e_num in enumerate(self.exp_nums):
+            inds = order[bounds[code]:bounds[code + 1]]
+            yield e_num, inds[~self.used[inds]]
+
+    def experiment_number(self, inds):
+        ''' The most common experiment number within a set of packets '''
+        return self.exp_nums[np.bincount(self.exp_codes[inds]).argmax()]
+
+    def take(self, inds):
+        ''' Mark packets as used, and return them '''
+        self.used[inds] = True
+        return [self.packets[i] for i in inds]
+
+    def remaining(self):
+        ''' Packets not yet assigned to a burst, in time order '''
+        return [p for p, used in zip(self.packets, self.used) if not used]
+
+def decode_burst_data_by_experiment_number(packets, burst_cmd = None, burst_pulses=None, workers=None, scratch_dir=None):
     ''' Decode bursts by grouping packets by experiment number.
         The burst command is echoed in each GPS packet; the number of repeats
         is decoded by counting GPS packets.
@@ -681,18 +853,17 @@ def decode_burst_data_by_experiment_number(packets, burst_cmd = None, burst_puls
         card being turned off, and may cause problems if the payload has been
         reset between two adjacent bursts, resulting in two bursts with experiment
         number 0.
+
+        Bursts are reassembled in parallel across `workers` processes, and out-of-core
+        if scratch_dir is given (see process_bursts).
     '''
     logger = logging.getLogger(__name__+'.decode_burst_data_by_experiment_number')
 
-    # Select burst packets
-    burst_packets = list(filter(lambda packet: packet['dtype'] in ['E','B','G'], packets))
+    # Select burst packets, sorted and grouped by experiment number
+    index = BurstPacketIndex(packets)
     
-    # Get all unique experiment numbers for this set of packets 
     # (chances are real good that we'll only have 1 or 2 unique numbers)
-    avail_exp_nums = np.unique([x['exp_num'] for x in burst_packets])
-    logger.info(f"available burst experiment numbers: {avail_exp_nums}")
-
-    completed_bursts = []
+    logger.info(f"available burst experiment numbers: {index.exp_nums}")
 
     if (burst_cmd is not None) and (len(burst_cmd) > 0 ) and (burst_cmd is not "burst command"):
         logger.info(f'Using manually-provided burst command {burst_cmd}')
@@ -702,52 +873,37 @@ def decode_burst_data_by_experiment_number(packets, burst_cmd = None, burst_puls
     else:
         burst_config = None
 
-    for e_num in avail_exp_nums:
-        logger.info(f"processing experiment number {e_num}")
-        filt_inds = [p['exp_num']==e_num for p in burst_packets]
-        current_packets = list(itertools.compress(burst_packets, filt_inds))
-        cur_G_packets   = list(filter(lambda p: p['dtype']=='G', current_packets))
-        header_timestamps = sorted([p['header_timestamp'] for p in current_packets])
-
-        # # The burst command is echoed at the top of each GPS packet, if we have any
-        # if (burst_config is None) and cur_G_packets:
-        #     for gg in cur_G_packets:
-        #         if gg['start_ind'] ==0:
-        #             cmd_gps = np.flip(gg['data'][0:3])
-
-        #     # Get burst configuration parameters:
-        #     logger.info(f'Found burst command {cmd_gps} in GPS packet')
-        #     burst_config = decode_burst_command(cmd_gps)
-        #     burst_config['burst_pulses'] = burst_pulses
-
-            
-        processed = process_burst(current_packets, burst_config)
-        processed['header_timestamp'] = header_timestamps[0]
-        processed['experiment_number'] = e_num
-        completed_bursts.append(processed)
-        burst_packets = list(itertools.compress(burst_packets, np.logical_not(filt_inds)))
-        logger.info(f"{len(burst_packets)} packets remaining")
-    unused_packets = burst_packets
-    logger.info(f"returning {len(burst_packets)} unused burst packets")
+    jobs = []
+    extras = []
+    for e_num, inds in index.experiment_groups():
+        logger.info(f"found experiment number {e_num}")
+        jobs.append((index.take(inds), burst_config))
+        extras.append({'header_timestamp': index.times[inds[0]],
+                       'experiment_number': e_num})
+        logger.info(f"{index.remaining_count()} packets remaining")
+
+    completed_bursts = _run_burst_jobs(jobs, extras, workers, scratch_dir, logger)
+    unused_packets = index.remaining()
+    logger.info(f"returning {len(unused_packets)} unused burst packets")
     return completed_bursts, unused_packets
 
-def decode_burst_data_in_range(packets, ta, tb, burst_cmd = None, burst_pulses = None):
+def decode_burst_data_in_range(packets, ta, tb, burst_cmd = None, burst_pulses = None, workers=None, scratch_dir=None):
     ''' decode burst data between a given time interval, with a given command.
         Use this in the event that we want to decode an incomplete burst.
     '''
     logger = logging.getLogger(__name__ +'.decode_burst_data_in_range')
-    burst_packets = list(filter(lambda packet: packet['dtype'] in ['E','B','G'], packets))
-    burst_packets = sorted(burst_packets, key = lambda p: p['header_timestamp'])
-    header_timestamps = ([p['header_timestamp'] for p in burst_packets])
-
+    index = BurstPacketIndex(packets)
 
-    avail_exp_nums = np.unique([x['exp_num'] for x in burst_packets])
-    logger.debug(f'Available burst experiment numbers: {avail_exp_nums}')
+    logger.debug(f'Available burst experiment numbers: {index.exp_nums}')
 
     completed_bursts = []
 
-    min_timestamp = min(header_timestamps)
-    max_timestamp = max(header_timestamps)
+    if len(index) == 0:
+        logger.info('no burst packets present')
+        return completed_bursts, []
+
+    min_timestamp = index.times[0]
+    max_timestamp = index.times[-1]
     logger.info(f'packet timestamps range betwen {datetime.datetime.utcfromtimestamp(min_timestamp)} and {datetime.datetime.utcfromtimestamp(max_timestamp)}')
 
     if burst_cmd is not None:
@@ -757,34 +913,24 @@ def decode_burst_data_in_range(packets, ta, tb, burst_cmd = None, burst_pulses =
     else:
         burst_config = None
 
-    for e_num in avail_exp_nums:
-        logger.info(f"processing experiment number {e_num}")
-
-        filt_inds = [p['header_timestamp'] >= ta and p['header_timestamp'] <= tb for p in burst_packets]
-        current_packets = list(itertools.compress(burst_packets, filt_inds))
-        header_timestamps = sorted([p['header_timestamp'] for p in current_packets])
-
-        if len(current_packets) > 100:
-            logger.info(f'------ exp num {e_num} ------')
-            logger.info(f"processing burst betweeen times: {datetime.datetime.utcfromtimestamp(ta),datetime.datetime.utcfromtimestamp(tb)}")
-
+    inds = index.window(ta, tb)
 
-            processed = process_burst(current_packets, burst_config)
+    if len(inds) > 100:
+        e_num = index.experiment_number(inds)
+        logger.info(f'------ exp num {e_num} ------')
+        logger.info(f"processing burst betweeen times: {datetime.datetime.utcfromtimestamp(ta),datetime.datetime.utcfromtimestamp(tb)}")
 
-            processed['ta'] = ta
-            processed['tb'] = tb
-            processed['header_timestamp'] = header_timestamps[0]
-            processed['experiment_number'] = e_num
+        extras = {'ta': ta, 'tb': tb,
+                  'header_timestamp': index.times[inds[0]],
+                  'experiment_number': e_num}
+        completed_bursts = _run_burst_jobs([(index.take(inds), burst_config)], [extras], workers, scratch_dir, logger)
+        logger.info(f"{index.remaining_count()} packets remaining")
 
-            completed_bursts.append(processed)
-            burst_packets = list(itertools.compress(burst_packets, np.logical_not(filt_inds)))
-            logger.info(f"{len(burst_packets)} packets remaining")
-
-    unused_packets = burst_packets    
-    logger.info(f"returning {len(burst_packets)} unused burst packets")
+    unused_packets = index.remaining()
+    logger.info(f"returning {len(unused_packets)} unused burst packets")
     return completed_bursts, unused_packets
 
-def decode_burst_data_between_status_packets(packets):
+def decode_burst_data_between_status_packets(packets, workers=None, scratch_dir=None):
     ''' Decode burst data by sorting packets by arrival time, and binning bursts
         between two status packets. 
     '''
@@ -793,21 +939,21 @@ def decode_burst_data_between_status_packets(packets):
 
     I_packets     = list(filter(lambda p: (p['dtype'] == 'I' and chr(p['data'][3])=='B'), packets))
     I_packets     = sorted(I_packets, key = lambda p: p['header_timestamp'])
-    burst_packets = list(filter(lambda packet: packet['dtype'] in ['E','B','G'], packets))
-    burst_packets = sorted(burst_packets, key = lambda p: p['header_timestamp'])
-    # stats = decode_status(I_packets)
-
+    index = BurstPacketIndex(packets)
 
-    avail_exp_nums = np.unique([x['exp_num'] for x in burst_packets])
-    logging.info(f"exp nums in dataset: {avail_exp_nums}")
-    completed_bursts = []
+    logging.info(f"exp nums in dataset: {index.exp_nums}")
+    jobs = []
+    extras = []
 
-    status_times = np.array(sorted([IP['header_timestamp'] for IP in I_packets]))
+    # Status packets which bracket a burst get used up along with it
+    I_used = np.zeros(len(I_packets), dtype=bool)
 
     # We should have a status message at the beginning and end of each burst.
     # Add 1 second padding on either side for good measure.
     logger.info(f'I_packets has length {len(I_packets)} pre-sift')
-    for IA, IB in zip(I_packets[0:-1], I_packets[1:]):
+    for ia in range(len(I_packets) - 1):
+        IA = I_packets[ia]
+        IB = I_packets[ia + 1]
         ta = IA['header_timestamp'] - 1.5
         tb = IB['header_timestamp'] + 1.5
         logger.info(f"{ta}, {tb}")
@@ -820,68 +966,60 @@ def decode_burst_data_between_status_packets(packets):
         if any(IA_cmd != IB_cmd):
             continue
 
-        # (At this point, there will be only one available experiment number)
-        for e_num in avail_exp_nums:
-            filt_inds = [p['header_timestamp'] >= ta and p['header_timestamp'] <= tb for p in burst_packets]
-            packets_in_time_range = list(itertools.compress(burst_packets, filt_inds))
+        inds = index.window(ta, tb)
+        logger.info(f"packets in time range: {len(inds)}")
 
+        if len(inds) > 100:
+            # (At this point, there should be only one available experiment number)
+            e_num = index.experiment_number(inds)
+            logger.info(f'------ exp num {e_num} ------')
+            logger.info(f"status packet times: {datetime.datetime.utcfromtimestamp(ta),datetime.datetime.utcfromtimestamp(tb)}")
+
+            # Ok! Now we have a list of packets, all with a common experiment number, 
+            # in between two status packets, each with have the same burst command.
+            # Ideally, this should be a complete set of burst data. Let's try processing it!
+            packets_in_time_range = index.take(inds)
+
+            # The burst command is echoed at the top of each GPS packet; we're using the
+            # command listed in the status packet, but let's confirm it matches.
+            for gg in filter(lambda packet: packet['dtype'] == 'G', packets_in_time_range):
+                if gg['start_ind'] ==0:
+                    cmd_gps = np.flip(gg['data'][0:3])
+                    logger.debug(cmd_gps)
+                    if (IA_cmd != cmd_gps).any():
+                        logger.warning("GPS and status command echo mismatch")
+
+            # Get burst configuration parameters:
+            cmd = np.flip(IA['data'][12:15])
+            burst_config = decode_burst_command(cmd)
+            status = decode_status([IA, IB])
 
-            packets_with_matching_e_num = list(filter(lambda p: p['exp_num']==e_num, burst_packets))
-            logger.info(f"packets in time range: {len(packets_in_time_range)}; packets with exp_num {e_num}: {len(packets_with_matching_e_num)}")
+            # Get burst nPulses -- this is the one key parameter that isn't defined by the burst command...
+            burst_config['burst_pulses'] = status[0]['burst_pulses']
 
-            if len(packets_in_time_range) > 100:
-                logger.info(f'------ exp num {e_num} ------')
-                logger.info(f"status packet times: {datetime.datetime.utcfromtimestamp(ta),datetime.datetime.utcfromtimestamp(tb)}")
+            logger.info(burst_config)
 
+            jobs.append((packets_in_time_range, burst_config))
+            extras.append({'status': status,
+                           'bbr_config': decode_uBBR_command(status[0]['prev_bbr_command']),
+                           'header_timestamp': ta,
+                           'experiment_number': e_num})
 
-                # Ok! Now we have a list of packets, all with a common experiment number, 
-                # in between two status packets, each with have the same burst command.
-                # Ideally, this should be a complete set of burst data. Let's try processing it!
-                
-                # The burst command is echoed at the top of each GPS packet; we're using the
-                # command listed in the status packet, but let's confirm it matches.
-                for gg in filter(lambda packet: packet['dtype'] == 'G', packets_in_time_range):
-                    if gg['start_ind'] ==0:
-                        cmd_gps = np.flip(gg['data'][0:3])
-                        logger.debug(cmd_gps)
-                        if (IA_cmd != cmd_gps).any():
-                            logger.warning("GPS and status command echo mismatch")
-
-                # Get burst configuration parameters:
-                cmd = np.flip(IA['data'][12:15])
-                burst_config = decode_burst_command(cmd)
-                
-                # Get burst nPulses -- this is the one key parameter that isn't defined by the burst command...
-                system_config = np.flip(IA['data'][20:24])
-                system_config = ''.join("{0:8b}".format(a) for a in system_config).replace(' ','0')
-                burst_config['burst_pulses'] = int(system_config[16:24],base=2)
-
-                logger.info(burst_config)
-
-                processed = process_burst(packets_in_time_range, burst_config)
-                # processed['I'] = [IA, IB]
-                processed['status'] = decode_status([IA, IB])
-                processed['bbr_config'] = decode_uBBR_command(processed['status'][0]['prev_bbr_command'])
-                processed['header_timestamp'] = ta
-                processed['experiment_number'] = e_num
-                
-                completed_bursts.append(processed)
+            # Remove the bracketing status packets from the unused list
+            I_used[ia] = True
+            I_used[ia + 1] = True
 
-                
-                # Remove processed packets from data_dict
-                burst_packets = list(itertools.compress(burst_packets, np.logical_not(filt_inds)))
-                I_packets.remove(IA)
-                I_packets.remove(IB)
+        logger.info(f"{index.remaining_count()} packets remaining")
 
-            logger.info(f"{len(burst_packets)} packets remaining")
+    completed_bursts = _run_burst_jobs(jobs, extras, workers, scratch_dir, logger)
 
-    unused_packets = burst_packets + I_packets
+    unused_packets = index.remaining() + [I for I, used in zip(I_packets, I_used) if not used]
     logger.info(f"returning {len(unused_packets)} unused burst packets")    
     return completed_bursts, unused_packets
 
 
 
-def decode_burst_data_by_trailing_status_packet(packets):
+def decode_burst_data_by_trailing_status_packet(packets, workers=None, scratch_dir=None):
     ''' Decode burst data by sorting packets by arrival time, and binning bursts
         within a time window preceeding a status packet
     '''
@@ -890,131 +1028,233 @@ def decode_burst_data_by_trailing_status_packet(packets):
 
     I_packets     = list(filter(lambda p: (p['dtype'] == 'I' and chr(p['data'][3])=='B'), packets))
     I_packets     = sorted(I_packets, key = lambda p: p['header_timestamp'])
-    burst_packets = list(filter(lambda packet: packet['dtype'] in ['E','B','G'], packets))
-    burst_packets = sorted(burst_packets, key = lambda p: p['header_timestamp'])
-    # stats = decode_status(I_packets)
-
+    index = BurstPacketIndex(packets)
 
-    avail_exp_nums = np.unique([x['exp_num'] for x in burst_packets])
-    logging.info(f"exp nums in dataset: {avail_exp_nums}")
-    completed_bursts = []
+    logging.info(f"exp nums in dataset: {index.exp_nums}")
+    jobs = []
+    extras = []
 
-    status_times = np.array(sorted([IP['header_timestamp'] for IP in I_packets]))
+    I_used = np.zeros(len(I_packets), dtype=bool)
 
-    # We should have a status message at the beginning and end of each burst.
-    # Add 1 second padding on either side for good measure.
+    # We should have a status message at the end of each burst.
+    # Look back up to two hours, and add 1.5 seconds padding after for good measure.
     logger.info(f'I_packets has length {len(I_packets)} pre-sift')
-    for IB in I_packets:
+    for ib, IB in enumerate(I_packets):
         ta = IB['header_timestamp'] - 2*3600
         tb = IB['header_timestamp'] + 1.5
         logger.info(f"{ta}, {tb}")
         
-        # Confirm that the burst command is the same within each status packet:        
+        # Get the burst command from the status packet:        
         IB_cmd = np.flip(IB['data'][12:15])
 
+        inds = index.window(ta, tb)
+        logger.info(f"packets in time range: {len(inds)}")
 
-        # (At this point, there will be only one available experiment number)
-        for e_num in avail_exp_nums:
-            filt_inds = [p['header_timestamp'] >= ta and p['header_timestamp'] <= tb for p in burst_packets]
-            packets_in_time_range = list(itertools.compress(burst_packets, filt_inds))
+        if len(inds) > 100:
+            e_num = index.experiment_number(inds)
+            logger.info(f'------ exp num {e_num} ------')
+            logger.info(f"status packet times: {datetime.datetime.fromtimestamp(ta),datetime.datetime.fromtimestamp(tb)}")
 
+            packets_in_time_range = index.take(inds)
 
-            packets_with_matching_e_num = list(filter(lambda p: p['exp_num']==e_num, burst_packets))
-            logger.info(f"packets in time range: {len(packets_in_time_range)}; packets with exp_num {e_num}: {len(packets_with_matching_e_num)}")
+            # The burst command is echoed at the top of each GPS packet; we're using the
+            # command listed in the status packet, but let's confirm it matches.
+            for gg in filter(lambda packet: packet['dtype'] == 'G', packets_in_time_range):
+                if gg['start_ind'] ==0:
+                    cmd_gps = np.flip(gg['data'][0:3])
+                    logger.debug(cmd_gps)
+                    if (IB_cmd != cmd_gps).any():
+                        logger.warning("GPS and status command echo mismatch")
 
-            if len(packets_in_time_range) > 100:
-                logger.info(f'------ exp num {e_num} ------')
-                logger.info(f"status packet times: {datetime.datetime.fromtimestamp(ta),datetime.datetime.fromtimestamp(tb)}")
+            # Get burst configuration parameters:
+            burst_config = decode_burst_command(IB_cmd)
+            status = decode_status([IB])
 
+            # Get burst nPulses -- this is the one key parameter that isn't defined by the burst command...
+            burst_config['burst_pulses'] = status[0]['burst_pulses']
 
-                # Ok! Now we have a list of packets, all with a common experiment number, 
-                # in between two status packets, each with have the same burst command.
-                # Ideally, this should be a complete set of burst data. Let's try processing it!
-                
-                # The burst command is echoed at the top of each GPS packet; we're using the
-                # command listed in the status packet, but let's confirm it matches.
-                for gg in filter(lambda packet: packet['dtype'] == 'G', packets_in_time_range):
-                    if gg['start_ind'] ==0:
-                        cmd_gps = np.flip(gg['data'][0:3])
-                        logger.debug(cmd_gps)
-                        if (IB_cmd != cmd_gps).any():
-                            logger.warning("GPS and status command echo mismatch")
-
-                # Get burst configuration parameters:
-                burst_config = decode_burst_command(IB_cmd)
-                
-                # Get burst nPulses -- this is the one key parameter that isn't defined by the burst command...
-                system_config = np.flip(IB['data'][20:24])
-                system_config = ''.join("{0:8b}".format(a) for a in system_config).replace(' ','0')
-                burst_config['burst_pulses'] = int(system_config[16:24],base=2)
-
-                logger.info(burst_config)
-
-                processed = process_burst(packets_in_time_range, burst_config)
-                # processed['I'] = [IA, IB]
-                processed['status'] = decode_status([IB])
-                processed['bbr_config'] = decode_uBBR_command(processed['status'][0]['prev_bbr_command'])
-                processed['header_timestamp'] = ta
-                processed['experiment_number'] = e_num
-                
-                completed_bursts.append(processed)
+            logger.info(burst_config)
 
-                
-                # Remove processed packets from data_dict
-                burst_packets = list(itertools.compress(burst_packets, np.logical_not(filt_inds)))
-                I_packets.remove(IB)
+            jobs.append((packets_in_time_range, burst_config))
+            extras.append({'status': status,
+                           'bbr_config': decode_uBBR_command(status[0]['prev_bbr_command']),
+                           'header_timestamp': ta,
+                           'experiment_number': e_num})
+
+            I_used[ib] = True
 
-            logger.info(f"{len(burst_packets)} packets remaining")
+        logger.info(f"{index.remaining_count()} packets remaining")
 
-    unused_packets = burst_packets + I_packets
+    completed_bursts = _run_burst_jobs(jobs, extras, workers, scratch_dir, logger)
+
+    unused_packets = index.remaining() + [I for I, used in zip(I_packets, I_used) if not used]
     logger.info(f"returning {len(unused_packets)} unused burst packets")    
     return completed_bursts, unused_packets
 
-def process_burst(packets, burst_config=None):
+def pack_burst_packets(packets):
+    ''' Packs a list of burst packets into flat arrays: one uint8 array holding
+        every payload back to back, plus per-packet dtype, start_ind, bytecount,
+        and offset into the payload array. This is the form process_packed_burst
+        works on, and is cheap to hand to another process. '''
+
+    packets = [p for p in packets if p['dtype'] in ['E','B','G']]
+    lengths = np.array([len(p['data']) for p in packets], dtype=np.int64)
+
+    packed = dict()
+    packed['dtype'] = np.array([p['dtype'] for p in packets], dtype='U1')
+    packed['start_ind'] = np.array([p['start_ind'] for p in packets], dtype=np.int64)
+    packed['bytecount'] = np.array([p['bytecount'] for p in packets], dtype=np.int64)
+    packed['offset'] = np.cumsum(lengths) - lengths
+    packed['payload'] = np.fromiter(itertools.chain.from_iterable(p['data'] for p in packets),
+                                    dtype=np.uint8, count=int(np.sum(lengths)))
+    return packed
+
+def scratch_array(shape, dtype, scratch_dir=None, name=None):
+    ''' A zero-filled working array for burst reassembly.
+
+        With scratch_dir None, this is just np.zeros. Otherwise it's an np.memmap backed
+        by a file in scratch_dir, so very long bursts don't have to fit in RAM: a named
+        file ("<name>_XXXX.dat", left in place for the caller -- see remove_scratch_files)
+        if name is given, or an anonymous temporary file that goes away along with the array if not.
+    '''
+    if scratch_dir is None or np.prod(shape) == 0:
+        return np.zeros(shape, dtype=dtype)
+
+    if name is None:
+        return np.memmap(tempfile.TemporaryFile(dir=scratch_dir), mode='w+', dtype=dtype, shape=shape)
+
+    fd, filename = tempfile.mkstemp(dir=scratch_dir, prefix=f'{name}_', suffix='.dat')
+    os.close(fd)
+    return np.memmap(filename, mode='w+', dtype=dtype, shape=shape)
+
+def remove_scratch_files(bursts):
+    ''' Deletes the files behind out-of-core bursts' E and B arrays (see scratch_array), once
+        they're no longer needed. Drops the arrays from the bursts. Returns the files removed. '''
+    logger = logging.getLogger(__name__ + '.remove_scratch_files')
+    removed = []
+    for burst in bursts:
+        for key in ['E', 'B']:
+            arr = burst.get(key)
+            if isinstance(arr, np.memmap) and arr.filename is not None:
+                filename = arr.filename
+                del burst[key], arr
+                try:
+                    os.remove(filename)
+                    removed.append(filename)
+                except OSError as e:
+                    logger.warning(f'could not remove {filename}: {e}')
+    return removed
+
+def _detach_scratch_arrays(processed):
+    ''' Swaps any memmapped arrays in a processed burst for a (filename, dtype, shape)
+        reference, so they can be passed between processes without pickling the data. '''
+    for k, v in processed.items():
+        if isinstance(v, np.memmap) and v.filename is not None:
+            v.flush()
+            processed[k] = ('memmap', v.filename, v.dtype.str, v.shape)
+    return processed
+
+def _attach_scratch_arrays(processed):
+    ''' Reopens the memmapped arrays referenced by _detach_scratch_arrays '''
+    for k, v in processed.items():
+        if isinstance(v, tuple) and len(v) == 4 and v[0] == 'memmap':
+            processed[k] = np.memmap(v[1], mode='r+', dtype=np.dtype(v[2]), shape=v[3])
+    return processed
+
+def reassemble_bytes(packed, dtype, scratch_dir=None):
+    ''' Drops the payload of each packet of type dtype into a uint8 buffer.
+        Returns the buffer, and a boolean mask of which bytes were received.
+        If scratch_dir is given, both live in temporary files there (see scratch_array). '''
+
+    inds = np.flatnonzero(packed['dtype'] == dtype)
+    starts = packed['start_ind'][inds]
+    counts = packed['bytecount'][inds]
+    offsets = packed['offset'][inds]
+    payload = packed['payload']
+
+    length = int(np.max(starts + counts)) if len(inds) else 0
+    buf = scratch_array(length, np.uint8, scratch_dir)
+    valid = scratch_array(length, bool, scratch_dir)
+
+    for s, n, o in zip(starts, counts, offsets):
+        buf[s:(s + n)] = payload[o:(o + n)]
+        valid[s:(s + n)] = True
+
+    return buf, valid
+
+def gap_map(packed, dtype, expected_bytes=None):
+    ''' Run-length map of the bytes missing from one channel (E, B, or G) of a burst.
+
+        The [start_ind, start_ind + bytecount) intervals of the channel's packets are
+        merged in a single pass. Returns a dict with:
+            'length':  bytes the channel should have (expected_bytes, or however far
+                       the received packets reach, whichever is larger)
+            'missing': (N, 2) array of [start, stop) byte ranges that never arrived
+    '''
+    inds = np.flatnonzero(packed['dtype'] == dtype)
+    starts = packed['start_ind'][inds]
+    order = np.argsort(starts, kind='stable')
+    starts = starts[order]
+    ends = starts + packed['bytecount'][inds][order]
+
+    extent = int(np.max(ends)) if len(ends) else 0
+    length = extent if expected_bytes is None else max(int(expected_bytes), extent)
+
+    # Everything up to the running max end has been covered; a gap opens
+    # wherever the next packet starts past that point.
+    covered = np.concatenate([[0], np.maximum.accumulate(ends)]).astype(np.int64)
+    next_start = np.concatenate([starts, [length]]).astype(np.int64)
+    is_gap = next_start > covered
+
+    return {'length': length,
+            'missing': np.column_stack([covered[is_gap], next_start[is_gap]])}
+
+def missing_bytes(gaps):
+    ''' Total bytes missing, from a gap map '''
+    return int(np.sum(gaps['missing'][:,1] - gaps['missing'][:,0]))
+
+def gap_completeness(gaps):
+    ''' Percentage of a channel's bytes received, from a gap map '''
+    if gaps['length'] == 0:
+        return 100.0
+    return 100.0*(1 - missing_bytes(gaps)/gaps['length'])
+
+def missing_ranges(gaps):
+    ''' The missing [start, stop) byte ranges of a gap map, as a list of tuples --
+        in the same start_ind units the packets use, for targeting re-downlinks. '''
+    return [(int(a), int(b)) for a, b in gaps['missing']]
+
+def process_burst(packets, burst_config=None, scratch_dir=None):
     ''' Reassemble burst data, according to info in burst_config.
         This assumes the set of packets is complete, and belongs to the
         same burst.
 
+        If scratch_dir is given, the burst is processed out-of-core: the byte buffers
+        and the output E and B arrays are np.memmaps backed by files in scratch_dir,
+        so only the windows actually being worked on are paged into memory.
+        The E and B files are left in scratch_dir, and are the caller's to clean up
+        (remove_scratch_files).
+
         This is the internal helper function called by the other "Decode burst" methods.
     '''
+    return process_packed_burst(pack_burst_packets(packets), burst_config, scratch_dir)
 
-    logger = logging.getLogger(__name__ +'.process_burst')
-
-    # Sort the packets by data stream:
-    E_packets = list(filter(lambda packet: packet['dtype'] == 'E', packets))
-    B_packets = list(filter(lambda packet: packet['dtype'] == 'B', packets))
-    G_packets = list(filter(lambda packet: packet['dtype'] == 'G', packets))
-
-
+def process_packed_burst(packed, burst_config=None, scratch_dir=None):
+    ''' process_burst, working on packets already packed by pack_burst_packets '''
 
-    # Loop through all packets to get the maximum data index:    
-    if E_packets:
-        max_E_ind = max([p['start_ind'] + p['bytecount'] for p in E_packets])
-    else: max_E_ind = 0
-    if B_packets:
-        max_B_ind = max([p['start_ind'] + p['bytecount'] for p in B_packets])
-    else: max_B_ind = 0
-    if G_packets:
-        max_G_ind = max([p['start_ind'] + p['bytecount'] for p in G_packets])
-    else: max_G_ind = 0
-
-    E_data = np.zeros(max_E_ind)*np.nan
-    B_data = np.zeros(max_B_ind)*np.nan
-    G_data = np.zeros(max_G_ind)*np.nan
+    logger = logging.getLogger(__name__ +'.process_burst')
 
-    logger.debug(f'Max E ind: {max_E_ind}  Max B ind: {max_B_ind}, Max G ind: {max_G_ind}')
+    # Raw bytes go into uint8 buffers, alongside a mask of which bytes we actually received
     logger.info("reassembling E")
-    for p in E_packets:
-        E_data[p['start_ind']:(p['start_ind'] + p['bytecount'])] = p['data']
+    E_data, E_valid = reassemble_bytes(packed, 'E', scratch_dir)
 
     logger.info("reassembling B")
-    for p in B_packets:
-        B_data[p['start_ind']:(p['start_ind'] + p['bytecount'])] = p['data']
+    B_data, B_valid = reassemble_bytes(packed, 'B', scratch_dir)
 
     logger.info("reassembling GPS")
-    for p in G_packets:
-        G_data[p['start_ind']:(p['start_ind'] + p['bytecount'])] = p['data']
+    G_data, G_valid = reassemble_bytes(packed, 'G', scratch_dir)
 
+    logger.debug(f'Max E ind: {len(E_data)}  Max B ind: {len(B_data)}, Max G ind: {len(G_data)}')
 
     # Decode any GPS data we might have
     G = decode_GPS_data(G_data)
@@ -1024,10 +1264,9 @@ def process_burst(packets, burst_config=None):
         # Burst command is echo'ed at the top of each GPS packet:
         gps_echoed_cmds = []
 
-        for g in G_packets:
-            if g['start_ind'] == 0:
-                cmd = np.flip(g['data'][0:3])
-                gps_echoed_cmds.append(cmd)
+        for o in packed['offset'][(packed['dtype'] == 'G') & (packed['start_ind'] == 0)]:
+            cmd = np.flip(packed['payload'][o:(o + 3)])
+            gps_echoed_cmds.append(cmd)
         if gps_echoed_cmds:
             # Check that they're all the same, if we have more entries...
             cmd = gps_echoed_cmds[0]
@@ -1058,37 +1297,155 @@ def process_burst(packets, burst_config=None):
         logger.info(f"seg length: {seg_length}")
         n_samples = int(2*(burst_config['FFTS_ON'])*2*seg_length*burst_config['BINS'].count('1'))
 
-    # Juggle the 8-bit values around
+    # Juggle the 8-bit values around. These are int16 views onto the byte buffers;
+    # we only cast to float (with NaNs for missing samples) for the output product.
     if burst_config['TD_FD_SELECT']==1:
         logger.info("Selected time domain")
-        E = TD_reassemble(E_data)
-        B = TD_reassemble(B_data)
+        E_samples, E_samples_valid = TD_reassemble(E_data, E_valid)
+        B_samples, B_samples_valid = TD_reassemble(B_data, B_valid)
 
     if burst_config['TD_FD_SELECT']==0:
         logger.info("seleced frequency domain")
-        E = FD_reassemble(E_data)
-        B = FD_reassemble(B_data)
-
-    logger.debug(f'Reassembled E has length {len(E)}, with {np.sum(np.isnan(E)):,d} nans. Raw E missing {np.sum(np.isnan(E_data)):,d} values.')
-    logger.debug(f'Reassembled B has length {len(B)}, with {np.sum(np.isnan(B)):,d} nans. Raw B missing {np.sum(np.isnan(B_data)):,d} values.')
+        E_samples, E_samples_valid = FD_reassemble(E_data, E_valid)
+        B_samples, B_samples_valid = FD_reassemble(B_data, B_valid)
+
+    # Which byte ranges never showed up, measured against the full expected burst
+    bytes_per_sample = 2 if burst_config['TD_FD_SELECT']==1 else 4
+    gaps = dict()
+    gaps['E'] = gap_map(packed, 'E', bytes_per_sample*int(n_samples))
+    gaps['B'] = gap_map(packed, 'B', bytes_per_sample*int(n_samples))
+    gaps['G'] = gap_map(packed, 'G')
+
+    E_missing = len(E_samples_valid) - np.count_nonzero(E_samples_valid)
+    B_missing = len(B_samples_valid) - np.count_nonzero(B_samples_valid)
+    E_raw_missing = missing_bytes(gaps['E'])
+    B_raw_missing = missing_bytes(gaps['B'])
+
+    logger.debug(f'Reassembled E has length {len(E_samples)}, with {E_missing:,d} nans. Raw E missing {E_raw_missing:,d} values.')
+    logger.debug(f'Reassembled B has length {len(B_samples)}, with {B_missing:,d} nans. Raw B missing {B_raw_missing:,d} values.')
     logger.debug(f'expected {int(n_samples)} samples')
+    logger.info(f"E {gap_completeness(gaps['E']):.1f}% complete, B {gap_completeness(gaps['B']):.1f}% complete "
+                f"({len(gaps['E']['missing'])} and {len(gaps['B']['missing'])} gaps)")
 
-    if len(E)!=int(n_samples):
+    if len(E_samples)!=int(n_samples):
         logger.warning("E data size is an unexpected size -- possible missing packets or mismatched data")
-        logger.warning(f'Reassembled E has length {len(E)}, with {np.sum(np.isnan(E))} nans. Raw E missing {np.sum(np.isnan(E_data))} values. Expected {int(n_samples)} samples')
+        logger.warning(f'Reassembled E has length {len(E_samples)}, with {E_missing} nans. Raw E missing {E_raw_missing} values. Expected {int(n_samples)} samples')
 
-    if len(B)!=int(n_samples):
+    if len(B_samples)!=int(n_samples):
         logger.warning("B data size is an unexpected size -- possible missing packets or mismatched data")
-        logger.warning(f'Reassembled B has length {len(B)}, with {np.sum(np.isnan(B))} nans. Raw B missing {np.sum(np.isnan(B_data))} values. Expected {int(n_samples)} samples')
+        logger.warning(f'Reassembled B has length {len(B_samples)}, with {B_missing} nans. Raw B missing {B_raw_missing} values. Expected {int(n_samples)} samples')
+
+    out_dtype = 'float' if burst_config['TD_FD_SELECT']==1 else 'complex'
+    E = samples_to_float(E_samples, E_samples_valid,
+                         out=scratch_array(len(E_samples), out_dtype, scratch_dir, name='burst_E'))
+    B = samples_to_float(B_samples, B_samples_valid,
+                         out=scratch_array(len(B_samples), out_dtype, scratch_dir, name='burst_B'))
 
     outs = dict()
     outs['E'] = E
     outs['B'] = B
     outs['G'] = G
     outs['config'] = burst_config
+    outs['gaps'] = gaps
 
     return outs
 
+def process_bursts(jobs, workers=None, scratch_dir=None):
+    ''' Reassemble a set of independent bursts, fanned out across a process pool.
+
+        jobs:    a list of (packets, burst_config) tuples, one per burst
+        workers: number of worker processes. None uses every core; 1 runs
+                 everything here in this process.
+        scratch_dir: if given, process out-of-core (see process_burst). Workers hand
+                 back the memmapped E and B arrays by filename.
+
+        Packet payloads are handed to the workers through a block of shared memory,
+        rather than pickling the packet lists. Returns a list of
+        (processed burst, seconds spent reassembling it), in the same order as jobs.
+    '''
+    logger = logging.getLogger(__name__ + '.process_bursts')
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs)))
+
+    packed = [pack_burst_packets(packets) for packets, _ in jobs]
+    configs = [burst_config for _, burst_config in jobs]
+
+    if workers == 1:
+        return [_timed_process_burst(p, cfg, scratch_dir) for p, cfg in zip(packed, configs)]
+
+    logger.info(f'reassembling {len(jobs)} bursts with {workers} workers')
+
+    if shared_memory is None:
+        # No shared memory on this Python; pickle the packed arrays across instead
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_timed_process_burst, packed, configs,
+                                        itertools.repeat(scratch_dir), itertools.repeat(True)))
+        return [(_attach_scratch_arrays(p), t) for p, t in results]
+
+    total_bytes = sum(len(p['payload']) for p in packed)
+    shm = shared_memory.SharedMemory(create=True, size=max(total_bytes, 1))
+    try:
+        tasks = []
+        offset = 0
+        for p, cfg in zip(packed, configs):
+            n_bytes = len(p['payload'])
+            np.ndarray(n_bytes, dtype=np.uint8, buffer=shm.buf, offset=offset)[:] = p['payload']
+            meta = {k: v for k, v in p.items() if k != 'payload'}
+            tasks.append((shm.name, offset, n_bytes, meta, cfg, scratch_dir))
+            offset += n_bytes
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_process_shared_burst, tasks))
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return [(_attach_scratch_arrays(p), t) for p, t in results]
+
+def _timed_process_burst(packed, burst_config, scratch_dir=None, detach=False):
+    ''' process_packed_burst, plus the time it took. Set detach when
+        the result is headed back to another process. '''
+    t0 = time.perf_counter()
+    processed = process_packed_burst(packed, burst_config, scratch_dir)
+    if detach:
+        processed = _detach_scratch_arrays(processed)
+    return processed, time.perf_counter() - t0
+
+def _process_shared_burst(task):
+    ''' Worker-side half of process_bursts: attach to the shared payload block,
+        and reassemble one burst from its slice. '''
+    name, offset, n_bytes, meta, burst_config, scratch_dir = task
+
+    try:
+        # Python 3.13+: the parent owns the block; don't let this process's tracker unlink it
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+
+    packed = dict(meta)
+    packed['payload'] = np.ndarray(n_bytes, dtype=np.uint8, buffer=shm.buf, offset=offset)
+    try:
+        return _timed_process_burst(packed, burst_config, scratch_dir, detach=True)
+    finally:
+        # Drop our view into the block before closing it
+        packed.clear()
+        try:
+            shm.close()
+        except BufferError:
+            pass
+
+def _run_burst_jobs(jobs, extras, workers, scratch_dir, logger):
+    ''' Reassemble the bursts gathered by one of the decode_burst_data_* methods,
+        and tack on the per-burst fields each decoder knows about. '''
+    completed_bursts = []
+    for (processed, seconds), extra in zip(process_bursts(jobs, workers, scratch_dir), extras):
+        processed.update(extra)
+        logger.info(f"reassembled experiment number {extra['experiment_number']} in {seconds:.3f} sec")
+        completed_bursts.append(processed)
+    return completed_bursts
+
 def decode_GPS_data(data):
     '''
     Author:     Austin Sousa
@@ -1361,41 +1718,89 @@ def decode_survey_data(packets, separation_time = 4.5):
     return S_data, unused
 
 
+def product_digest(obj, digest_size=16):
+    ''' A blake2b fingerprint of a data product (survey, burst, or status entry), or any
+        structure of dicts, lists, arrays, and scalars.
+
+        Arrays are hashed from their raw bytes, along with dtype and shape; dictionaries in
+        sorted key order. Ints and floats hash the same whether they're Python or numpy
+        scalars, so products read back from file match the ones we decoded.
+        Returns a hex string.
+    '''
+    h = hashlib.blake2b(digest_size=digest_size)
+    _update_digest(h, obj)
+    return h.hexdigest()
+
+def _update_digest(h, obj):
+    ''' Feeds one object into a running product_digest '''
+    if isinstance(obj, dict):
+        h.update(b'd%d;' % len(obj))
+        for k in sorted(obj, key=str):
+            _update_digest(h, k)
+            _update_digest(h, obj[k])
+    elif isinstance(obj, (list, tuple)):
+        h.update(b'l%d;' % len(obj))
+        for v in obj:
+            _update_digest(h, v)
+    elif isinstance(obj, np.ndarray) and obj.dtype != object:
+        h.update(f'a{obj.dtype.str}{obj.shape};'.encode())
+        # A piece at a time, so memmapped bursts don't get copied whole
+        flat = np.ascontiguousarray(obj).reshape(-1)
+        for i in range(0, len(flat), 1 << 20):
+            h.update(flat[i:(i + (1 << 20))].tobytes())
+    elif isinstance(obj, np.ndarray):
+        h.update(f'o{obj.shape};'.encode())
+        for v in obj.ravel():
+            _update_digest(h, v)
+    elif isinstance(obj, (bool, np.bool_)):
+        h.update(b'b1;' if obj else b'b0;')
+    elif isinstance(obj, (int, np.integer)):
+        h.update(b'i%d;' % int(obj))
+    elif isinstance(obj, (float, np.floating)):
+        h.update(f'f{float(obj)!r};'.encode())
+    elif isinstance(obj, str):
+        data = obj.encode()
+        h.update(b's%d;' % len(data))
+        h.update(data)
+    elif isinstance(obj, bytes):
+        h.update(b'y%d;' % len(obj))
+        h.update(obj)
+    elif obj is None:
+        h.update(b'n;')
+    else:
+        h.update(f'r{obj!r};'.encode())
+
 def unique_entries(in_list):
-    # Python doesn't like to compare complex entries (dicts containing dicts, numpy arrays)
-    # So we're explicitly generating a hash of the entry, by casting the whole thing to a string.
-    # It's slow but probably works!
-    
-    # 1. compute hash
-    for el in in_list:
-        # Here's a quick and dirty hash function. Might fail on nested dictionaries,
-        # since we're only sorting the top-level dictionary (e.g., the GPS entries might
-        # come up in a different order)
-        el['id'] = hash(str(sorted(el.items())))
-    
-    # 2. build a temporary dictionary of values, with hash as key
-    temp = list({v['id']: v for v in in_list}.values())
-    
-    # 3. ditch the hash, for cleanliness:
-    #    - Pop from in_list, not temp, since the elements themselves
-    #      are identified by reference. If we pop from temp, we'll leave
-    #      'id' elements in the duplicate entries.
-    for el in in_list:
-        el.pop('id')
-    
-    return temp
+    ''' Removes duplicate products from a list, in O(N), by product_digest.
+        Where there are duplicates, the last copy wins, but keeps the position
+        of the first. '''
+    digests = [product_digest(el) for el in in_list]
+    return list({d: el for d, el in zip(digests, in_list)}.values())
 
+def products_equal(p1, p2):
+    ''' True if two products have identical contents (NaNs in the same places count as equal) '''
+    return product_digest(p1) == product_digest(p2)
 
 def deep_compare(d1, d2):
     ''' Implements a recursive deep compare of two objects
         (lists, dictionaries, arrays, or otherwise comparable)
         and any structure comprised of these types. '''
-    
+
+    # Fast path: identical contents
+    if isinstance(d1, (dict, list, np.ndarray)) and products_equal(d1, d2):
+        return True
+
+    # Otherwise walk it, and report what's different
+    return _deep_compare(d1, d2)
+
+def _deep_compare(d1, d2):
+    ''' The element-by-element walk behind deep_compare '''
+
     # Check types
     if not isinstance(d1, type(d2)):
         print(f'Type mismatch: {type(d1)}, {type(d2)}')
         return False
-    
+
     # Root nodes are dictionaries -- process each element
     if isinstance(d1, dict):
         k1 = sorted(d1.keys())
@@ -1407,25 +1812,35 @@ def deep_compare(d1, d2):
             return False
 
         for k in k1:
-            if not deep_compare(d1[k], d2[k]):
+            if not _deep_compare(d1[k], d2[k]):
                 print(f'{k} does not match')
                 return False
         return True
 
+    # Numeric arrays -- compare in one go
+    if isinstance(d1, np.ndarray) and d1.dtype != object and d2.dtype != object:
+        if d1.shape != d2.shape:
+            return False
+        same = (d1 == d2)
+        if d1.dtype.kind in 'fc' and d2.dtype.kind in 'fc':
+            # Numpy compares nans as false
+            same |= (np.isnan(d1) & np.isnan(d2))
+        return bool(np.all(same))
+
     # Root nodes are lists or arrays -- process each element
     if (isinstance(d1, list) or isinstance(d1, np.ndarray)):
         if len(d1) != len(d2):
             return False
         for a, b in zip(d1, d2):
-            if not deep_compare(a, b):
+            if not _deep_compare(a, b):
                 return False
-            return True
+        return True
 
     # Base case -- do simple comparisons
-    if isinstance(d1, np.float):
+    if isinstance(d1, float):
         # Numpy compares nans as false
         if np.isnan(d1) and np.isnan(d2):
             return True
 
     # Strings, ints, numbers, whatever
-    return d1==d2
\ No newline at end of file
+    return d1==d2
@@ -7,7 +7,7 @@ import os
 import logging
 import gzip
 import pickle
-import scipy.io as spio
+import json
 
 def write_status_XML(in_data, filename="status_messages.xml"):
     '''write status messages to an xml file'''
@@ -107,6 +107,13 @@ def read_survey_XML(filename):
     # Return a list of dicts
     return outs
 
+def _format_samples(samples, chunk_size=65536):
+    ''' Comma-separated text for a vector of samples, formatted a chunk at a time
+        (so out-of-core, memmapped bursts only get paged in piecewise) '''
+    fmt = '{0:g}'.format
+    return ','.join(','.join(map(fmt, samples[i:(i + chunk_size)].tolist()))
+                    for i in range(0, len(samples), chunk_size))
+
 def write_burst_XML(in_data, filename='burst_data.xml'):
     ''' write a list of burst elements to an xml file. '''
 
@@ -152,6 +159,14 @@ def write_burst_XML(in_data, filename='burst_data.xml'):
                     cur_item = ET.SubElement(gps_el,k)
                     cur_item.text = str(v)
 
+        if 'gaps' in entry_data:
+            # Missing byte ranges for each channel, as start:stop pairs
+            gaps = ET.SubElement(entry, 'gaps')
+            for k, v in entry_data['gaps'].items():
+                gap_el = ET.SubElement(gaps, k)
+                gap_el.set('length', str(v['length']))
+                gap_el.text = ','.join(f'{a}:{b}' for a, b in v['missing'])
+
 
         # # Status entries
         # stat = ET.SubElement(entry,'status')
@@ -175,11 +190,11 @@ def write_burst_XML(in_data, filename='burst_data.xml'):
             # Time domain
             E_data_elem = ET.SubElement(entry,'E_data')
             E_data_elem.set('mode','time domain')
-            E_str = ''.join(['{0:g},'.format(x) for x in entry_data['E']])[0:-1]
+            E_str = _format_samples(entry_data['E'])
             E_data_elem.text = E_str
             B_data_elem = ET.SubElement(entry,'B_data')
             B_data_elem.set('mode','time domain')
-            B_str = ''.join(['{0:g},'.format(x) for x in entry_data['B']])[0:-1]
+            B_str = _format_samples(entry_data['B'])
             B_data_elem.text = B_str
 
         if entry_data['config']['TD_FD_SELECT']==0:
@@ -189,9 +204,9 @@ def write_burst_XML(in_data, filename='burst_data.xml'):
             E_real = ET.SubElement(E_data_elem,'real')
             E_imag = ET.SubElement(E_data_elem,'imag')
 
-            E_str = ''.join(['{0:g},'.format(np.real(x)) for x in entry_data['E']])[0:-1]
+            E_str = _format_samples(np.real(entry_data['E']))
             E_real.text = E_str
-            E_str = ''.join(['{0:g},'.format(np.imag(x)) for x in entry_data['E']])[0:-1]
+            E_str = _format_samples(np.imag(entry_data['E']))
             E_imag.text = E_str
 
             B_data_elem = ET.SubElement(entry,'B_data')
@@ -199,9 +214,9 @@ def write_burst_XML(in_data, filename='burst_data.xml'):
             B_real = ET.SubElement(B_data_elem,'real')
             B_imag = ET.SubElement(B_data_elem,'imag')
 
-            B_str = ''.join(['{0:g},'.format(np.real(x)) for x in entry_data['B']])[0:-1]
+            B_str = _format_samples(np.real(entry_data['B']))
             B_real.text = B_str
-            B_str = ''.join(['{0:g},'.format(np.imag(x)) for x in entry_data['B']])[0:-1]
+            B_str = _format_samples(np.imag(entry_data['B']))
             B_imag.text = B_str
 
 
@@ -290,6 +305,15 @@ def read_burst_XML(filename):
                 except:
                     tmp_dict[el.tag] = float(el.text)
             d['G'].append(tmp_dict)
+
+        # Load gap maps
+        if S.find('gaps') is not None:
+            d['gaps'] = dict()
+            for el in S.find('gaps'):
+                text = (el.text or '').strip()
+                ranges = [r.split(':') for r in text.split(',')] if text else []
+                d['gaps'][el.tag] = {'length': int(el.get('length')),
+                                     'missing': np.array(ranges, dtype=np.int64).reshape(-1, 2)}
         outs.append(d)
         logger.info(f"loaded {len(d['G'])} GPS elements")
 
@@ -380,6 +404,8 @@ def loadmat(filename, var_names = None):
     from mat files. It calls the function check keys to cure all entries
     which are still mat-objects
     '''
+    import scipy.io as spio
+
     def _check_keys(d):
         '''
         checks if entries in dictionary are mat-objects. If yes
@@ -449,7 +475,52 @@ def read_burst_matlab(filename):
         return [bd]
     else:
         return []
-    
+
+def write_products_npz(in_data, filename='products.npz'):
+    ''' Write a list of data products (survey, burst, or status) to a compressed .npz file.
+
+        Each numeric array is stored as-is, as its own member of the archive; everything
+        else (dicts, lists, scalars, strings) goes into a JSON description of the structure,
+        which refers to the arrays by name. Nothing is pickled.
+    '''
+    arrays = dict()
+    structure = _npz_encode(list(in_data), arrays)
+    np.savez_compressed(filename, __structure__=np.array(json.dumps(structure)), **arrays)
+
+def read_products_npz(filename):
+    ''' Read a list of data products written by write_products_npz '''
+    with np.load(filename, allow_pickle=False) as f:
+        structure = json.loads(str(f['__structure__']))
+        return _npz_decode(structure, f)
+
+def _npz_encode(obj, arrays):
+    ''' JSON-able version of obj; numeric arrays get moved into arrays, and replaced by a reference '''
+    if isinstance(obj, dict):
+        return {'__dict__': [[_npz_encode(k, arrays), _npz_encode(v, arrays)] for k, v in obj.items()]}
+    if isinstance(obj, (list, tuple)):
+        return [_npz_encode(v, arrays) for v in obj]
+    if isinstance(obj, np.ndarray):
+        if obj.dtype == object:
+            return {'__list__': [_npz_encode(v, arrays) for v in obj.tolist()]}
+        name = f'a{len(arrays)}'
+        arrays[name] = obj
+        return {'__array__': name}
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+def _npz_decode(obj, f):
+    ''' Inverse of _npz_encode '''
+    if isinstance(obj, list):
+        return [_npz_decode(v, f) for v in obj]
+    if isinstance(obj, dict):
+        if '__array__' in obj:
+            return f[obj['__array__']]
+        if '__list__' in obj:
+            return np.array([_npz_decode(v, f) for v in obj['__list__']], dtype=object)
+        return {_npz_decode(k, f): _npz_decode(v, f) for k, v in obj['__dict__']}
+    return obj
+
 if __name__ == '__main__':
 
     import os
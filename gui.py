@@ -1,10 +1,11 @@
 import time
+_startup_t0 = time.perf_counter()   # (for --measure_startup)
 import logging
 import os
 import sys
 import pickle
 import gzip
-import queue
+import shutil
 import tkinter as tk # Python 3.x
 import tkinter.scrolledtext as ScrolledText
 from tkinter import filedialog
@@ -13,29 +14,53 @@ from data_handlers import *  # Data processing modules
 from file_handlers import *  # Loading and writing modules
 from gui_plots import *      # Plotting modules
 from db_handlers import get_packets_within_range
+from packet_handlers import PacketDedupeIndex, PacketStore
+from product_handlers import ProductCatalog
+from lshell_handlers import attach_lshell
+from gui_jobs import JobRunner
 import datetime
-import dateutil
-import subprocess
-
-from scipy.io import savemat, loadmat
+import dateutil.parser
+import argparse
+import json
 # try:
 #     from __ver__ import __ver__
 # except:
 #     __ver__ = "N/A"
 
 
+def git_commit_hash(repo_dir, length=8):
+    ''' The checked-out commit, read straight out of the .git directory
+        (rather than starting up a git process). Returns '' if it can't tell. '''
+    git_dir = os.path.join(repo_dir, '.git')
+    try:
+        with open(os.path.join(git_dir, 'HEAD')) as f:
+            head = f.read().strip()
+        if head.startswith('ref:'):
+            ref = head[4:].strip()
+            ref_file = os.path.join(git_dir, ref)
+            if os.path.exists(ref_file):
+                with open(ref_file) as f:
+                    head = f.read().strip()
+            else:
+                # Refs get moved into packed-refs by git gc
+                head = ''
+                with open(os.path.join(git_dir, 'packed-refs')) as f:
+                    for line in f:
+                        fields = line.split()
+                        if len(fields) == 2 and fields[1] == ref:
+                            head = fields[0]
+        return head[:length]
+    except OSError:
+        return ''
+
 class GUI(tk.Frame):
 
     # This class defines the graphical user interface             
     def __init__(self, parent, *args, **kwargs):
 
 
-        try:
-            process = subprocess.Popen(['git', 'rev-parse', 'HEAD'], shell=False, stdout=subprocess.PIPE)
-            git_head_hash = process.communicate()[0].strip()[0:8]
-            git_str = "commit # " + git_head_hash.decode('utf-8')
-        except:
-            git_str = ''
+        git_head_hash = git_commit_hash(os.path.dirname(os.path.abspath(__file__)))
+        git_str = "commit # " + git_head_hash if git_head_hash else ''
 
 
         # ----------------------- GUI setup ---------------------------
@@ -65,10 +90,11 @@ class GUI(tk.Frame):
         logging.getLogger('matplotlib').setLevel(logging.WARNING)
 
         # data fields
-        self.packets = [] # Decoded packets from telemetry
-        self.burst_products = []    # Decoded data products from packets
-        self.survey_products = []
-        self.status_messages = []
+        self.packets = PacketStore() # Decoded packets from telemetry, in time order
+        self.packet_index = PacketDedupeIndex() # Packets seen so far, to drop duplicates on load
+        self.burst_products = ProductCatalog()    # Decoded data products from packets
+        self.survey_products = ProductCatalog()
+        self.status_messages = ProductCatalog()
 
         self.do_tlm = tk.BooleanVar()
         self.do_csv = tk.BooleanVar()
@@ -105,8 +131,8 @@ class GUI(tk.Frame):
         self.line_plot_enables[self.line_plot_fields.index('Lshell')].set(True)
 
         self.file_format = tk.StringVar()
-        self.available_formats =['XML','Pickle','Matlab']
-        self.file_suffixes =    ['xml','pkl','mat']
+        self.available_formats =['XML','Pickle','Matlab','Numpy']
+        self.file_suffixes =    ['xml','pkl','mat','npz']
         self.file_format.set(self.available_formats[0])
         self.file_suffix = tk.StringVar()
         self.file_suffix.set(self.file_suffixes[0])
@@ -421,6 +447,10 @@ class GUI(tk.Frame):
         self.listbox = tk.Listbox(self.root, height=6, width=30, selectmode = tk.EXTENDED)
         self.listbox.grid(row = plot_row + 12, column = 2, columnspan=2, rowspan=6)
 
+        # ----------- Background jobs: status, progress, and cancel -----------
+        self.jobs = JobRunner(self.root)
+        self.jobs.frame.grid(row=nrows, column=0, columnspan=ncols, sticky='ew')
+
         # Run some updaters. eh, this should be done in a callback, but... shrug
         self.update_burst_list()
         self.update_counters()
@@ -446,12 +476,29 @@ class GUI(tk.Frame):
             logging.warning(f'could not find database: {database}')
             return False
 
-        self.packets.extend(get_packets_within_range(database, t1=p1, t2=p2))
-        self.update_counters()
+        def compute(job):
+            packets = get_packets_within_range(database, t1=p1, t2=p2)
+            job.check()
+            return self.merge_packets([(database, packets)])
 
+        def apply(merged):
+            self.packet_index, self.packets = merged
+            logging.info(self.packet_index.overlap_report())
+            self.update_counters()
 
+        self.jobs.submit('Loading from database', compute, apply)
         return True
 
+    def merge_packets(self, batches, index=None, store=None):
+        ''' Drops duplicates from batches of (source, packets), and merges what's left into
+            copies of the loaded packets (or into a given index and store). Call it from a
+            job's compute step, and swap the returned (index, store) in from its apply. '''
+        index = self.packet_index.copy() if index is None else index
+        store = self.packets.copy() if store is None else store
+        for source, batch in batches:
+            store.extend(index.add(batch, source=source))
+        return index, store
+
     def load_calibration(self):
         logging.info('Selecting calibration file')
         self.cal_file = filedialog.askopenfilename(initialdir=os.getcwd())
@@ -461,10 +508,11 @@ class GUI(tk.Frame):
 
     def clear_data(self):
         logging.info('Clearing all loaded data')
-        self.packets = []
-        self.burst_products = []
-        self.survey_products = []
-        self.status_messages = []
+        self.packets = PacketStore()
+        self.packet_index = PacketDedupeIndex()
+        self.burst_products = ProductCatalog()
+        self.survey_products = ProductCatalog()
+        self.status_messages = ProductCatalog()
         self.update_counters()
         self.update_burst_list()
         self.update_survey_time_fields()
@@ -476,9 +524,14 @@ class GUI(tk.Frame):
         logging.info('Please select an output directory')
         self.out_dir.set(filedialog.askdirectory(initialdir=self.in_dir.get()))
         fname = os.path.join(self.out_dir.get(), 'packets.pkl')
-        logging.info(f'Saving decoded packets to {fname}')
-        with open(fname,'wb') as file:
-            pickle.dump(self.packets, file)
+        packets = list(self.packets)
+
+        def compute(job):
+            logging.info(f'Saving decoded packets to {fname}')
+            with open(fname,'wb') as file:
+                pickle.dump(packets, file)
+
+        self.jobs.submit('Saving packets', compute)
         return
 
     def save_survey(self, update_dir=True):
@@ -491,32 +544,41 @@ class GUI(tk.Frame):
             try:
                 t1 = dateutil.parser.parse(self.save_t1_entry.get()).replace(tzinfo=datetime.timezone.utc)
                 t2 = dateutil.parser.parse(self.save_t2_entry.get()).replace(tzinfo=datetime.timezone.utc)
-                outdata = list(filter(lambda p: (p['header_timestamp'] >= t1.timestamp()) and (p['header_timestamp'] <= t2.timestamp()), self.survey_products))
+                outdata = self.survey_products.time_range(t1.timestamp(), t2.timestamp())
                 logging.info(f'saving survey products between {t1} and {t2}')
             except:
                 t1 = None
                 t2 = None
-                outdata = self.survey_products
-
-            if self.file_format.get() in 'XML':
-                logging.info(f'saving {len(outdata)} survey products to {outpath}')
-                write_survey_XML(outdata,outpath)
-            
-            elif self.file_format.get() in 'Matlab':
-                logging.info(f'saving {len(outdata)} survey products to {outpath}')
-                savemat(outpath, {'survey_data' : outdata})
-            
-            elif self.file_format.get() in 'Pickle':
-                logging.info(f'saving {len(outdata)} survey products to {outpath}')
-                with open(outpath,'wb') as file:
-                    pickle.dump(outdata, file)
-            else:
-                logging.info(f'{self.file_format.get()} not yet implemented - go bug Austin about it')
+                outdata = list(self.survey_products)
+
+            file_format = self.file_format.get()
+
+            def compute(job):
+                if file_format in 'XML':
+                    logging.info(f'saving {len(outdata)} survey products to {outpath}')
+                    write_survey_XML(outdata,outpath)
+
+                elif file_format in 'Matlab':
+                    logging.info(f'saving {len(outdata)} survey products to {outpath}')
+                    from scipy.io import savemat
+                    savemat(outpath, {'survey_data' : outdata})
+
+                elif file_format in 'Pickle':
+                    logging.info(f'saving {len(outdata)} survey products to {outpath}')
+                    with open(outpath,'wb') as file:
+                        pickle.dump(outdata, file)
+
+                elif file_format in 'Numpy':
+                    logging.info(f'saving {len(outdata)} survey products to {outpath}')
+                    write_products_npz(outdata, outpath)
+                else:
+                    logging.info(f'{file_format} not yet implemented - go bug Austin about it')
+
+            self.jobs.submit('Saving survey data', compute)
         else:
             logging.info('No survey data to save')
         return
 
-
     def save_burst(self, update_dir=True):
 
         if self.burst_products:
@@ -528,30 +590,39 @@ class GUI(tk.Frame):
             try:
                 t1 = dateutil.parser.parse(self.save_t1_entry.get()).replace(tzinfo=datetime.timezone.utc)
                 t2 = dateutil.parser.parse(self.save_t2_entry.get()).replace(tzinfo=datetime.timezone.utc)
-                outdata = list(filter(lambda p: (p['header_timestamp'] >= t1.timestamp()) and (p['header_timestamp'] <= t2.timestamp()), self.burst_products))
+                outdata = self.burst_products.time_range(t1.timestamp(), t2.timestamp())
                 logging.info(f'saving burst products between {t1} and {t2}')
             except:
                 t1 = None
                 t2 = None
-                outdata = self.burst_products
+                outdata = list(self.burst_products)
 
+            file_format = self.file_format.get()
 
-            if self.file_format.get() in 'XML':
-                logging.info(f'saving {len(outdata)} burst products to {outpath}')
-                write_burst_XML(outdata, outpath)
+            def compute(job):
+                if file_format in 'XML':
+                    logging.info(f'saving {len(outdata)} burst products to {outpath}')
+                    write_burst_XML(outdata, outpath)
 
-            elif self.file_format.get() in 'Matlab':
-                logging.info(f'saving {len(outdata)} burst products to {outpath}')
-                savemat(outpath, {'burst_data' : outdata})
+                elif file_format in 'Matlab':
+                    logging.info(f'saving {len(outdata)} burst products to {outpath}')
+                    from scipy.io import savemat
+                    savemat(outpath, {'burst_data' : outdata})
 
-            elif self.file_format.get() in 'Pickle':
-                logging.info(f'saving {len(outdata)} burst products to {outpath}')
-                with open(outpath, 'wb') as file:
-                    pickle.dump(outdata, file)
-            else:
-                logging.info(f'{self.file_format.get()} not yet implemented - go bug Austin about it')
+                elif file_format in 'Pickle':
+                    logging.info(f'saving {len(outdata)} burst products to {outpath}')
+                    with open(outpath, 'wb') as file:
+                        pickle.dump(outdata, file)
+
+                elif file_format in 'Numpy':
+                    logging.info(f'saving {len(outdata)} burst products to {outpath}')
+                    write_products_npz(outdata, outpath)
+                else:
+                    logging.info(f'{file_format} not yet implemented - go bug Austin about it')
+
+            self.jobs.submit('Saving burst data', compute)
         else:
-            logging.info('NO burst data to save')    
+            logging.info('NO burst data to save')
         return
 
     def save_stats(self, update_dir=True):
@@ -560,35 +631,44 @@ class GUI(tk.Frame):
                 self.out_dir.set(filedialog.askdirectory(initialdir=self.out_dir.get()))
 
             outpath = os.path.join(self.out_dir.get(), self.status_entry.get())
-         
+
             try:
                 t1 = dateutil.parser.parse(self.save_t1_entry.get()).replace(tzinfo=datetime.timezone.utc)
                 t2 = dateutil.parser.parse(self.save_t2_entry.get()).replace(tzinfo=datetime.timezone.utc)
-                outdata = list(filter(lambda p: (p['header_timestamp'] >= t1.timestamp()) and (p['header_timestamp'] <= t2.timestamp()), self.status_messages))
+                outdata = self.status_messages.time_range(t1.timestamp(), t2.timestamp())
                 logging.info(f'saving status messages between {t1} and {t2}')
             except:
                 t1 = None
                 t2 = None
-                outdata = self.status_messages
+                outdata = list(self.status_messages)
 
+            file_format = self.file_format.get()
 
-            if self.file_format.get() in 'XML':
-                logging.info(f'saving {len(outdata)} status messages to {outpath}')
-                write_status_XML(outdata, outpath)
+            def compute(job):
+                if file_format in 'XML':
+                    logging.info(f'saving {len(outdata)} status messages to {outpath}')
+                    write_status_XML(outdata, outpath)
 
-            elif self.file_format.get() in 'Matlab':
-                logging.info(f'saving {len(outdata)} status messages to {outpath}')
-                savemat(outpath, {'status_messages' : outdata})
+                elif file_format in 'Matlab':
+                    logging.info(f'saving {len(outdata)} status messages to {outpath}')
+                    from scipy.io import savemat
+                    savemat(outpath, {'status_messages' : outdata})
 
-            elif self.file_format.get() in 'Pickle':
-                logging.info(f'saving {len(outdata)} status messages to {outpath}')
-                with open(outpath,'wb') as file:
-                    pickle.dump(outdata, file)
+                elif file_format in 'Pickle':
+                    logging.info(f'saving {len(outdata)} status messages to {outpath}')
+                    with open(outpath,'wb') as file:
+                        pickle.dump(outdata, file)
 
-            else:
-                logging.info(f'{self.file_format.get()} not yet implemented - go bug Austin about it')
+                elif file_format in 'Numpy':
+                    logging.info(f'saving {len(outdata)} status messages to {outpath}')
+                    write_products_npz(outdata, outpath)
+
+                else:
+                    logging.info(f'{file_format} not yet implemented - go bug Austin about it')
+
+            self.jobs.submit('Saving status messages', compute)
         else:
-            logging.info('NO status messages to save')    
+            logging.info('NO status messages to save')
         return
 
     def save_all(self):
@@ -619,22 +699,20 @@ class GUI(tk.Frame):
 
     def update_time_fields(self):
         if self.packets:
-            self.packets = sorted(self.packets, key = lambda p: p['header_timestamp'])
             self.t1_entry.delete(0, tk.END)
-            self.t1_entry.insert(0, datetime.datetime.utcfromtimestamp(self.packets[0]['header_timestamp']).isoformat())
+            self.t1_entry.insert(0, datetime.datetime.utcfromtimestamp(self.packets.t_min()).isoformat())
             self.t2_entry.delete(0, tk.END)
-            self.t2_entry.insert(0, datetime.datetime.utcfromtimestamp(self.packets[-1]['header_timestamp']).isoformat())
+            self.t2_entry.insert(0, datetime.datetime.utcfromtimestamp(self.packets.t_max()).isoformat())
         
     def update_survey_time_fields(self, *kwargs):
         if len(self.survey_products) > 0:
             bus_timestamps=self.survey_time_axis.get()
             if bus_timestamps:
-                s1 = min([x['header_timestamp'] for x in self.survey_products])
-                s2 = max([x['header_timestamp'] for x in self.survey_products])
+                s1 = self.survey_products.t_min()
+                s2 = self.survey_products.t_max()
             else:
-                S_with_GPS = list(filter(lambda x: (('GPS' in x) and ('timestamp' in x['GPS'][0])), self.survey_products))
-                s1 = min([x['GPS'][0]['timestamp'] for x in S_with_GPS])
-                s2 = max([x['GPS'][0]['timestamp'] for x in S_with_GPS])
+                s1 = self.survey_products.t_min(gps=True)
+                s2 = self.survey_products.t_max(gps=True)
 
             self.s1_entry.delete(0, tk.END)
             self.s1_entry.insert(0, datetime.datetime.utcfromtimestamp(s1).isoformat())
@@ -679,59 +757,90 @@ class GUI(tk.Frame):
     def load_survey_file(self):
         logger = logging.getLogger(__name__)
         fname=filedialog.askopenfilename(initialdir=self.in_dir.get())
+        if not fname:
+            return
 
-        if fname and fname.endswith(".xml"):
-            self.survey_products.extend(read_survey_XML(fname))
+        def read_file():
+            if fname.endswith(".xml"):
+                return read_survey_XML(fname)
+            if fname.endswith(".mat"):
+                return read_survey_matlab(fname)
+            if fname.endswith(".pkl"):
+                with open(fname,'rb') as file:
+                    return pickle.load(file)
+            if fname.endswith(".npz"):
+                return read_products_npz(fname)
+            return []
 
-        if fname and fname.endswith(".mat"):
-            self.survey_products.extend(read_survey_matlab(fname))
+        def compute(job):
+            products = read_file()
+            job.check()
+            # Loading the same data twice shouldn't double it up
+            return ProductCatalog(unique_entries(list(self.survey_products) + list(products)))
 
-        if fname and fname.endswith(".pkl"):
-            with open(fname,'rb') as file:
-                self.survey_products.extend(pickle.load(file))
+        def apply(catalog):
+            self.survey_products = catalog
 
-        logger.info(f'Loaded {len(self.survey_products)} survey entries from {fname}')
-        self.update_counters()
-        self.update_survey_time_fields()            
+            logger.info(f'Loaded {len(self.survey_products)} survey entries from {fname}')
+            self.update_counters()
+            self.update_survey_time_fields()
+
+        self.jobs.submit('Loading survey data', compute, apply)
 
     def load_burst_file(self):
         logger = logging.getLogger(__name__)
         fname=filedialog.askopenfilename(initialdir=self.in_dir.get())
+        if not fname:
+            return
 
-        if fname:
+        def read_file():
             if fname.endswith(".xml"):
-                self.burst_products.extend(read_burst_XML(fname))
-
+                return read_burst_XML(fname)
             if fname.endswith(".mat"):
-
-                self.burst_products.extend(read_burst_matlab(fname))
-
+                return read_burst_matlab(fname)
             if fname.endswith(".pkl"):
                 with open(fname,'rb') as file:
-                    self.burst_products.extend(pickle.load(file))
+                    return pickle.load(file)
+            if fname.endswith(".npz"):
+                return read_products_npz(fname)
+            return []
+
+        def compute(job):
+            products = read_file()
+            job.check()
+            return ProductCatalog(unique_entries(list(self.burst_products) + list(products)))
+
+        def apply(catalog):
+            self.burst_products = catalog
 
             logger.info(f'Loaded {len(self.burst_products)} burst entries from {fname}')
             self.update_counters()
             self.update_burst_list()
             self.update_stat_list()
-        
+
+        self.jobs.submit('Loading burst data', compute, apply)
+
     def load_previous_packets(self):
         logger = logging.getLogger(__name__)
 
         fname=filedialog.askopenfilename(initialdir=self.in_dir)
+        if not (fname and (fname.endswith(".pkl") or fname.endswith(".pklz"))):
+            return
 
-        if fname and fname.endswith(".pkl"):
-            logger.info(f'Opening {fname}')
-            with open(fname,'rb') as file:
-                self.packets.extend(pickle.load(file))
-
-        if fname and fname.endswith(".pklz"):
+        def compute(job):
             logger.info(f'Opening {fname}')
-            with gzip.open(fname,'rb') as file:
-                self.packets.extend(pickle.load(file))
-
+            opener = gzip.open if fname.endswith(".pklz") else open
+            with opener(fname,'rb') as file:
+                packets = pickle.load(file)
+            job.check()
+            return self.merge_packets([(fname, packets)])
+
+        def apply(merged):
+            self.packet_index, self.packets = merged
             self.packet_len_text.set(f"{len(self.packets)} packets loaded")
-        
+            logger.info(self.packet_index.overlap_report())
+
+        self.jobs.submit('Loading packets', compute, apply)
         return
 
     def select_packet_db(self):
@@ -759,22 +868,15 @@ class GUI(tk.Frame):
             # Select subset of the survey data
             s1 = dateutil.parser.parse(self.s1_entry.get()).replace(tzinfo=datetime.timezone.utc)
             s2 = dateutil.parser.parse(self.s2_entry.get()).replace(tzinfo=datetime.timezone.utc)
-            if self.survey_time_axis.get():
-                # GPS timestamps
-                cur_survey = list(filter(lambda x:  ('GPS' in x) and 
-                                                    ('timestamp' in x['GPS'][0]) and
-                                                    (x['GPS'][0]['timestamp'] > s1.timestamp() - 60) and
-                                                    (x['GPS'][0]['timestamp'] < s2.timestamp() + 60), self.survey_products))
-            else:
-                # bus timestamps
-                cur_survey = list(filter(lambda x:  (x['header_timestamp'] > s1.timestamp() - 60) and
-                                                    (x['header_timestamp'] < s2.timestamp() + 60), self.survey_products))
+            # GPS timestamps, or bus timestamps
+            cur_survey = self.survey_products.time_range(s1.timestamp() - 60, s2.timestamp() + 60,
+                                                         gps=self.survey_time_axis.get())
 
         except:
             logging.warning("couldn't parse survey start and end times -- using defaults")
             s1 = None
             s2 = None
-            cur_survey = self.survey_products
+            cur_survey = list(self.survey_products)
 
         if not cur_survey:
             logging.info('No survey data within selected time range')
@@ -820,144 +922,154 @@ class GUI(tk.Frame):
 
     def get_burst_command(self):
         ''' Parse and validate the command entered in the text box '''
-        logger=logging.getLogger(__name__)
-        inp_str = self.cmd_entry.get().strip(' []{}\t')
-
-        logger.info(f'inp_str: {inp_str}')
-        if inp_str.startswith('0x'):
-            # Hex string
-            logger.info('hex')
-            cmd = [int(inp_str[2:4], 16),int(inp_str[4:6], 16),int(inp_str[6:8], 16)]
-        elif len(inp_str) == 24:
-            # Binary ascii string
-            logger.info('binary')
-            cmd = [int(inp_str[0:8],2), int(inp_str[8:16],2), int(inp_str[16:],2)]
-        else:
-            # 3 ints:
-            logger.info('ints')
-            if ',' in inp_str:
-                cmd = np.fromstring(inp_str, dtype=int, sep=',')
-            else:
-                cmd = np.fromstring(inp_str, dtype=int, sep=' ')
-        logger.info(f'cmd: {cmd}')
-        return cmd
+        return parse_burst_command(self.cmd_entry.get())
 
     def process_burst_and_survey(self):
         logger = logging.getLogger("root.process_burst_and_survey")
 
-        logger.info("Processing burst and survey packets...") 
+        logger.info("Processing burst and survey packets...")
         # ----------------- Process any packets we have -------------
-        if self.packets:
-            # Sort by header timestamp
-            self.packets = sorted(self.packets, key = lambda p: p['header_timestamp'])
+        if not self.packets:
+            logger.info('No packets loaded!')
+            return True
+
+        # Read everything we need out of the widgets here, on the main loop
+        # (self.packets is kept sorted by header timestamp)
+        packets = list(self.packets)
+        do_burst = self.do_burst.get()
+        do_survey = self.do_survey.get()
+        burst_mode = self.burst_mode.get()
+        if do_burst and burst_mode in 'Group by Timestamps':
+            t1 = dateutil.parser.parse(self.t1_entry.get()).replace(tzinfo=datetime.timezone.utc)
+            t2 = dateutil.parser.parse(self.t2_entry.get()).replace(tzinfo=datetime.timezone.utc)
+            burst_packets = self.packets.time_range(t1.timestamp(), t2.timestamp())
+        if do_burst and burst_mode in ['Group by Timestamps', 'Group by Experiment Number']:
+            burst_cmd = self.get_burst_command()
+            try:
+                n_pulses = int(self.repeats_entry.get())
+            except:
+                n_pulses = None
+
+        def compute(job):
+            outs = dict()
+
             # Process status messages
+            job.progress(None, 'status messages')
             logger.info("Decoding status messages")
-            stats = decode_status(self.packets)
-            self.status_messages = stats
+            outs['status'] = decode_status(packets)
+            job.check()
 
             # Process any bursts
-            if self.do_burst.get():
+            if do_burst:
                 # Three different burst decoding methods to choose from:
+                job.progress(None, 'burst data')
                 logger.info("Decoding burst data")
-                if self.burst_mode.get() in 'Group by Status Packets':
+                if burst_mode in 'Group by Status Packets':
                     # Decode by binning burst packets between two adjacent status packets,
                     # which are automatically requested at the beginning and end of a burst
                     logger.info(f'Processing bursts between status packets')
-                    B_data, unused_burst = decode_burst_data_between_status_packets(self.packets)
-                    self.burst_products.extend(B_data)
-                elif self.burst_mode.get() in 'Group by Timestamps':
+                    B_data, unused_burst = decode_burst_data_between_status_packets(packets)
+                elif burst_mode in 'Group by Timestamps':
                     # Manually bin burst packets between two timestamps
-                    t1 = dateutil.parser.parse(self.t1_entry.get()).replace(tzinfo=datetime.timezone.utc)
-                    t2 = dateutil.parser.parse(self.t2_entry.get()).replace(tzinfo=datetime.timezone.utc)
-                    burst_cmd = self.get_burst_command()
-                    n_pulses = int(self.repeats_entry.get())
                     logger.info(f'Processing bursts between {t1} and {t2}')
-
-                    B_data, unused_burst = decode_burst_data_in_range(self.packets,
+                    B_data, unused_burst = decode_burst_data_in_range(burst_packets,
                                            t1.timestamp(), t2.timestamp(),
                                            burst_cmd = burst_cmd, burst_pulses = n_pulses)
-                    
-                    self.burst_products.extend(B_data)
-                    
-                elif self.burst_mode.get() in 'Group by Experiment Number':
-                #     # Bin bursts by experiment number
-                    burst_cmd = self.get_burst_command()
-                    try:
-                        n_pulses = int(self.repeats_entry.get())
-                    except:
-                        n_pulses = None
+                elif burst_mode in 'Group by Experiment Number':
+                    # Bin bursts by experiment number
                     logger.info(f'Processing bursts by experiment number')
-                    B_data, unused_burst = decode_burst_data_by_experiment_number(self.packets, 
+                    B_data, unused_burst = decode_burst_data_by_experiment_number(packets,
                                            burst_cmd = burst_cmd, burst_pulses = n_pulses)
-                #     outs['burst'] = B_data
-                    self.burst_products.extend(B_data)
-
-                elif self.burst_mode.get() in 'Group by Trailing Status Packet':
-
+                elif burst_mode in 'Group by Trailing Status Packet':
                     logger.info(f'Processing bursts by trailing status packets')
-                    B_data, unused_burst = decode_burst_data_by_trailing_status_packet(self.packets)
-                    self.burst_products.extend(B_data)
-
+                    B_data, unused_burst = decode_burst_data_by_trailing_status_packet(packets)
+                outs['burst'] = attach_lshell(B_data)
+                job.check()
 
             # Process any survey data
-            if self.do_survey.get():
+            if do_survey:
+                job.progress(None, 'survey data')
                 logger.info("Decoding survey data")
-                S_data, unused_survey = decode_survey_data(self.packets)
-                self.survey_products = S_data
+                S_data, unused_survey = decode_survey_data(packets)
+                outs['survey'] = attach_lshell(S_data)
+
+            # Build the catalogs here too, so apply only has to swap them in
+            outs['status'] = ProductCatalog(outs['status'])
+            if 'burst' in outs:
+                outs['burst'] = ProductCatalog(list(self.burst_products) + outs['burst'])
+            if 'survey' in outs:
+                outs['survey'] = ProductCatalog(outs['survey'])
+            return outs
+
+        def apply(outs):
+            self.status_messages = outs['status']
+            if 'burst' in outs:
+                self.burst_products = outs['burst']
+            if 'survey' in outs:
+                self.survey_products = outs['survey']
 
-        else:
-            logger.info('No packets loaded!')
-
-        self.update_counters()
-        self.update_burst_list()
-        self.update_stat_list()
-        self.update_time_fields()
-        self.update_survey_time_fields()
+            self.update_counters()
+            self.update_burst_list()
+            self.update_stat_list()
+            self.update_time_fields()
+            self.update_survey_time_fields()
 
+        self.jobs.submit('Reassembling data products', compute, apply)
         return True
 
     def process_packets(self):
         logger = logging.getLogger()
 
-        
-        logger.info("Processing telemetry packets...") 
+
+        logger.info("Processing telemetry packets...")
         logger.info("Please select an input directory")
         self.in_dir.set(filedialog.askdirectory(initialdir=self.in_dir.get()))
 
-        d = os.listdir(self.in_dir.get())
+        in_dir = self.in_dir.get()
+        out_dir = self.out_dir.get()
+        d = os.listdir(in_dir)
 
-        tlm_files = [x for x in d if x.endswith('.tlm')]
-        csv_files = [x for x in d if x.endswith('.csv')]
+        tlm_files = [x for x in d if x.endswith('.tlm')] if self.do_tlm.get() else []
+        csv_files = [x for x in d if x.endswith('.csv')] if self.do_csv.get() else []
 
         logger.info(f"found {len(tlm_files)} .tlm files")
         logger.info(f"found {len(csv_files)} .csv files")
 
-        packets = []
-
-        if self.do_tlm.get() and (len(tlm_files) > 0):        
-            # Load packets from each TLM file, tag with the source filename, and decode
-            for fname in tlm_files:
-                packets.extend(decode_packets_TLM(self.in_dir.get(), fname))
-
-                # Move the original file to the "processed" directory
-                if self.move_completed.get():
-                    shutil.move(fpath, os.path.join(self.out_dir.get(),fname))
-
-        if self.do_csv.get() and (len(csv_files) > 0):
-            # Load packets from each CSV file, tag with the source filename, and decode
-            for fname in csv_files:
-                packets.extend(decode_packets_CSV(self.in_dir.get(), fname))
-
-                # Move the original file to the "processed" directory
-                if self.move_completed.get():
-                    shutil.move(fpath, os.path.join(self.out_dir.get(),fname))
+        move_completed = self.move_completed.get()
+        to_decode = [(fname, decode_packets_TLM) for fname in tlm_files] + \
+                    [(fname, decode_packets_CSV) for fname in csv_files]
+
+        def compute(job):
+            # Load packets from each TLM and CSV file, tag with the source filename, and decode
+            batches = []
+            for i, (fname, decoder) in enumerate(to_decode):
+                job.check()
+                job.progress(i/len(to_decode), fname)
+                batches.append((fname, decoder(in_dir, fname)))
+            job.check()
+
+            # The same frames often show up in more than one file; only keep the first copy
+            job.progress(None, 'removing duplicates')
+            index, store = self.merge_packets(batches, PacketDedupeIndex(), PacketStore())
+            return index, store, [fname for fname, _ in batches]
+
+        def apply(result):
+            self.packet_index, self.packets, fnames = result
+            logger.info(self.packet_index.overlap_report())
+
+            # Now the packets are in, move the original files to the "processed" directory
+            if move_completed:
+                for fname in fnames:
+                    try:
+                        shutil.move(os.path.join(in_dir, fname), os.path.join(out_dir, fname))
+                    except OSError as e:
+                        logger.warning(f'could not move {fname} to {out_dir}: {e}')
 
-        self.packets = packets
-    
-        self.update_counters()        
-        self.update_time_fields()
-        self.update_survey_time_fields()
+            self.update_counters()
+            self.update_time_fields()
+            self.update_survey_time_fields()
 
+        self.jobs.submit('Reading telemetry files', compute, apply)
         return True
 
     def display_help(self):
@@ -976,14 +1088,39 @@ class GUI(tk.Frame):
         logging.info(stat_str)
 
 
-def main():
+# Slow-to-import modules that shouldn't be loaded until something gets plotted or saved
+LAZY_MODULES = ['matplotlib', 'mpl_toolkits.basemap', 'scipy', 'scipy.io', 'scipy.interpolate', 'scipy.signal']
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="VPM Ground Support Software")
+    parser.add_argument("--measure_startup", "--measure-startup", dest='measure_startup', action='store_true',
+                        help="time how long the GUI takes to come up, print it (as JSON), and quit")
+    parser.add_argument("--max_startup", "--max-startup", dest='max_startup', type=float, default=None,
+                        help="with --measure_startup: exit with an error if start-up took longer than this (seconds)")
+    args = parser.parse_args(argv)
 
     logging.basicConfig(level=logging.DEBUG, format='[%(name)s]\t%(levelname)s\t%(message)s')
     logging.getLogger('matplotlib').setLevel(logging.WARNING)
 
+    t_imports = time.perf_counter()
     root = tk.Tk()
     gui = GUI(root)
 
+    if args.measure_startup:
+        # Draw the window once, then report
+        root.update()
+        t_ready = time.perf_counter()
+        timing = {'imports': round(t_imports - _startup_t0, 4),
+                  'build_window': round(t_ready - t_imports, 4),
+                  'total': round(t_ready - _startup_t0, 4),
+                  'eagerly_imported': [m for m in LAZY_MODULES if m in sys.modules]}
+        print(json.dumps(timing, indent=2))
+        root.destroy()
+        if args.max_startup is not None and timing['total'] > args.max_startup:
+            logging.error(f"start-up took {timing['total']:.2f} sec (limit {args.max_startup:.2f})")
+            return 1
+        return 0
+
     console_log = logging.getLogger()
 
     # # ----- Automatic actions (for debugging) -----
@@ -1011,6 +1148,9 @@ def main():
     
     gui.root.mainloop()
     # t1.join()
+    return 0
 
 
-main()
+# Guard the entry point: burst reassembly spawns worker processes, which re-import this module
+if __name__ == '__main__':
+    sys.exit(main())
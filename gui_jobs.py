@@ -0,0 +1,162 @@
+import threading
+import queue
+import logging
+import traceback
+import tkinter as tk
+from tkinter import ttk
+
+class JobCancelled(Exception):
+    ''' Raised by Job.check() once the user has hit cancel '''
+    pass
+
+class Job():
+    ''' The handle a job's compute function gets: report progress with progress(),
+        and call check() between steps to bail out if the job's been cancelled. '''
+    def __init__(self, name, events):
+        self.name = name
+        self._events = events
+        self._cancel = threading.Event()
+        self._finished = threading.Event()   # set once the main loop is done with the job
+
+    def progress(self, fraction=None, text=None):
+        ''' fraction in [0, 1], or None if we can't tell (the bar just bounces) '''
+        self._events.put(('progress', self, (fraction, text)))
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        if self.cancelled:
+            raise JobCancelled(self.name)
+
+class JobRunner():
+    ''' Runs long GUI actions off the Tk main loop.
+
+        Each job is split in two: compute(job, *args) runs on a worker thread and
+        returns a result, without touching any GUI state; apply(result) then runs back
+        on the main loop, and is the only part that should update the GUI. Jobs run one
+        at a time, in the order they were submitted, and each job's apply is done before
+        the next compute starts -- so compute can build on whatever the previous job left
+        (e.g., work on a copy of the loaded packets, for apply to swap in). Results and
+        progress come back through a queue, which is polled with root.after.
+
+        The heavy lifting inside a job (e.g., burst reassembly) can still fan out
+        across worker processes.
+
+        self.frame holds a status label, progress bar, and cancel button; grid it
+        wherever it should go.
+    '''
+    def __init__(self, root, poll_ms=100):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.pending = queue.Queue()   # jobs waiting to run
+        self.events = queue.Queue()    # progress, results, and errors from the worker
+        self.current = None
+
+        self.frame = tk.Frame(root)
+        self.status_text = tk.StringVar()
+        self.status_text.set('Idle')
+        tk.Label(self.frame, textvariable=self.status_text, anchor='w', width=40).grid(row=0, column=0, sticky='w')
+        self.progress_bar = ttk.Progressbar(self.frame, orient='horizontal', length=300, mode='determinate', maximum=100)
+        self.progress_bar.grid(row=0, column=1, sticky='ew')
+        self.cancel_button = tk.Button(self.frame, text='Cancel', command=self.cancel, state=tk.DISABLED)
+        self.cancel_button.grid(row=0, column=2, sticky='e')
+
+        self.worker = threading.Thread(target=self._work, name='gui_jobs', daemon=True)
+        self.worker.start()
+        self.root.after(self.poll_ms, self._poll)
+
+    @property
+    def busy(self):
+        return self.current is not None or not self.pending.empty()
+
+    def submit(self, name, compute, apply=None, args=()):
+        ''' Queues up compute(job, *args) to run on the worker thread; apply(result)
+            gets called on the main loop when it finishes (unless it was cancelled) '''
+        job = Job(name, self.events)
+        self.pending.put((job, compute, apply, args))
+        return job
+
+    def cancel(self):
+        ''' Cancels the job that's running now '''
+        job = self.current
+        if job is not None:
+            logging.getLogger(__name__ + '.cancel').info(f'Cancelling {job.name}')
+            job.cancel()
+            self.status_text.set(f'{job.name}: cancelling...')
+
+    def _work(self):
+        ''' The worker thread: run each job's compute step, and post back what happened '''
+        while True:
+            job, compute, apply, args = self.pending.get()
+            self.events.put(('start', job, None))
+            try:
+                result = compute(job, *args)
+                job.check()
+                self.events.put(('done', job, (apply, result)))
+            except JobCancelled:
+                self.events.put(('cancelled', job, None))
+            except Exception:
+                self.events.put(('error', job, traceback.format_exc()))
+            job._finished.wait()
+
+    def _poll(self):
+        ''' Runs on the main loop: hand anything the worker posted to the GUI '''
+        logger = logging.getLogger(__name__ + '._poll')
+        try:
+            while True:
+                kind, job, payload = self.events.get_nowait()
+
+                if kind == 'start':
+                    self.current = job
+                    self.cancel_button.config(state=tk.NORMAL)
+                    self._show_progress(job.name, None)
+
+                elif kind == 'progress':
+                    if not job.cancelled:
+                        fraction, text = payload
+                        self._show_progress(job.name if text is None else f'{job.name}: {text}', fraction)
+
+                else:
+                    if kind == 'done':
+                        apply, result = payload
+                        if apply is not None:
+                            try:
+                                apply(result)
+                            except Exception:
+                                logger.exception(f'{job.name} failed')
+                        logger.info(f'{job.name}: done')
+                    elif kind == 'cancelled':
+                        logger.info(f'{job.name}: cancelled')
+                    else:
+                        logger.error(f'{job.name} failed:\n{payload}')
+                    self._finish(job, kind)
+
+        except queue.Empty:
+            pass
+        self.root.after(self.poll_ms, self._poll)
+
+    def _show_progress(self, text, fraction):
+        self.status_text.set(text)
+        if fraction is None:
+            if str(self.progress_bar['mode']) != 'indeterminate':
+                self.progress_bar.config(mode='indeterminate')
+                self.progress_bar.start(20)
+        else:
+            if str(self.progress_bar['mode']) != 'determinate':
+                self.progress_bar.stop()
+                self.progress_bar.config(mode='determinate')
+            self.progress_bar['value'] = 100*min(max(fraction, 0), 1)
+
+    def _finish(self, job, kind):
+        job._finished.set()
+        self.current = None
+        self.progress_bar.stop()
+        self.progress_bar.config(mode='determinate')
+        self.progress_bar['value'] = 0
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_text.set(f'{job.name}: {kind}' if self.pending.empty() else 'Waiting...')
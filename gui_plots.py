@@ -1,43 +1,20 @@
 import tkinter as tk # Python 3.x
 import numpy as np
-from matplotlib.backends.backend_tkagg import (
-    FigureCanvasTkAgg, NavigationToolbar2Tk)
-from matplotlib.figure import Figure
 import datetime
 import logging
 import pickle
 import os
 
-from matplotlib.widgets import Slider, Button, RadioButtons
+# Matplotlib, Basemap, and the individual plot scripts are slow to import, so they're
+# only loaded the first time something gets plotted (keeps the GUI quick to start).
 
-
-try:
-    from mpl_toolkits.basemap import Basemap
-except:
-    # Basemap has trouble finding proj_lib correctly - here's an automated fix
-    import os
-    import conda
-
-    conda_file_dir = conda.__file__
-    conda_dir = conda_file_dir.split('lib')[0]
-    proj_lib = os.path.join(os.path.join(conda_dir, 'share'), 'proj')
-    os.environ["PROJ_LIB"] = proj_lib
-    from mpl_toolkits.basemap import Basemap
-
-# Individual plot scripts
-from plots.packet_inspector import packet_inspector as packet_inspector_core
-from plots.plot_survey_data_and_metadata import plot_survey_data_and_metadata as plot_survey_core
-from plots.plot_burst_data import plot_burst_TD, plot_burst_FD
-from plots.plot_burst_map import plot_burst_map as plot_map_core
-
-
-def packet_inspector(parent, packets):
-    ''' wrap the packet inspector tool with a TK window '''
+def _figure_window(parent, figsize):
+    ''' A new Tk window holding a matplotlib figure and toolbar. Returns (window, figure) '''
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+    from matplotlib.figure import Figure
 
     figure_window = tk.Toplevel(parent)
-    fig = Figure(figsize=(12,6))
-
-
+    fig = Figure(figsize=figsize)
     canvas = FigureCanvasTkAgg(fig, master=figure_window)  # A tk.DrawingArea.
     canvas.draw()
     canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
@@ -45,6 +22,13 @@ def packet_inspector(parent, packets):
     toolbar = NavigationToolbar2Tk(canvas, figure_window)
     toolbar.update()
     canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
+    return figure_window, fig
+
+def packet_inspector(parent, packets):
+    ''' wrap the packet inspector tool with a TK window '''
+
+    from plots.packet_inspector import packet_inspector as packet_inspector_core
+    figure_window, fig = _figure_window(parent, (12,6))
 
     # call the core plot:
     packet_inspector_core(fig, packets)
@@ -55,17 +39,8 @@ def packet_inspector(parent, packets):
 def plot_survey_data_and_metadata(parent, S_data, clim_controls, **kwargs):
     ''' wrap the survey plotter with a TK window '''
     
-    figure_window = tk.Toplevel(parent)
-
-    fig = Figure(figsize=(12,8))
-
-    canvas = FigureCanvasTkAgg(fig, master=figure_window)  # A tk.DrawingArea.
-    canvas.draw()
-    canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
-
-    toolbar = NavigationToolbar2Tk(canvas, figure_window)
-    toolbar.update()
-    canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
+    from plots.plot_survey_data_and_metadata import plot_survey_data_and_metadata as plot_survey_core
+    figure_window, fig = _figure_window(parent, (12,8))
 
     # Call the core plotting script; forward all the keyword arguments.
     _, pe, pb = plot_survey_core(fig, S_data, **kwargs)
@@ -75,8 +50,9 @@ def plot_survey_data_and_metadata(parent, S_data, clim_controls, **kwargs):
 
     return
 
-def plot_burst_data(parent, burst, cal_file=None, show_clim_sliders=True):
-    ''' wrap the burst plotter with a TK window '''
+def plot_burst_data(parent, burst, cal_file=None, show_clim_sliders=True, spectrogram_cache_dir=None):
+    ''' wrap the burst plotter with a TK window.
+        Spectrograms are cached in memory, and in spectrogram_cache_dir if given. '''
 
     logger = logging.getLogger(__name__)
 
@@ -94,22 +70,16 @@ def plot_burst_data(parent, burst, cal_file=None, show_clim_sliders=True):
     cfg = burst['config']
 
     # Set up figure and Tk window
-    figure_window = tk.Toplevel(parent)
-
-    fig = Figure(figsize=(12,8))
-    canvas = FigureCanvasTkAgg(fig, master=figure_window)  # A tk.DrawingArea.
-    canvas.draw()
-    canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
-    toolbar = NavigationToolbar2Tk(canvas, figure_window)
-    toolbar.update()
-    canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
+    from plots.plot_burst_data import plot_burst_TD, plot_burst_FD
+    figure_window, fig = _figure_window(parent, (12,8))
 
 
 
     # Call it (time or frequency domain)
     if cfg['TD_FD_SELECT'] == 1:
         figure_window.title('Time-Domain Burst')
-        _, pe, pb = plot_burst_TD(fig, burst, cal_data = cal_data)
+        from plots.spectrogram_cache import get_cache
+        _, pe, pb = plot_burst_TD(fig, burst, cal_data = cal_data, cache = get_cache(spectrogram_cache_dir))
         fig.canvas.draw()
 
         if show_clim_sliders:
@@ -120,8 +90,11 @@ def plot_burst_data(parent, burst, cal_file=None, show_clim_sliders=True):
 
     elif cfg['TD_FD_SELECT'] == 0:
         figure_window.title('Frequency-Domain Burst')
-        plot_burst_FD(fig, burst, cal_data = cal_data)
-        # Not fully implemented -- no frequency domain bursts to work with
+        _, pe, pb = plot_burst_FD(fig, burst, cal_data = cal_data)
+        fig.canvas.draw()
+
+        if show_clim_sliders:
+            ctrl = clim_control_window(parent, fig, pe, pb, margin=40)
 
     return
 
@@ -130,14 +103,8 @@ def plot_burst_map(parent, gps_data, **kwargs):
     ''' wrap the burst map plotter with a TK window '''
 
     # Set up figure and Tk window
-    figure_window = tk.Toplevel(parent)
-    fig = Figure(figsize=(12,7))
-    canvas = FigureCanvasTkAgg(fig, master=figure_window)  # A tk.DrawingArea.
-    canvas.draw()
-    canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
-    toolbar = NavigationToolbar2Tk(canvas, figure_window)
-    toolbar.update()
-    canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
+    from plots.plot_burst_map import plot_burst_map as plot_map_core
+    figure_window, fig = _figure_window(parent, (12,7))
 
     # Call the core plotting script; forward all the keyword arguments.
     plot_map_core(fig, gps_data, **kwargs)
@@ -147,7 +114,16 @@ def plot_burst_map(parent, gps_data, **kwargs):
 
 
 class clim_control_window():
-    def __init__(self, parent, figure, pe, pb, margin=None):
+    ''' Sliders for the color limits of two spectrograms (pe, pb) in figure.
+
+        Slider events are coalesced: at most one redraw per throttle_ms while dragging, and
+        that redraws just the spectrogram images (blitted). The full figure -- colorbars
+        included -- is redrawn once the sliders have been still for settle_ms. '''
+    def __init__(self, parent, figure, pe, pb, margin=None, throttle_ms=50, settle_ms=300):
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
+        from matplotlib.widgets import Slider
+
         self.slider_window = tk.Toplevel(parent)
         self.slider_window.title('Adjust Color Limits')
         self.f2 = Figure(figsize=(6,2))
@@ -158,6 +134,11 @@ class clim_control_window():
         self.pe = pe
         self.pb = pb
         self.fig = figure
+        self.throttle_ms = throttle_ms
+        self.settle_ms = settle_ms
+        self.pending = set()
+        self.flush_id = None
+        self.settle_id = None
         self.Ecmin_ax  = self.f2.add_axes([0.15, 0.5, 0.65, 0.1])
         self.Ecmax_ax  = self.f2.add_axes([0.15, 0.7, 0.65, 0.1])
 
@@ -191,8 +172,36 @@ class clim_control_window():
 
     def update_e(self,val):
         self.pe.set_clim([self.esmin.val,self.esmax.val])
-        self.fig.canvas.draw()
+        self.schedule_redraw(self.pe)
     def update_b(self,val):
         self.pb.set_clim([self.bsmin.val,self.bsmax.val])
-        self.fig.canvas.draw()
+        self.schedule_redraw(self.pb)
+
+    def schedule_redraw(self, artist):
+        self.pending.add(artist)
+        if self.flush_id is None:
+            self.flush_id = self.slider_window.after(self.throttle_ms, self.flush)
+        if self.settle_id is not None:
+            self.slider_window.after_cancel(self.settle_id)
+        self.settle_id = self.slider_window.after(self.settle_ms, self.settle)
+
+    def flush(self):
+        ''' Redraws just the changed images, over what's already on screen '''
+        self.flush_id = None
+        canvas = self.fig.canvas
+        try:
+            if not getattr(canvas, 'supports_blit', False):
+                raise AttributeError('canvas can\'t blit')
+            for artist in self.pending:
+                artist.axes.draw_artist(artist)
+                canvas.blit(artist.axes.bbox)
+        except AttributeError:
+            # No blitting, or nothing drawn yet
+            canvas.draw_idle()
+        self.pending.clear()
+
+    def settle(self):
+        ''' One full redraw, to bring the colorbars up to date '''
+        self.settle_id = None
+        self.fig.canvas.draw_idle()
 
@@ -0,0 +1,63 @@
+import numpy as np
+import os
+import pickle
+import logging
+import functools
+
+# The precomputed table: L at 1-degree steps of geographic lat / lon, at VPM's altitude
+LSHELL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', 'Lshell_dict.pkl')
+
+@functools.lru_cache(maxsize=4)
+def lshell_interpolator(filename=LSHELL_FILE):
+    ''' Loads an L-shell table (once per file) and returns a function of (lats, lons) -> L,
+        evaluating any number of points in one call. '''
+    from scipy.interpolate import RegularGridInterpolator
+    logger = logging.getLogger(__name__ + '.lshell_interpolator')
+
+    with open(filename, 'rb') as file:
+        Ldict = pickle.load(file)
+    glat = np.asarray(Ldict['glat'], dtype=float)
+    glon = np.asarray(Ldict['glon'], dtype=float)
+    L = np.asarray(Ldict['L'], dtype=float)
+
+    # Wrap the first column of longitude around, so points between the last column and 180 interpolate
+    glon = np.append(glon, glon[0] + 360)
+    L = np.hstack([L, L[:, :1]])
+    interp = RegularGridInterpolator((glat, glon), L, method='linear', bounds_error=False, fill_value=np.nan)
+    logger.debug(f'loaded {filename}: {L.shape} grid')
+
+    def lookup(lats, lons):
+        lats, lons = np.broadcast_arrays(np.asarray(lats, dtype=float), np.asarray(lons, dtype=float))
+        # Positions from corrupt GPS frames can be NaN / inf: those get a NaN L shell
+        L_out = np.full(lats.shape, np.nan)
+        ok = np.isfinite(lats) & np.isfinite(lons)
+        pts = np.stack([np.clip(lats[ok], glat[0], glat[-1]),
+                        np.mod(lons[ok] - glon[0], 360) + glon[0]], axis=-1)
+        L_out[ok] = interp(pts)
+        return L_out
+    return lookup
+
+def lshell(lats, lons, filename=LSHELL_FILE):
+    ''' L shell at each (lat, lon), in degrees (NaN where the position isn't finite) '''
+    return lshell_interpolator(filename)(lats, lons)
+
+def attach_lshell(products, filename=LSHELL_FILE):
+    ''' Adds an 'Lshell' field to every GPS entry with a position, in survey ('GPS')
+        and burst ('G') products (NaN for a non-finite position). Modifies the products
+        in place, and returns them. '''
+    logger = logging.getLogger(__name__ + '.attach_lshell')
+
+    entries = [g for p in products for g in (p.get('GPS') or p.get('G') or [])
+               if isinstance(g, dict) and 'lat' in g and 'lon' in g]
+    if not entries:
+        return products
+    try:
+        L = lshell([g['lat'] for g in entries], [g['lon'] for g in entries], filename)
+    except OSError:
+        logger.warning(f'Missing {filename}; no L shells')
+        return products
+
+    for g, v in zip(entries, L):
+        g['Lshell'] = float(v)
+    logger.debug(f'L shells for {len(entries)} GPS entries')
+    return products
@@ -0,0 +1,171 @@
+import numpy as np
+import logging
+import hashlib
+
+def packet_key(p):
+    ''' Identifies a packet regardless of where it was received from:
+        (dtype, experiment number, start index, digest of the payload) '''
+    data = p['data']
+    payload = bytes(data) if isinstance(data, (list, bytes, bytearray)) else np.asarray(data, dtype=np.uint8).tobytes()
+    return (p['dtype'], int(p['exp_num']), int(p['start_ind']),
+            hashlib.blake2b(payload, digest_size=16).digest())
+
+class PacketDedupeIndex():
+    ''' Ingest-time duplicate filter for packets arriving from several overlapping
+        sources -- e.g., the same frames in a station's .tlm dump, the KSat .csv export,
+        and a later re-downlink.
+
+        Call add() with each batch of packets as it's loaded; it hands back only the
+        ones we haven't seen yet. Per-source counts of how much overlapped with what
+        are kept in self.stats, and summarized by overlap_report().
+    '''
+    def __init__(self, packets=None, source='loaded'):
+        self.first_seen = dict()   # packet key -> source it first arrived from
+        self.stats = dict()        # source -> counts
+        if packets:
+            self.add(packets, source)
+
+    def __len__(self):
+        return len(self.first_seen)
+
+    def __contains__(self, p):
+        return packet_key(p) in self.first_seen
+
+    def copy(self):
+        ''' An independent copy, to add to without touching this one '''
+        other = PacketDedupeIndex()
+        other.first_seen = dict(self.first_seen)
+        other.stats = {src: dict(st, overlaps=dict(st['overlaps'])) for src, st in self.stats.items()}
+        return other
+
+    def add(self, packets, source=None):
+        ''' Adds a batch of packets to the index, and returns the ones not already in it.
+            source labels the batch in the overlap statistics; by default, each packet's
+            'fname' field is used. '''
+        new_packets = []
+        for p in packets:
+            src = source if source is not None else p.get('fname', 'unknown')
+            st = self.stats.setdefault(src, {'total': 0, 'unique': 0, 'duplicates': 0, 'overlaps': dict()})
+            st['total'] += 1
+
+            key = packet_key(p)
+            if key in self.first_seen:
+                first = self.first_seen[key]
+                st['duplicates'] += 1
+                st['overlaps'][first] = st['overlaps'].get(first, 0) + 1
+            else:
+                self.first_seen[key] = src
+                st['unique'] += 1
+                new_packets.append(p)
+        return new_packets
+
+    def overlap_report(self):
+        ''' A readable summary of the duplicates found in each source '''
+        lines = []
+        for src, st in self.stats.items():
+            lines.append(f"{src}: {st['total']} packets, {st['unique']} new, {st['duplicates']} duplicates")
+            for other, n in sorted(st['overlaps'].items(), key=lambda x: -x[1]):
+                where = 'within itself' if other == src else f'already in {other}'
+                lines.append(f"\t{n} {where}")
+        return '\n'.join(lines)
+
+def merge_sorted_runs(a, b):
+    ''' Where the elements of two sorted arrays land when merged.
+        Returns (positions of a, positions of b) in the merged array; on ties, a comes first. '''
+    pos_a = np.arange(len(a)) + np.searchsorted(b, a, side='left')
+    pos_b = np.arange(len(b)) + np.searchsorted(a, b, side='right')
+    return pos_a, pos_b
+
+class PacketStore():
+    ''' A list of packets, always kept sorted by header_timestamp.
+
+        Newly loaded packets are sorted among themselves and merged in, rather than
+        re-sorting everything. Time-range and by-dtype queries are binary searches on
+        a timestamp column. Otherwise it behaves like a list (len, iteration, indexing),
+        so it can be handed to anything expecting a list of packets.
+    '''
+    def __init__(self, packets=None):
+        self.packets = []
+        self.times = np.zeros(0)
+        self.dtypes = np.zeros(0, dtype='U1')
+        self._dtype_inds = dict()
+        if packets:
+            self.extend(packets)
+
+    def __len__(self):
+        return len(self.packets)
+
+    def __iter__(self):
+        return iter(self.packets)
+
+    def __getitem__(self, ind):
+        return self.packets[ind]
+
+    def extend(self, packets):
+        ''' Merges a batch of packets into the store '''
+        run = sorted(packets, key=lambda p: p['header_timestamp'])
+        if not run:
+            return
+        run_times = np.array([p['header_timestamp'] for p in run], dtype=float)
+        run_dtypes = np.array([p['dtype'] for p in run], dtype='U1')
+
+        if len(self.packets) == 0 or run_times[0] >= self.times[-1]:
+            # Common case: the new packets all come after what we have
+            self.packets.extend(run)
+            self.times = np.concatenate([self.times, run_times])
+            self.dtypes = np.concatenate([self.dtypes, run_dtypes])
+        else:
+            pos_a, pos_b = merge_sorted_runs(self.times, run_times)
+            merged = np.empty(len(self.packets) + len(run), dtype=object)
+            merged[pos_a] = self.packets
+            merged[pos_b] = run
+            self.packets = merged.tolist()
+
+            times = np.empty(len(merged))
+            times[pos_a] = self.times
+            times[pos_b] = run_times
+            self.times = times
+
+            dtypes = np.empty(len(merged), dtype='U1')
+            dtypes[pos_a] = self.dtypes
+            dtypes[pos_b] = run_dtypes
+            self.dtypes = dtypes
+
+        self._dtype_inds = dict()
+
+    def append(self, p):
+        self.extend([p])
+
+    def copy(self):
+        ''' An independent copy (of the list -- the packets themselves are shared) '''
+        other = PacketStore()
+        other.packets = list(self.packets)
+        other.times = self.times.copy()
+        other.dtypes = self.dtypes.copy()
+        return other
+
+    def _range(self, times, t1, t2):
+        i0 = 0 if t1 is None else np.searchsorted(times, t1, side='left')
+        i1 = len(times) if t2 is None else np.searchsorted(times, t2, side='right')
+        return i0, i1
+
+    def time_range(self, t1=None, t2=None):
+        ''' Packets with t1 <= header_timestamp <= t2 (unix timestamps), in time order '''
+        i0, i1 = self._range(self.times, t1, t2)
+        return self.packets[i0:i1]
+
+    def by_dtype(self, dtype, t1=None, t2=None):
+        ''' Packets of one dtype, optionally within [t1, t2], in time order '''
+        if dtype not in self._dtype_inds:
+            # Each dtype's positions and timestamps, kept until the next extend
+            inds = np.flatnonzero(self.dtypes == dtype)
+            self._dtype_inds[dtype] = (inds, self.times[inds])
+        inds, times = self._dtype_inds[dtype]
+        i0, i1 = self._range(times, t1, t2)
+        return [self.packets[i] for i in inds[i0:i1]]
+
+    def t_min(self):
+        return self.times[0] if len(self.times) else None
+
+    def t_max(self):
+        return self.times[-1] if len(self.times) else None
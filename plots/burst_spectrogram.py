@@ -0,0 +1,117 @@
+import numpy as np
+import logging
+import scipy.signal
+from numpy.lib.stride_tricks import as_strided
+
+try:
+    import scipy.fft as fft_module
+    FFT_KWARGS = {'workers': -1}
+except ImportError:
+    # scipy < 1.4: numpy's FFT, single-threaded
+    fft_module = np.fft
+    FFT_KWARGS = {}
+
+def pulse_layout(n_samples, cfg):
+    ''' Where each pulse of a time-domain burst lands once the "off" time between pulses
+        is put back in. Returns the per-pulse start (in spaced samples) and length, and the
+        total spaced length. A short final pulse is kept short, and missing pulses take up
+        no room beyond their "off" time. '''
+    if cfg['SAMPLES_OFF'] == 0:
+        return np.array([0]), np.array([n_samples]), n_samples
+    on = cfg['SAMPLES_ON']
+    off = cfg['SAMPLES_OFF']
+    lengths = np.clip(n_samples - np.arange(cfg['burst_pulses'])*on, 0, on)
+    starts = np.cumsum(lengths + off) - (lengths + off)
+    return starts, lengths, int(np.sum(lengths + off))
+
+def _frames(x, nperseg, step):
+    ''' Overlapping segments of the last axis of x, as a view: (..., n_frames, nperseg) '''
+    n_frames = (x.shape[-1] - nperseg)//step + 1
+    shape = x.shape[:-1] + (n_frames, nperseg)
+    strides = x.strides[:-1] + (x.strides[-1]*step, x.strides[-1])
+    return as_strided(x, shape=shape, strides=strides, writeable=False)
+
+def pulse_spectrogram(channels, coefs, cfg, fs, nperseg=1024, noverlap=512, window='hann', max_frames=4096):
+    ''' Spectrogram magnitudes (dB) of a windowed time-domain burst, one STFT per pulse.
+
+        Segments never straddle the "off" time, so no FFTs are spent on empty space: each
+        pulse is framed on its own, and all the channels (E and B) of a group of pulses go
+        through one batched FFT, split across threads. Scaling matches scipy.signal.spectrogram
+        with mode='psd', scaling='spectrum' (constant detrend).
+
+        channels: list of 1-d sample arrays (may be memmaps -- only one group of pulses is read at a time)
+        coefs:    scale factor for each channel
+        Returns (f_edges, t_edges, [S_mag per channel]); each S_mag is (frequency, time), and
+        the time axis has a NaN column standing in for each gap between pulses.
+    '''
+    logger = logging.getLogger(__name__ + '.pulse_spectrogram')
+    nperseg = int(nperseg)
+    noverlap = int(noverlap)
+    step = nperseg - noverlap
+
+    n_samples = max(len(x) for x in channels)
+    starts, lengths, _ = pulse_layout(n_samples, cfg)
+    on = cfg['SAMPLES_ON'] if cfg['SAMPLES_OFF'] else n_samples
+
+    win = scipy.signal.get_window(window, nperseg).astype(np.float32)
+    scale = 1.0/np.sum(win)**2
+    n_freqs = nperseg//2 + 1
+    ff = np.fft.rfftfreq(nperseg, 1/fs)
+    f_edges = np.concatenate([[ff[0]], (ff[:-1] + ff[1:])/2, [ff[-1]]])
+
+    n_frames = np.where(lengths >= nperseg, (lengths - nperseg)//step + 1, 0)
+    pulses = np.flatnonzero(n_frames)
+
+    columns = []  # per pulse: (edges, [S per channel])
+    k = 0
+    while k < len(pulses):
+        # A group of equal-length pulses, up to max_frames segments in all
+        group = [pulses[k]]
+        while (k + len(group) < len(pulses) and lengths[pulses[k + len(group)]] == lengths[group[0]]
+               and (len(group) + 1)*n_frames[group[0]] <= max(max_frames, n_frames[group[0]])):
+            group.append(pulses[k + len(group)])
+        k += len(group)
+
+        L = lengths[group[0]]
+        x = np.zeros((len(channels), len(group), L), dtype=np.float32)
+        for c, (data, coef) in enumerate(zip(channels, coefs)):
+            for g, p in enumerate(group):
+                seg = np.asarray(data[p*on:p*on + L], dtype=np.float32)
+                x[c, g, :len(seg)] = coef*seg
+
+        frames = _frames(x, nperseg, step)
+        frames = (frames - frames.mean(axis=-1, keepdims=True))*win
+        S = np.abs(fft_module.rfft(frames, axis=-1, **FFT_KWARGS))**2*scale
+        # One-sided: fold in the negative frequencies (not DC, nor Nyquist for even nperseg)
+        S[..., 1:(n_freqs - 1 if nperseg % 2 == 0 else n_freqs)] *= 2
+        with np.errstate(divide='ignore'):
+            S = 10*np.log10(S)
+        S[np.isinf(S)] = -100
+
+        for g, p in enumerate(group):
+            t_k = (starts[p] + nperseg/2 + np.arange(n_frames[p] + 1)*step - step/2)/fs
+            columns.append((t_k, [S[c, g].T.astype(np.float32) for c in range(len(channels))]))
+
+    if not columns:
+        logger.warning(f'no pulses long enough for a {nperseg}-point spectrogram')
+        return f_edges, np.array([0., 1./fs]), [np.full((n_freqs, 1), np.nan, dtype=np.float32) for c in channels]
+
+    # Stitch the pulses onto one time axis, with a NaN column spanning each gap
+    edges = [columns[0][0]]
+    blocks = [[S] for S in columns[0][1]]
+    gap = np.full((n_freqs, 1), np.nan, dtype=np.float32)
+    for t_edges, S_list in columns[1:]:
+        if t_edges[0] > edges[-1][-1]:
+            for c in range(len(channels)):
+                blocks[c].append(gap)
+            edges.append(t_edges)
+        else:
+            # Back-to-back pulses: the edges meet
+            edges.append(t_edges[1:])
+        for c in range(len(channels)):
+            blocks[c].append(S_list[c])
+
+    t_edges = np.concatenate(edges)
+    S_mags = [np.hstack(b) for b in blocks]
+    logger.debug(f'{len(columns)} pulses, {S_mags[0].shape[1]} columns')
+    return f_edges, t_edges, S_mags
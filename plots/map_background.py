@@ -0,0 +1,78 @@
+import numpy as np
+import logging
+import functools
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+try:
+    from mpl_toolkits.basemap import Basemap
+except:
+    # Basemap has trouble finding proj_lib correctly - here's an automated fix
+    import os
+    import conda
+
+    conda_file_dir = conda.__file__
+    conda_dir = conda_file_dir.split('lib')[0]
+    proj_lib = os.path.join(os.path.join(conda_dir, 'share'), 'proj')
+    os.environ["PROJ_LIB"] = proj_lib
+    from mpl_toolkits.basemap import Basemap
+
+# The map used for ground tracks, and where its grid lines go
+PARALLELS = np.arange(-60, 90, 30)
+MERIDIANS = np.arange(-180, 210, 60)
+
+@functools.lru_cache(maxsize=None)
+def get_basemap():
+    ''' The Miller-projection world map, built once per process.
+        It isn't tied to any axes: use it to project (m(lons, lats)), and draw on the axes directly. '''
+    logging.getLogger(__name__ + '.get_basemap').debug('building basemap')
+    return Basemap(projection='mill', lon_0=0, llcrnrlon=-180, llcrnrlat=-70, urcrnrlon=180, urcrnrlat=70)
+
+@functools.lru_cache(maxsize=4)
+def map_background(width=1800, dpi=150):
+    ''' The static map layers (ocean, continents, coastlines, grid lines), rasterized once
+        to an RGBA array, width pixels across. Returns (image, extent) for imshow. '''
+    logger = logging.getLogger(__name__ + '.map_background')
+    m = get_basemap()
+    extent = (m.xmin, m.xmax, m.ymin, m.ymax)
+    height = int(round(width*(m.ymax - m.ymin)/(m.xmax - m.xmin)))
+
+    fig = Figure(figsize=(width/dpi, height/dpi), dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+
+    m.drawmapboundary(fill_color='cyan', ax=ax)
+    m.fillcontinents(color='white', lake_color='cyan', ax=ax)
+    m.drawcoastlines(color='k', linewidth=1, ax=ax)
+    m.drawparallels(PARALLELS, labels=[0,0,0,0], ax=ax)
+    m.drawmeridians(MERIDIANS, labels=[0,0,0,0], ax=ax)
+    ax.set_xlim(extent[0:2])
+    ax.set_ylim(extent[2:4])
+    ax.axis('off')
+
+    canvas.draw()
+    image = np.asarray(canvas.buffer_rgba()).copy()
+    logger.debug(f'rasterized map background: {image.shape}')
+    return image, extent
+
+def draw_map_background(ax):
+    ''' Puts the cached map background on an axis, with lat / lon labels like Basemap's.
+        Returns the (shared) Basemap, for projecting points onto it. '''
+    m = get_basemap()
+    image, extent = map_background()
+
+    ax.imshow(image, extent=extent, origin='upper', interpolation='bilinear', zorder=0)
+    ax.set_xlim(extent[0:2])
+    ax.set_ylim(extent[2:4])
+    ax.set_aspect('equal')
+
+    # Parallels labeled on the left, meridians along the top
+    _, y = m(np.zeros_like(PARALLELS), PARALLELS)
+    ax.set_yticks(y)
+    ax.set_yticklabels([f'{abs(p)}°{"N" if p > 0 else "S" if p < 0 else ""}' for p in PARALLELS])
+    x, _ = m(MERIDIANS, np.zeros_like(MERIDIANS))
+    ax.set_xticks(x)
+    ax.set_xticklabels([f'{abs(l)}°{"E" if l > 0 else "W" if l < 0 else ""}' for l in MERIDIANS])
+    ax.xaxis.tick_top()
+    ax.tick_params(length=0)
+    return m
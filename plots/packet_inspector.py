@@ -4,124 +4,135 @@ import os
 import pickle
 from data_handlers import decode_status
 from data_handlers import decode_burst_command
+from packet_handlers import PacketStore
+from plots.survey_pyramid import epoch_to_datenum, datenum_to_epoch
 import logging
 
-def packet_inspector(fig, packets):
-    logger = logging.getLogger(__name__)
-    
+# Rows of the plot: (dtype, label, marker)
+ROWS = [('E', 'E', '.'), ('B', 'B', '.'), ('G', 'GPS', '.'), ('I', 'Status', 'o'), ('S', 'Survey', '.')]
 
-    # figure_window = tk.Toplevel(parent)
-    ''' A nice tool to analyze packets in a list. Click'em to see info about them! '''
+def packet_inspector(fig, packets, max_markers=20000):
+    ''' A nice tool to analyze packets in a list. Click'em to see info about them!
 
-    # Select burst packets
-    E_packets = list(filter(lambda packet: packet['dtype'] == 'E', packets))
-    B_packets = list(filter(lambda packet: packet['dtype'] == 'B', packets))
-    G_packets = list(filter(lambda packet: packet['dtype'] == 'G', packets))
-    I_packets = list(filter(lambda packet: packet['dtype'] == 'I', packets))
-    S_packets = list(filter(lambda packet: packet['dtype'] == 'S', packets))
-    
-    logger.info(f'E: {len(E_packets)} B: {len(B_packets)} G: {len(G_packets)} Status: {len(I_packets)} Survey: {len(S_packets)}')  
-    logger.info(f"Exp nums: {np.unique([p['exp_num'] for p in packets])}")
-    logger.info(f"Burst exp nums: {np.unique([p['exp_num'] for p in E_packets + B_packets + G_packets])}")
-    logger.info(f"Survey exp nums: {np.unique([p['exp_num'] for p in S_packets])}")
+        Zoomed out, each packet type is drawn as a band shaded by packet density; once
+        there are no more than max_markers packets in view, each packet gets a marker
+        you can click. Works from timestamp and dtype arrays, so a full day of packets is fine. '''
+    logger = logging.getLogger(__name__)
+    from matplotlib.colors import LogNorm
 
+    if not isinstance(packets, PacketStore):
+        packets = PacketStore(packets)
 
+    # Per-type indices into packets, and their timestamps (both in time order)
+    inds = {d: np.flatnonzero(packets.dtypes == d) for d, _, _ in ROWS}
+    times = {d: packets.times[inds[d]] for d, _, _ in ROWS}
+    exp_nums = np.array([p['exp_num'] for p in packets])
 
-    # -------- arrival time debugging plot -------
-    # fig, ax = plt.subplots(1,1)
-    # fig = Figure(figsize=(12,6))
+    logger.info(' '.join(f'{label}: {len(inds[d])}' for d, label, _ in ROWS))
+    logger.info(f"Exp nums: {np.unique(exp_nums)}")
+    logger.info(f"Burst exp nums: {np.unique(exp_nums[np.isin(packets.dtypes, ['E','B','G'])])}")
+    logger.info(f"Survey exp nums: {np.unique(exp_nums[inds['S']])}")
 
     ax = fig.add_subplot(111)
-
-    # canvas = FigureCanvasTkAgg(fig, master=figure_window)  # A tk.DrawingArea.
-    # canvas.draw()
-    # canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
-
-    # toolbar = NavigationToolbar2Tk(canvas, figure_window)
-    # toolbar.update()
-    # canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
-
-    # taxis = np.arange(len(packets))    
-    # tstamps = np.array([p['header_timestamp'] for p in packets])
-    # dtypes  = np.array([p['dtype'] for p in packets])
-
-    # ax.plot(taxis[dtypes=='E'], tstamps[dtypes=='E'],'.', label='E',      picker=5)
-    # ax.plot(taxis[dtypes=='B'], tstamps[dtypes=='B'],'.', label='B',      picker=5)
-    # ax.plot(taxis[dtypes=='G'], tstamps[dtypes=='G'],'.', label='GPS',    picker=5)
-    # ax.plot(taxis[dtypes=='I'], tstamps[dtypes=='I'],'o', label='Status', picker=5)
-    # ax.plot(taxis[dtypes=='S'], tstamps[dtypes=='S'],'.', label='Survey', picker=5)
-
-    taxis = np.arange(len(packets))    
-    tstamps = np.array([p['header_timestamp'] for p in packets])
-    dts = np.array([datetime.datetime.utcfromtimestamp(p['header_timestamp']) for p in packets])
-    dtypes  = np.array([p['dtype'] for p in packets])
-
-    ax.plot(dts[dtypes=='E'], 1*np.ones_like(tstamps[dtypes=='E']),'.', label='E',      picker=5)
-    ax.plot(dts[dtypes=='B'], 2*np.ones_like(tstamps[dtypes=='B']),'.', label='B',      picker=5)
-    ax.plot(dts[dtypes=='G'], 3*np.ones_like(tstamps[dtypes=='G']),'.', label='GPS',    picker=5)
-    ax.plot(dts[dtypes=='I'], 4*np.ones_like(tstamps[dtypes=='I']),'o', label='Status', picker=5)
-    ax.plot(dts[dtypes=='S'], 5*np.ones_like(tstamps[dtypes=='S']),'.', label='Survey', picker=5)
-
-
-
+    t1, t2 = packets.t_min(), packets.t_max()
+    if t1 == t2:
+        t1, t2 = t1 - 1, t2 + 1
+
+    # Zoomed out: one image, a row per packet type, columns binned by time
+    density = ax.imshow(np.ma.masked_all((len(ROWS), 1)), extent=(epoch_to_datenum(t1), epoch_to_datenum(t2), 0.5, len(ROWS) + 0.5),
+                        origin='lower', aspect='auto', interpolation='nearest', cmap='viridis', norm=LogNorm(), zorder=1)
+    # Zoomed in: markers for each packet in view
+    lines = dict()
+    for row, (d, label, marker) in enumerate(ROWS):
+        lines[d], = ax.plot([], [], marker, color=f'C{row}', label=label, picker=5, zorder=2)
 
     # ax.hlines([p['header_timestamp'] for p in I_packets], 0, len(packets))
-    ax.vlines([datetime.datetime.utcfromtimestamp(p['header_timestamp']) for p in I_packets], 0, 6, alpha=0.7)
-    ax.legend()
+    # Status packet times, as vertical lines -- one path, broken with NaNs
+    x_status = np.repeat(epoch_to_datenum(times['I']), 3)
+    y_status = np.tile([0, 6, np.nan], len(times['I']))
+    ax.plot(x_status, y_status, color='k', linewidth=1, alpha=0.7, zorder=0)
+    ax.legend(loc='upper right')
     # ax.set_xlabel('arrival index')
     ax.set_xlabel('Header Timestamp')
     ax.set_yticks([1,2,3,4,5])
-    ax.set_yticklabels(['E','B','GPS','Status','Survey'])
+    ax.set_yticklabels([label for _, label, _ in ROWS])
 
+    ax.xaxis_date()
+    ax.set_xlim(epoch_to_datenum(t1), epoch_to_datenum(t2))
     ax.set_ylim([0,6])
-    # ax.set_xlim([min(tstamps), max(tstamps)])
 
     ax.grid(which='major', alpha=0.5)
     ax.grid(which='minor', alpha=0.2)
-    fig.canvas.mpl_connect('pick_event', lambda event: onpick(event, packets))
     fig.suptitle('VPM Packet Inspector Tool')
 
     fig.autofmt_xdate()
 
-    def onpick(event, packets):
+    # Start of each marker line's slice, per type
+    shown = {d: 0 for d, _, _ in ROWS}
+
+    def onzoom(axis):
+        a, b = datenum_to_epoch(axis.get_xlim())
+        ranges = {d: (np.searchsorted(times[d], a, side='left'), np.searchsorted(times[d], b, side='right')) for d, _, _ in ROWS}
+        n_visible = sum(i1 - i0 for i0, i1 in ranges.values())
+
+        if n_visible <= max_markers:
+            for row, (d, _, _) in enumerate(ROWS):
+                i0, i1 = ranges[d]
+                lines[d].set_data(epoch_to_datenum(times[d][i0:i1]), np.full(i1 - i0, row + 1))
+                shown[d] = i0
+            density.set_visible(False)
+        else:
+            n_bins = max(int(axis.get_window_extent().width), 1)
+            edges = np.linspace(a, b, n_bins + 1)
+            counts = np.array([np.diff(np.searchsorted(times[d], edges)) for d, _, _ in ROWS])
+            density.set_data(np.ma.masked_equal(counts, 0))
+            density.set_extent((epoch_to_datenum(a), epoch_to_datenum(b), 0.5, len(ROWS) + 0.5))
+            density.set_clim(1, max(counts.max(), 2))
+            density.set_visible(True)
+            for d, _, _ in ROWS:
+                lines[d].set_data([], [])
+        logger.debug(f'{n_visible} packets in view')
+
+    def onpick(event):
         ''' Click handler '''
-        thisline = event.artist
-        xdata = thisline.get_xdata()
-        ydata = thisline.get_ydata()
-        ind = event.ind
-        x_inds = xdata[ind]
-        logger.info(x_inds)
-
-        logger.info(f"Clicked on {len(x_inds)} events")
-        if len(x_inds) > 0:
-            x = np.where(dts == xdata[ind[0]])[0][0]
-
-            # for x in x_inds:
-            logger.info(f'packet at {x}:')
-
-            if packets[x]['dtype']=='I':
-                logger.info(f'Status packet:')
-                stat = decode_status([packets[x]])
-                logger.info(stat[0])
-                # Get burst configuration parameters:
-                cmd = np.flip(packets[x]['data'][12:15])
-                burst_config = decode_burst_command(cmd)
-                logger.info(burst_config)
-
-            if (packets[x]['dtype']=='G') and (packets[x]['start_ind']==0):
-                logger.info(f'GPS packet with echoed command')
-                # First GPS packet -- burst command is echoed here
-                cmd = np.flip(packets[x]['data'][0:3])
-                burst_config = decode_burst_command(cmd)
-                logger.info(burst_config)
-
-            logger.info(f"\tdtype: {packets[x]['dtype']}")
-            logger.info(f"\theader timestamp: {packets[x]['header_timestamp']}" +\
-            f" ({datetime.datetime.utcfromtimestamp(packets[x]['header_timestamp'])})")
-            logger.info(f"\tExp num: {packets[x]['exp_num']}")
-            logger.info(f"\tData indexes: [{packets[x]['start_ind']}:" +\
-                f"{packets[x]['start_ind'] + packets[x]['bytecount']}]")
-
+        d = [k for k, line in lines.items() if line is event.artist]
+        if not d or len(event.ind) == 0:
+            return
+        d = d[0]
+        logger.info(f"Clicked on {len(event.ind)} events")
+
+        # Marker number -> packet number, via the slice it's in
+        x = inds[d][shown[d] + event.ind[0]]
+
+        # for x in x_inds:
+        logger.info(f'packet at {x}:')
+
+        if packets[x]['dtype']=='I':
+            logger.info(f'Status packet:')
+            stat = decode_status([packets[x]])
+            logger.info(stat[0])
+            # Get burst configuration parameters:
+            cmd = np.flip(packets[x]['data'][12:15])
+            burst_config = decode_burst_command(cmd)
+            logger.info(burst_config)
+
+        if (packets[x]['dtype']=='G') and (packets[x]['start_ind']==0):
+            logger.info(f'GPS packet with echoed command')
+            # First GPS packet -- burst command is echoed here
+            cmd = np.flip(packets[x]['data'][0:3])
+            burst_config = decode_burst_command(cmd)
+            logger.info(burst_config)
+
+        logger.info(f"\tdtype: {packets[x]['dtype']}")
+        logger.info(f"\theader timestamp: {packets[x]['header_timestamp']}" +\
+        f" ({datetime.datetime.utcfromtimestamp(packets[x]['header_timestamp'])})")
+        logger.info(f"\tExp num: {packets[x]['exp_num']}")
+        logger.info(f"\tData indexes: [{packets[x]['start_ind']}:" +\
+            f"{packets[x]['start_ind'] + packets[x]['bytecount']}]")
+
+    onzoom(ax)
+    ax.callbacks.connect('xlim_changed', onzoom)
+    fig.canvas.mpl_connect('pick_event', onpick)
 
     return True
 
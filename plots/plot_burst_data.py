@@ -4,9 +4,11 @@ import pickle
 import datetime
 from matplotlib.gridspec import GridSpec
 import matplotlib.dates as mdates
-import scipy.signal
 import os
 from plots.parula_colormap import parula
+from plots.spectrogram_cache import get_cache, burst_fingerprint, spectrogram_key
+from plots.burst_spectrogram import pulse_spectrogram
+from plots.waveform_pyramid import WaveformPyramid
 import logging
 import argparse
 from file_handlers import read_burst_XML
@@ -14,8 +16,20 @@ from data_handlers import decode_status
 from data_handlers import decode_uBBR_command
 import pickle
 
-def plot_burst_TD(fig, burst, cal_data = None):
-    
+def _gapped_edges(inds, step, origin):
+    ''' Cell edges for rows (or columns) at sorted integer positions inds, each step wide,
+        with one extra cell spanning each run of missing positions. Returns the edges, and
+        the cell number of each of inds. '''
+    inds = np.asarray(inds)
+    breaks = np.flatnonzero(np.diff(inds) > 1) + 1
+    edges = np.insert(origin + inds*step, breaks, origin + (inds[breaks - 1] + 1)*step)
+    edges = np.append(edges, origin + (inds[-1] + 1)*step)
+    pos = np.arange(len(inds)) + np.searchsorted(breaks, np.arange(len(inds)), side='right')
+    return edges, pos
+
+def plot_burst_TD(fig, burst, cal_data = None, cache = None):
+    ''' Time-domain burst plot. Spectrograms are kept in cache (a SpectrogramCache;
+        default, the shared in-memory one), so re-plotting a burst skips the FFTs. '''
     logger = logging.getLogger("plot_burst_TD")
 
     # # --------------- Latex Plot Beautification --------------------------
@@ -144,8 +158,10 @@ def plot_burst_TD(fig, burst, cal_data = None):
         sec_off = cfg['SAMPLES_OFF']/fs
         
 
-        E_TD.plot(t_axis[0:len(burst['E'])], E_coef*burst['E'])
-        B_TD.plot(t_axis[0:len(burst['B'])], B_coef*burst['B'])
+        # Waveforms are drawn from min/max envelopes at about screen resolution, and
+        # refined from the full data on zooming in
+        WaveformPyramid(t_axis[0:len(burst['E'])], E_coef*burst['E']).attach(E_TD)
+        WaveformPyramid(t_axis[0:len(burst['B'])], B_coef*burst['B']).attach(B_TD)
 
 
         # E_TD.set_ylim(td_lims)
@@ -153,44 +169,29 @@ def plot_burst_TD(fig, burst, cal_data = None):
 
         nfft=1024;
         overlap = 0.5
-        window = 'hanning'
-
-        
-        if cfg['SAMPLES_OFF'] == 0:
-            E_td_spaced = E_coef*burst['E']
-            B_td_spaced = B_coef*burst['B']
-        else:
-            # Insert nans into vector to account for "off" time sections
-            E_td_spaced = []
-            B_td_spaced = []
-            
-            for k in np.arange(cfg['burst_pulses']):
-                E_td_spaced.append(E_coef*burst['E'][k*cfg['SAMPLES_ON']:(k+1)*cfg['SAMPLES_ON']])
-                E_td_spaced.append(np.ones(cfg['SAMPLES_OFF'])*np.nan)
-                B_td_spaced.append(B_coef*burst['B'][k*cfg['SAMPLES_ON']:(k+1)*cfg['SAMPLES_ON']])
-                B_td_spaced.append(np.ones(cfg['SAMPLES_OFF'])*np.nan)
-
-
-            E_td_spaced = np.concatenate(E_td_spaced).ravel()
-            B_td_spaced = np.concatenate(B_td_spaced).ravel()
-
-
-        # E spectrogram -- "spectrum" scaling -> V^2; "density" scaling -> V^2/Hz
-        ff,tt, FE = scipy.signal.spectrogram(E_td_spaced, fs=fs_equiv, window=window,
-                    nperseg=nfft, noverlap=nfft*overlap,mode='psd',scaling='spectrum')
-        E_S_mag = 20*np.log10(np.sqrt(FE))
-        E_S_mag[np.isinf(E_S_mag)] = -100
-        logger.debug(f'E data min/max: {np.min(E_S_mag)}, {np.max(E_S_mag)}')
-        pe = E_FD.pcolorfast(tt,ff/1000,E_S_mag, cmap = cm,  vmin=e_clims[0], vmax=e_clims[1])
+        window = 'hann'
+
+        # Spectrograms are computed pulse by pulse (nothing spent on the "off" time between
+        # them), E and B together, and kept in cache so re-plotting a burst skips the FFTs.
+        # "spectrum" scaling -> V^2
+        if cache is None:
+            cache = get_cache()
+        key = spectrogram_key(burst_fingerprint(burst), 'EB-pulses', (E_coef, B_coef), fs_equiv, nfft, nfft*overlap, window)
+
+        def compute_spectrograms():
+            f_edges, t_edges, (E_S, B_S) = pulse_spectrogram([burst['E'], burst['B']], [E_coef, B_coef], cfg,
+                                            fs=fs_equiv, nperseg=nfft, noverlap=nfft*overlap, window=window)
+            return f_edges, t_edges, E_S, B_S
+        f_edges, t_edges, E_S_mag, B_S_mag = cache.get_or_compute(key, compute_spectrograms)
+
+        # E spectrogram
+        logger.debug(f'E data min/max: {np.nanmin(E_S_mag)}, {np.nanmax(E_S_mag)}')
+        pe = E_FD.pcolorfast(t_edges, f_edges/1000, E_S_mag, cmap = cm,  vmin=e_clims[0], vmax=e_clims[1])
         ce = fig.colorbar(pe, cax=cb1)
 
         # B spectrogram
-        ff,tt, FB = scipy.signal.spectrogram(B_td_spaced, fs=fs_equiv, window=window,
-                    nperseg=nfft, noverlap=nfft*overlap,mode='psd',scaling='spectrum')
-        B_S_mag = 20*np.log10(np.sqrt(FB))
-        B_S_mag[np.isinf(B_S_mag)] = -100
-        logger.debug(f'B data min/max: {np.min(B_S_mag)}, {np.max(B_S_mag)}')
-        pb = B_FD.pcolorfast(tt,ff/1000, B_S_mag, cmap = cm, vmin=b_clims[0], vmax=b_clims[1])
+        logger.debug(f'B data min/max: {np.nanmin(B_S_mag)}, {np.nanmax(B_S_mag)}')
+        pb = B_FD.pcolorfast(t_edges, f_edges/1000, B_S_mag, cmap = cm, vmin=b_clims[0], vmax=b_clims[1])
         cb = fig.colorbar(pb, cax=cb2)
 
         E_TD.set_ylabel(f'E Amplitude\n[{E_unit_string}]')
@@ -259,7 +260,7 @@ def plot_burst_FD(fig, burst, cal_data = None):
     E_coef = ADC_max_volts/ADC_max_value  # [Volts at ADC / ADC bin]
     B_coef = ADC_max_volts/ADC_max_value
 
-    if cal_file and bbr_config:
+    if cal_data and bbr_config:
         td_lims = [-1, 1]
         E_cal_curve = cal_data[('E',bool(bbr_config['E_FILT']), bool(bbr_config['E_GAIN']))]
         B_cal_curve = cal_data[('B',bool(bbr_config['B_FILT']), bool(bbr_config['B_GAIN']))]
@@ -293,16 +294,12 @@ def plot_burst_FD(fig, burst, cal_data = None):
 
         nfft = 1024
 
-        # Frequency axis
-        f_axis = []
-        seg_length = nfft/2/16
-
-        for i, v in enumerate(cfg['BINS'][::-1]):
-            if v=='1':
-                f_axis.append([np.arange(seg_length)+seg_length*i])
-        freq_inds = np.array(f_axis).ravel().astype('int') # stash the row indices here
-        f_axis = (40000/(nfft/2))*np.array(f_axis).ravel()
-        f_axis_full = np.arange(512)*40000/512;
+        # Frequency axis: each enabled entry in BINS (read right to left) is a band of
+        # nfft/2/16 consecutive FFT bins
+        seg_length = nfft//2//16
+        enabled = np.array(list(cfg['BINS'][::-1])) == '1'
+        freq_inds = (np.flatnonzero(enabled)[:,None]*seg_length + np.arange(seg_length)).ravel()
+        f_axis = (40000/(nfft/2))*freq_inds
 
         logger.debug(f"f axis: {len(f_axis)}")
         
@@ -328,46 +325,45 @@ def plot_burst_FD(fig, burst, cal_data = None):
             # with no windowing, we'll only have one GPS timestamp instead of burst_pulses.
             max_t_ind = np.shape(E)[1]
             t_inds = np.arange(max_t_ind)
-            t_axis_seconds = t_inds*scale_factor
-            start_timestamp = datetime.datetime.utcfromtimestamp(burst['G'][0]['timestamp']) - datetime.timedelta(seconds=np.round(t_axis_seconds[-1]))
-            t_axis_full_seconds = np.arange(max_t_ind)*scale_factor + system_delay_samps_FD/fs
-            t_axis_full_timestamps = burst['G'][0]['timestamp'] - max_t_ind*scale_factor + t_axis_full_seconds
-
+            start_timestamp = datetime.datetime.utcfromtimestamp(burst['G'][0]['timestamp']) - datetime.timedelta(seconds=np.round((max_t_ind - 1)*scale_factor))
+            t0 = burst['G'][0]['timestamp'] - max_t_ind*scale_factor + system_delay_samps_FD/fs
         else:
-            t_inds = np.array([(np.arange(cfg['FFTS_ON'])) + (k*(cfg['FFTS_ON'] + cfg['FFTS_OFF'])) for k in range(cfg['burst_pulses'])]).ravel()
-            max_t_ind = (cfg['FFTS_ON'] + cfg['FFTS_OFF'])*cfg['burst_pulses']
+            # Column index of each FFT, counting the "off" time
+            t_inds = (np.arange(cfg['FFTS_ON']) + np.arange(cfg['burst_pulses'])[:,None]*(cfg['FFTS_ON'] + cfg['FFTS_OFF'])).ravel()
             start_timestamp = datetime.datetime.utcfromtimestamp(burst['G'][0]['timestamp']) - datetime.timedelta(seconds=np.round(cfg['FFTS_ON']*scale_factor))
-            t_axis_full_seconds = np.arange(max_t_ind)*scale_factor + system_delay_samps_FD/fs
-            t_axis_full_timestamps = burst['G'][0]['timestamp'] - cfg['FFTS_ON']*scale_factor + t_axis_full_seconds
+            t0 = burst['G'][0]['timestamp'] - cfg['FFTS_ON']*scale_factor + system_delay_samps_FD/fs
 
-        # Spectrogram color limits    
-        clims = [-96, 0];
+        # Only the FFTs we actually have
+        n_cols = min(len(t_inds), np.shape(E)[1], np.shape(B)[1])
+        t_inds = t_inds[:n_cols]
 
         # Log-scaled magnitudes
-        Emag = 20*np.log10(np.abs(E))
+        with np.errstate(divide='ignore'):
+            Emag = 20*np.log10(np.abs(E[:, :n_cols]))
+            Bmag = 20*np.log10(np.abs(B[:, :n_cols]))
         Emag[np.isinf(Emag)] = -100
-        Bmag = 20*np.log10(np.abs(B))
         Bmag[np.isinf(Bmag)] = -100
-        # print(np.max(Emag), np.max(Bmag))
-        # Spaced spectrogram -- insert nans (or -120 for a blue background) in the empty spaces
-        E_spec_full = -120*np.ones([max_t_ind, 512])
-        B_spec_full = -120*np.ones([max_t_ind, 512])
 
-        a,b = np.meshgrid(t_inds, freq_inds)
+        # Spaced spectrogram -- only the enabled bins and "on" columns, plus a single row (column)
+        # standing in for each run of disabled bins ("off" time), at -120 for a blue background
+        t_edges, col_pos = _gapped_edges(t_inds, scale_factor, t0)
+        f_edges, row_pos = _gapped_edges(freq_inds, 40000/(nfft/2), 0)
+        # ...and a row above and below, to fill out 0 -- 40 kHz
+        f_edges = np.concatenate([[0], f_edges, [40000]])
+        row_pos += 1
+        E_spec = np.full((len(f_edges) - 1, len(t_edges) - 1), -120, dtype=np.float32)
+        B_spec = np.full((len(f_edges) - 1, len(t_edges) - 1), -120, dtype=np.float32)
+        E_spec[np.ix_(row_pos, col_pos)] = Emag
+        B_spec[np.ix_(row_pos, col_pos)] = Bmag
 
-        E_spec_full[a,b] = Emag
-        B_spec_full[a,b] = Bmag
-        E_spec_full = E_spec_full.T
-        B_spec_full = B_spec_full.T          
-        
         # Plots!
-        pe = E_FD.pcolormesh(t_axis_full_timestamps, f_axis_full/1000, E_spec_full, cmap = cm, vmin=e_clims[0], vmax=e_clims[1])
-        pb = B_FD.pcolormesh(t_axis_full_timestamps, f_axis_full/1000, B_spec_full, cmap = cm, vmin=b_clims[0], vmax=b_clims[1])
+        pe = E_FD.pcolorfast(t_edges, f_edges/1000, E_spec, cmap = cm, vmin=e_clims[0], vmax=e_clims[1])
+        pb = B_FD.pcolorfast(t_edges, f_edges/1000, B_spec, cmap = cm, vmin=b_clims[0], vmax=b_clims[1])
 
         # Axis labels and ticks. Label the burst start time, and the GPS timestamps.
-        xtix = [t_axis_full_timestamps[0]]
+        xtix = [t_edges[0]]
         xtix.extend([x['timestamp'] for x in burst['G']])
-        minorticks = np.arange(np.ceil(t_axis_full_timestamps[0]), t_axis_full_timestamps[-1], 5)  # minor tick marks -- 5 seconds
+        minorticks = np.arange(np.ceil(t_edges[0]), t_edges[-1], 5)  # minor tick marks -- 5 seconds
         E_FD.set_xticks(xtix)
         E_FD.set_xticks(minorticks, minor=True)
         B_FD.set_xticks(xtix)
@@ -402,6 +398,8 @@ def plot_burst_FD(fig, burst, cal_data = None):
             fig.suptitle('Frequency-Domain Burst\n%s - n = %d, %d on / %d off'
                 %(start_timestamp, cfg['burst_pulses'], sec_on, sec_off))
 
+    return fig, pe, pb
+
 if __name__ == '__main__':
 
 
@@ -1,10 +1,10 @@
-from mpl_toolkits.basemap import Basemap
 import numpy as np
 import datetime
 import logging
 from compute_ground_track import compute_ground_track
 from matplotlib.cm import get_cmap
 from configparser import ConfigParser
+from plots.map_background import draw_map_background
 
 def plot_burst_map(fig, gps_data, 
         show_terminator = True, plot_trajectory=True, show_transmitters=True,
@@ -14,7 +14,8 @@ def plot_burst_map(fig, gps_data,
 
     m_ax = fig.add_subplot(1,1,1)
 
-    m = Basemap(projection='mill',lon_0=0,ax=m_ax, llcrnrlon=-180,llcrnrlat=-70,urcrnrlon=180,urcrnrlat=70)
+    # Static layers come from a cached raster; only the points get projected and drawn here
+    m = draw_map_background(m_ax)
 
     lats = [x['lat'] for x in gps_data]
     lons = [x['lon'] for x in gps_data]
@@ -22,18 +23,12 @@ def plot_burst_map(fig, gps_data,
 
     sx,sy = m(lons, lats)
 
-    m.drawcoastlines(color='k',linewidth=1,ax=m_ax);
-    m.drawparallels(np.arange(-90,90,30),labels=[1,0,0,0]);
-    m.drawmeridians(np.arange(m.lonmin,m.lonmax+30,60),labels=[0,0,1,0]);
-    m.drawmapboundary(fill_color='cyan');
-    m.fillcontinents(color='white',lake_color='cyan');
-
     if show_terminator:
         try:
             # Find the median timestamp to use:
             avg_ts = np.mean([k['timestamp'] for k in gps_data if k['time_status'] > 20])
 
-            CS=m.nightshade(datetime.datetime.utcfromtimestamp(avg_ts))
+            CS=m.nightshade(datetime.datetime.utcfromtimestamp(avg_ts), ax=m_ax)
         except:
             logger.warning('Problem plotting day/night terminator')
 
@@ -66,9 +61,9 @@ def plot_burst_map(fig, gps_data,
 
             mid_ind = np.argmin(np.abs(np.array(tvec) - t_mid))
             zx,zy = m(tlons, tlats)
-            z = m.scatter(zx,zy,c=simtime, marker='.', s=10, alpha=0.5, cmap = get_cmap('plasma'), zorder=100, label='TLE')
+            z = m_ax.scatter(zx,zy,c=simtime, marker='.', s=10, alpha=0.5, cmap = get_cmap('plasma'), zorder=100, label='TLE')
 
-            z2 =m.scatter(zx[mid_ind], zy[mid_ind],edgecolor='k', marker='*',s=50, zorder=101, label='Center (TLE)')
+            z2 =m_ax.scatter(zx[mid_ind], zy[mid_ind],edgecolor='k', marker='*',s=50, zorder=101, label='Center (TLE)')
         except:
             logger.warning('Problem plotting ground track from TLE')
 
@@ -88,12 +83,12 @@ def plot_burst_map(fig, gps_data,
                 tx_lat  = float(vv[1])
                 tx_lon  = float(vv[2])
                 px,py = m(tx_lon, tx_lat)
-                p = m.scatter(px,py, marker='p', s=20, color='r',zorder=99)
+                p = m_ax.scatter(px,py, marker='p', s=20, color='r',zorder=99)
                 name_str = '{:s}  \n{:0.1f}  '.format(tx_name.upper(), tx_freq/1000)
                 m_ax.text(px, py, name_str, fontsize=8, fontweight='bold', ha='left',
                     va='bottom', color='k', label='TX')
             p.set_label('TX')
-            s = m.scatter(sx,sy,c=T_gps, marker='o', s=20, cmap = get_cmap('plasma'), zorder=100, label='GPS')
+            s = m_ax.scatter(sx,sy,c=T_gps, marker='o', s=20, cmap = get_cmap('plasma'), zorder=100, label='GPS')
         except:
             logger.warning('Problem plotting narrowband transmitters')
     m_ax.legend()
@@ -5,25 +5,13 @@ import datetime
 import matplotlib.gridspec as GS
 import matplotlib.dates as mdates
 from plots.parula_colormap import parula
+from plots.survey_pyramid import SurveyPyramid, datenum_to_epoch
 import logging
 import os
-import pickle
 
-try:
-    from mpl_toolkits.basemap import Basemap
-except:
-    # Basemap has trouble finding proj_lib correctly - here's an automated fix
-    import os
-    import conda
-
-    conda_file_dir = conda.__file__
-    conda_dir = conda_file_dir.split('lib')[0]
-    proj_lib = os.path.join(os.path.join(conda_dir, 'share'), 'proj')
-    os.environ["PROJ_LIB"] = proj_lib
-    from mpl_toolkits.basemap import Basemap
-
-
-from scipy.interpolate import interp1d, interp2d
+from plots.map_background import draw_map_background
+from lshell_handlers import lshell
+from scipy.interpolate import interp1d
 from matplotlib.cm import get_cmap
 from mpl_toolkits.basemap.solar import daynight_terminator
 
@@ -48,14 +36,10 @@ def is_day(t, lats, lons):
 def plot_survey_data_and_metadata(fig, S_data,
                 plot_map=True, bus_timestamps=False, t1=None, t2=None,
                 line_plots = ['Lshell','altitude','velocity','lat','lon','used_sats','solution_status','solution_type'],
-                show_plots=False, lshell_file = 'resources/Lshell_dict.pkl', cal_file = None, E_gain=False, B_gain=False):
+                show_plots=False, lshell_file = 'resources/Lshell_dict.pkl', cal_file = None, E_gain=False, B_gain=False, blit_map=True):
 
     logger = logging.getLogger()
 
-    if plot_map:
-        from mpl_toolkits.basemap import Basemap
-        from scipy.interpolate import interp1d, interp2d
-
     if plot_map or (len(line_plots) > 0):
         # The full plot: 
         gs_root = GS.GridSpec(2, 2, height_ratios=[1,2.5], width_ratios=[1,1.5],  wspace = 0.2, hspace = 0.1, figure=fig)
@@ -127,22 +111,28 @@ def plot_survey_data_and_metadata(fig, S_data,
     e_cbax = fig.add_subplot(gs_data[0,1])
     b_cbax = fig.add_subplot(gs_data[1,1])
 
+    # The line plots' axes are made (and their x limits linked to the spectrograms') up
+    # front, so the spectrograms' zoom callbacks get connected on them too
+    ax_lines = []
+    if len(line_plots) > 0:
+        gs_lineplots = GS.GridSpecFromSubplotSpec(len(line_plots), 1, hspace=0.5, subplot_spec=gs_root[1,0])
+        for ind, a in enumerate(line_plots):
+            ax_lines.append(fig.add_subplot(gs_lineplots[ind]))
+            ax1.get_shared_x_axes().join(ax1, ax_lines[-1])
+
     e_clims = [50,255] #[0,255] #[-80,-40]
     b_clims = [150,255] #[0,255] #[-80,-40]
 
-    date_edges = np.insert(dates, 0, dates[0] - datetime.timedelta(seconds=26))
-
-    # Insert columns of NaNs wherever we have gaps in data (dt > 27 sec)
+    # Multi-resolution copies of the spectrograms: each redraw only uses as many columns
+    # as there are pixels across. Gaps in the data (dt > 28 sec) are left blank.
     per_sec = 26 # Might want to look this up for the shorter survey modes
-    gaps = np.where(np.diff(date_edges) > datetime.timedelta(seconds=(per_sec+2)))[0]
-
-    d_gapped = np.insert(dates, gaps, dates[gaps] - datetime.timedelta(seconds=per_sec + 3))
-    E_gapped = np.insert(E.astype('float'), gaps - 1, np.nan*np.ones([1,512]), axis=0)
-    B_gapped = np.insert(B.astype('float'), gaps - 1, np.nan*np.ones([1,512]), axis=0)
+    F_edges = np.arange(513)*40/512
+    E_pyramid = SurveyPyramid(T, E, per_sec=per_sec, reduce='max')
+    B_pyramid = SurveyPyramid(T, B, per_sec=per_sec, reduce='max')
 
-    # Plot E data
-    p1 = ax1.pcolormesh(d_gapped,F,E_gapped.T, vmin=e_clims[0], vmax=e_clims[1], shading='flat', cmap = cm);
-    p2 = ax2.pcolormesh(d_gapped,F,B_gapped.T, vmin=b_clims[0], vmax=b_clims[1], shading='flat', cmap = cm);
+    # Plot E and B data
+    p1 = E_pyramid.attach(ax1, F_edges, cmap=cm, vmin=e_clims[0], vmax=e_clims[1])
+    p2 = B_pyramid.attach(ax2, F_edges, cmap=cm, vmin=b_clims[0], vmax=b_clims[1])
     cb1 = fig.colorbar(p1, cax = e_cbax)
     cb2 = fig.colorbar(p2, cax = b_cbax)
     cb1.set_label(f'Raw value [{e_clims[0]}-{e_clims[1]}]')
@@ -170,75 +160,93 @@ def plot_survey_data_and_metadata(fig, S_data,
     # -----------------------------------
 
     if plot_map:
-        m = Basemap(projection='mill',lon_0=0,ax=m_ax, llcrnrlon=-180,llcrnrlat=-70,urcrnrlon=180,urcrnrlat=70)
+        # Static layers come from a cached raster; only the points get projected and drawn here
+        m = draw_map_background(m_ax)
         lats = [x['GPS'][0]['lat'] for x in S_with_GPS]
         lons = [x['GPS'][0]['lon'] for x in S_with_GPS]
 
         sx,sy = m(lons, lats)
-
-
-        m.drawcoastlines(color='k',linewidth=1,ax=m_ax);
-        m.drawparallels(np.arange(-90,90,30),labels=[1,0,0,0]);
-        m.drawmeridians(np.arange(m.lonmin,m.lonmax+30,60),labels=[0,0,1,0]);
-        m.drawmapboundary(fill_color='cyan');
-        m.fillcontinents(color='white',lake_color='cyan');
-
-        # This is sloppy -- we need to stash the scatterplot in a persistent object,
-        # but because this is just a script and not a class, it vanishes. So we're
-        # sticking it into the top figure for now. (This is so we can update the point
-        # visibility when zooming in and out in the GUI)
-        m_ax.s = m.scatter(sx,sy,c=T_gps, marker='.', s=10, cmap = get_cmap('plasma'), zorder=100, picker=5)
-        
-        hits = np.where(dates >= datetime.datetime(1979,1,1,0,0,0))
+        offsets = np.column_stack([sx, sy])
+
+        # One scatter artist for the whole ground track; zooming just changes which slice of
+        # the (time-sorted) points it shows. It's stashed on the map axis so it outlives this
+        # function (the GUI keeps the figure, not our locals).
+        use_blit = blit_map and getattr(fig.canvas, 'supports_blit', False)
+        m_ax.s = m_ax.scatter(sx,sy,c=T_gps, marker='.', s=10, cmap = get_cmap('plasma'), zorder=100, picker=5,
+                              animated=use_blit)
+        m_ax.s.set_clim(T_gps[0], T_gps[-1])
+        shown = {'i0': 0, 'i1': len(T_gps), 'background': None}
+
+        def redraw_points():
+            if use_blit and shown['background'] is not None:
+                fig.canvas.restore_region(shown['background'])
+                m_ax.draw_artist(m_ax.s)
+                fig.canvas.blit(m_ax.bbox)
+            else:
+                fig.canvas.draw_idle()
+
+        def ondraw(event):
+            # A full redraw leaves the (animated) points out -- grab the clean map, then add them
+            shown['background'] = fig.canvas.copy_from_bbox(m_ax.bbox)
+            m_ax.draw_artist(m_ax.s)
 
         # Enable click events on the map:
         def onpick(event):
             ''' Event handler for a point click '''
+            if event.artist is not m_ax.s:
+                return
             ind = event.ind
-            t_center = dates[ind[0]]
+            t_center = datetime.datetime.utcfromtimestamp(T_gps[shown['i0'] + ind[0]])
             logger.info(f't = {t_center}')
             ax_lines[-1].set_xlim(t_center - datetime.timedelta(minutes=15), t_center + datetime.timedelta(minutes=15))
             onzoom(ax1)
-            fig.canvas.draw()
-
+            fig.canvas.draw_idle()
 
         def onzoom(axis, *args, **kwargs):
             # Update the map to only show points within range:
-            [tt1, tt2] = axis.get_xlim()
-            d1 = mdates.num2date(tt1)
-            d2 = mdates.num2date(tt2)
-            hits = np.where((dts_gps >= d1) & (dts_gps <= d2))[0]
-            
-            logger.debug(f'zoomed to {d1}, {d2} ({len(hits)} hits)')
-            try:
-                m_ax.s.remove()
-            except:
-                logger.debug('failed to remove scatter points')
-
-            m_ax.s = m.scatter(np.array(sx)[hits],np.array(sy)[hits],c=T_gps[hits], marker='.', s=10, cmap = get_cmap('plasma'), zorder=100, picker=5)
-
-        # Attach callback
+            tt1, tt2 = datenum_to_epoch(axis.get_xlim())
+            i0 = np.searchsorted(T_gps, tt1, side='left')
+            i1 = np.searchsorted(T_gps, tt2, side='right')
+            if (i0, i1) == (shown['i0'], shown['i1']):
+                return
+            logger.debug(f'zoomed to {tt1}, {tt2} ({i1 - i0} hits)')
+
+            m_ax.s.set_offsets(offsets[i0:i1])
+            m_ax.s.set_array(T_gps[i0:i1])
+            shown['i0'], shown['i1'] = i0, i1
+            redraw_points()
+
+        # Attach callbacks
         ax1.callbacks.connect('xlim_changed', onzoom)
         # ax2.callbacks.connect('xlim_changed', onzoom)
+        if use_blit:
+            fig.canvas.mpl_connect('draw_event', ondraw)
 
         cid= fig.canvas.mpl_connect('pick_event', lambda event: onpick(event))
     # -----------------------------------
     # Line plots
     # -----------------------------------
     if len(line_plots) > 0:
-        gs_lineplots = GS.GridSpecFromSubplotSpec(len(line_plots), 1, hspace=0.5, subplot_spec=gs_root[1,0])
-
-        ax_lines = []
-
-        for ind, a in enumerate(line_plots):
-            ax_lines.append(fig.add_subplot(gs_lineplots[ind]))
-
         markersize = 4
         markerface = '.'
         markeralpha= 0.6
         for ind, a in enumerate(line_plots):
             
-            if a in S_with_GPS[0]['GPS'][0]:
+            if a in 'Lshell':
+                try:
+                    # Attached when the products were decoded; otherwise, from the precomputed lookup table
+                    if all('Lshell' in x['GPS'][0] for x in S_with_GPS):
+                        Lshell = np.array([x['GPS'][0]['Lshell'] for x in S_with_GPS])
+                    else:
+                        Lshell = lshell([x['GPS'][0]['lat'] for x in S_with_GPS],
+                                        [x['GPS'][0]['lon'] for x in S_with_GPS], lshell_file)
+
+                    ax_lines[ind].plot(dts_gps, Lshell,markerface, markersize=markersize,  alpha=markeralpha, label='L shell')
+                    ax_lines[ind].set_ylabel('L shell', rotation=0, labelpad=30)
+                    ax_lines[ind].set_ylim([1,8])
+                except OSError:
+                    logger.warning(f'Missing {lshell_file}')
+            elif a in S_with_GPS[0]['GPS'][0]:
                 yvals = np.array([x['GPS'][0][a] for x in S_with_GPS])
                 ax_lines[ind].plot(dts_gps, yvals,markerface, markersize=markersize, label=a, alpha=markeralpha)
                 ax_lines[ind].set_ylabel(a, rotation=0, labelpad=30)
@@ -258,19 +266,6 @@ def plot_survey_data_and_metadata(fig, S_data,
                 ax_lines[ind].plot(dts_gps, vel, markerface, markersize=markersize, alpha=markeralpha, label='Velocity')
                 ax_lines[ind].set_ylabel('Velocity\n[km/sec]', rotation=0, labelpad=30)
                 ax_lines[ind].set_ylim([5,10])
-            elif a in 'Lshell':
-                try:
-                    # This way using a precomputed lookup table:
-                    with open(lshell_file,'rb') as file:
-                        Ldict = pickle.load(file)
-                    L_interp = interp2d(Ldict['glon'], Ldict['glat'], Ldict['L'], kind='cubic')
-                    Lshell = np.array([L_interp(x,y) for x,y in zip(lons, lats)])
-                    
-                    ax_lines[ind].plot(dts_gps, Lshell,markerface, markersize=markersize,  alpha=markeralpha, label='L shell')
-                    ax_lines[ind].set_ylabel('L shell', rotation=0, labelpad=30)
-                    ax_lines[ind].set_ylim([1,8])
-                except:
-                    logger.warning(f'Missing {lshell_file}')
             elif a in 'daylight':
                 # Day or night based on ground track, using the daynight terminator from Basemap
                 dayvec = np.array([is_day(x, y, z) for x,y,z in zip(dts_gps, lats, lons)])
@@ -284,15 +279,6 @@ def plot_survey_data_and_metadata(fig, S_data,
 
         for a in ax_lines[:-1]:
             a.set_xticklabels([])
-            
-        # Link line plot x axes:
-        for a in ax_lines:
-            ax_lines[0].get_shared_x_axes().join(ax_lines[0], a)
-
-
-        # Link data x axes:
-        ax_lines[0].get_shared_x_axes().join(ax_lines[0], ax1)
-        ax_lines[0].get_shared_x_axes().join(ax_lines[0], ax2)
 
         ax_lines[-1].set_xticklabels(ax_lines[-1].get_xticklabels(), rotation=30)
         ax_lines[-1].xaxis.set_major_formatter(formatter)
@@ -0,0 +1,110 @@
+import numpy as np
+import collections
+import functools
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+def _hash_array(h, arr, chunk=1<<22):
+    ''' Feeds an array into a hash a piece at a time (memmapped bursts aren't read in all at once) '''
+    arr = np.asarray(arr)
+    h.update(f'{arr.dtype.str}{arr.shape}'.encode())
+    flat = arr.reshape(-1)
+    for k in range(0, len(flat), chunk):
+        h.update(np.ascontiguousarray(flat[k:k + chunk]).tobytes())
+
+def burst_fingerprint(burst):
+    ''' A digest of a burst's configuration, data, and GPS timestamps: equal for
+        the same burst however it got loaded (decoded, or read back from a file) '''
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr(sorted(burst['config'].items())).encode())
+    for channel in ['E', 'B']:
+        _hash_array(h, burst.get(channel, []))
+    h.update(repr([g.get('timestamp') for g in burst.get('G', [])]).encode())
+    return h.hexdigest()
+
+def spectrogram_key(fingerprint, channel, coef, fs, nfft, noverlap, window):
+    ''' Cache key for a spectrogram of some channel(s). coef carries the calibration. '''
+    params = f'{fingerprint}|{channel}|{coef!r}|{fs!r}|{int(nfft)}|{int(noverlap)}|{window}'
+    return hashlib.blake2b(params.encode(), digest_size=16).hexdigest()
+
+class SpectrogramCache():
+    ''' Computed spectrograms -- tuples of arrays, e.g. (ff, tt, S_mag) -- by key.
+
+        The most recent max_items are kept in memory. With a cache_dir, every entry is
+        also written there as an .npz, so they survive between sessions; a memory miss
+        checks the disk before computing.
+    '''
+    def __init__(self, max_items=16, cache_dir=None):
+        self.max_items = max_items
+        self.cache_dir = cache_dir
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.npz')
+
+    def _remember(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_items:
+                self.entries.popitem(last=False)
+
+    def get(self, key):
+        ''' The cached value for key, or None '''
+        logger = logging.getLogger(__name__ + '.get')
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        if self.cache_dir is not None and os.path.exists(self._path(key)):
+            try:
+                with np.load(self._path(key)) as f:
+                    value = tuple(f[f'a{k}'] for k in range(len(f.files)))
+                logger.debug(f'loaded {key} from disk')
+                self._remember(key, value)
+                return value
+            except Exception as e:
+                logger.warning(f'failed to read cached spectrogram {key}: {e}')
+        return None
+
+    def put(self, key, value):
+        ''' Stores value (a tuple of arrays) under key '''
+        logger = logging.getLogger(__name__ + '.put')
+        self._remember(key, value)
+        if self.cache_dir is not None:
+            # Write to a temporary file and move it into place, so a reader never sees half a file
+            tmp = None
+            try:
+                fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.npz')
+                with os.fdopen(fd, 'wb') as file:
+                    np.savez(file, **{f'a{k}': v for k, v in enumerate(value)})
+                os.replace(tmp, self._path(key))
+            except Exception as e:
+                logger.warning(f'failed to write cached spectrogram {key}: {e}')
+            finally:
+                if tmp is not None and os.path.exists(tmp):
+                    os.remove(tmp)
+
+    def get_or_compute(self, key, compute):
+        ''' The cached value for key; if there isn't one, compute() it and cache it '''
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+@functools.lru_cache(maxsize=None)
+def get_cache(cache_dir=None):
+    ''' The shared cache for a cache directory (None: memory only) '''
+    return SpectrogramCache(cache_dir=cache_dir)
@@ -0,0 +1,121 @@
+import numpy as np
+import datetime
+import logging
+import matplotlib.dates as mdates
+from matplotlib.image import PcolorImage
+
+def epoch_to_datenum(t):
+    ''' Unix timestamps -> matplotlib date numbers (works with either date epoch) '''
+    return mdates.date2num(datetime.datetime(1970,1,1)) + np.asarray(t, dtype=float)/86400.
+
+def datenum_to_epoch(d):
+    ''' matplotlib date numbers -> unix timestamps '''
+    return (np.asarray(d, dtype=float) - mdates.date2num(datetime.datetime(1970,1,1)))*86400.
+
+def _pool_columns(values, reduce):
+    ''' Halves the number of columns, by max or mean over adjacent pairs (ignoring NaNs) '''
+    n = values.shape[0]
+    if n % 2:
+        values = np.concatenate([values, np.full((1,) + values.shape[1:], np.nan, dtype=values.dtype)])
+    a = values[0::2]
+    b = values[1::2]
+    if reduce == 'max':
+        return np.fmax(a, b)
+    # NaN-ignoring mean
+    total = np.where(np.isnan(a), 0, a) + np.where(np.isnan(b), 0, b)
+    count = (~np.isnan(a)).astype(values.dtype) + (~np.isnan(b))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return total/count
+
+class SurveyPyramid():
+    ''' A multi-resolution copy of a survey spectrogram, for drawing big stretches of data.
+
+        Level 0 holds every survey column, with a NaN column filling each gap in the data;
+        each level above it pools adjacent pairs of columns of the one below (max, to keep
+        short-lived signals visible, or mean), down to a few hundred columns. Built once,
+        then attach() an axis, and every change in x limits redraws from whichever level
+        has about one column per screen pixel, for just the part that's in view.
+
+        t:    column timestamps (unix seconds, sorted)
+        data: (columns, frequency bins) array
+        per_sec: nominal seconds per survey column; spacings over per_sec + 2 are gaps
+    '''
+    def __init__(self, t, data, per_sec=26, reduce='max', min_columns=256):
+        logger = logging.getLogger(__name__ + '.SurveyPyramid')
+        t = np.asarray(t, dtype=float)
+        data = np.asarray(data, dtype=np.float32)
+
+        # Each column spans back to the previous one; after a gap (or at the start),
+        # back one nominal column width, with a NaN column covering the rest of the gap
+        starts = np.empty_like(t)
+        starts[0] = t[0] - per_sec
+        starts[1:] = t[:-1]
+        gaps = np.flatnonzero(np.diff(t) > per_sec + 2) + 1
+        starts[gaps] = t[gaps] - per_sec
+
+        edges = np.insert(t, 0, starts[0])
+        edges = np.insert(edges, gaps + 1, starts[gaps])
+        values = np.insert(data, gaps, np.nan, axis=0)
+
+        self.reduce = reduce
+        self.levels = [(edges, values)]
+        while self.levels[-1][1].shape[0] > min_columns:
+            edges, values = self.levels[-1]
+            self.levels.append((edges[::2] if len(edges) % 2 else np.append(edges[::2], edges[-1]),
+                                _pool_columns(values, reduce)))
+        logger.debug(f'{len(t)} columns, {len(gaps)} gaps, {len(self.levels)} levels')
+
+    def level_for(self, t1, t2, n_pixels, oversample=1.5):
+        ''' The coarsest level that still has about one column per pixel between t1 and t2 '''
+        edges = self.levels[0][0]
+        n_cols = np.searchsorted(edges, t2) - np.searchsorted(edges, t1)
+        ratio = n_cols/max(n_pixels*oversample, 1)
+        level = int(np.ceil(np.log2(ratio))) if ratio > 1 else 0
+        return min(level, len(self.levels) - 1)
+
+    def window(self, level, t1, t2, margin=0.5):
+        ''' Columns of one level covering [t1, t2], plus margin (a fraction of the width)
+            either side, so small pans don't need a redraw. Returns (edges, values). '''
+        edges, values = self.levels[level]
+        pad = (t2 - t1)*margin
+        i0 = max(np.searchsorted(edges, t1 - pad, side='right') - 1, 0)
+        i1 = min(np.searchsorted(edges, t2 + pad, side='left') + 1, len(edges) - 1)
+        i1 = max(i1, i0 + 1)
+        return edges[i0:i1 + 1], values[i0:i1]
+
+    def attach(self, ax, freq_edges, cmap=None, vmin=None, vmax=None):
+        ''' Draws the pyramid on an axis (with a date x-axis), and keeps it matched to the
+            view from then on. Returns the image, which works with colorbars and set_clim. '''
+        edges, values = self.levels[0]
+        t1, t2 = edges[0], edges[-1]
+        n_pixels = ax.get_window_extent().width
+        level = self.level_for(t1, t2, n_pixels)
+        x, C = self.window(level, t1, t2)
+
+        im = PcolorImage(ax, epoch_to_datenum(x), freq_edges, np.ma.masked_invalid(C.T), cmap=cmap)
+        im.set_clim(vmin, vmax)
+        ax.add_image(im)
+        ax.update_datalim(np.array([[epoch_to_datenum(t1), freq_edges[0]], [epoch_to_datenum(t2), freq_edges[-1]]]))
+        ax.autoscale_view(tight=True)
+        ax.xaxis_date()
+
+        shown = {'level': level, 'span': (x[0], x[-1])}
+
+        def on_xlim_changed(axis):
+            a, b = datenum_to_epoch(ax.get_xlim())
+            a, b = max(a, t1), min(b, t2)
+            if a >= b:
+                return
+            lev = self.level_for(a, b, ax.get_window_extent().width)
+            if lev == shown['level'] and shown['span'][0] <= a and b <= shown['span'][1]:
+                # Already drawn at the right resolution
+                return
+            x, C = self.window(lev, a, b)
+            im.set_data(epoch_to_datenum(x), freq_edges, np.ma.masked_invalid(C.T))
+            shown['level'] = lev
+            shown['span'] = (x[0], x[-1])
+
+        # Zooming a shared axis only fires the callback on the axis that was zoomed
+        for other in ax.get_shared_x_axes().get_siblings(ax):
+            other.callbacks.connect('xlim_changed', on_xlim_changed)
+        return im
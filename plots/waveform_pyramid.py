@@ -0,0 +1,85 @@
+import numpy as np
+import logging
+
+class WaveformPyramid():
+    ''' A min/max envelope pyramid of a long time series, for line plots of millions of samples.
+
+        Level k > 0 holds the min and max of each block of 2**k samples (level 0 is the raw
+        data). Drawn as a line through each block's min and max, a level with about one block
+        per screen pixel looks the same as the full-resolution trace. Built once, then attach()
+        an axis, and every change in x limits redraws just the part in view, from whichever
+        level puts about two points per pixel on screen.
+
+        t: sample times (sorted)
+        y: samples
+    '''
+    def __init__(self, t, y, min_blocks=1024):
+        logger = logging.getLogger(__name__ + '.WaveformPyramid')
+        self.t = np.asarray(t, dtype=float)
+        self.y = np.asarray(y, dtype=np.float32)
+
+        # levels[k] = (block start times, block minima, block maxima); levels[0] is unused
+        self.levels = [None]
+        t, lo, hi = self.t, self.y, self.y
+        while len(t) > min_blocks:
+            if len(t) % 2:
+                t, lo, hi = np.append(t, t[-1]), np.append(lo, lo[-1]), np.append(hi, hi[-1])
+            t, lo, hi = t[::2], np.fmin(lo[::2], lo[1::2]), np.fmax(hi[::2], hi[1::2])
+            self.levels.append((t, lo, hi))
+        logger.debug(f'{len(self.t)} samples, {len(self.levels)} levels')
+
+    def level_for(self, t1, t2, n_pixels):
+        ''' The coarsest level that still has a block per pixel between t1 and t2 (or
+            the raw data, if it's only a couple of samples per pixel) '''
+        n = np.searchsorted(self.t, t2) - np.searchsorted(self.t, t1)
+        if n <= 2*n_pixels:
+            return 0
+        return min(int(np.floor(np.log2(n/max(n_pixels, 1)))), len(self.levels) - 1)
+
+    def segment(self, level, t1, t2, margin=0.5):
+        ''' Line vertices covering [t1, t2], plus margin (a fraction of the width) either
+            side, so small pans don't need a redraw. Returns (x, y). '''
+        pad = (t2 - t1)*margin
+        if level == 0:
+            t, y = self.t, self.y
+        else:
+            t = self.levels[level][0]
+        i0 = max(np.searchsorted(t, t1 - pad, side='right') - 1, 0)
+        i1 = min(np.searchsorted(t, t2 + pad, side='left') + 1, len(t))
+        if level == 0:
+            return t[i0:i1], y[i0:i1]
+
+        t, lo, hi = self.levels[level]
+        return np.repeat(t[i0:i1], 2), np.column_stack([lo[i0:i1], hi[i0:i1]]).ravel()
+
+    def attach(self, ax, **kwargs):
+        ''' Plots the series on an axis (kwargs go to ax.plot), and keeps it matched to
+            the view from then on -- including zooms in any axes sharing x with it. Returns the line. '''
+        if len(self.t) == 0:
+            return ax.plot([], [], **kwargs)[0]
+        t1, t2 = self.t[0], self.t[-1]
+        level = self.level_for(t1, t2, ax.get_window_extent().width)
+        x, y = self.segment(level, t1, t2)
+        line, = ax.plot(x, y, **kwargs)
+        ax.update_datalim(np.array([[t1, np.nanmin(y)], [t2, np.nanmax(y)]]))
+
+        shown = {'level': level, 'span': (x[0], x[-1])}
+
+        def on_xlim_changed(axis):
+            a, b = ax.get_xlim()
+            a, b = max(a, t1), min(b, t2)
+            if a >= b:
+                return
+            lev = self.level_for(a, b, ax.get_window_extent().width)
+            if lev == shown['level'] and shown['span'][0] <= a and b <= shown['span'][1]:
+                # Already drawn at the right resolution
+                return
+            x, y = self.segment(lev, a, b)
+            line.set_data(x, y)
+            shown['level'] = lev
+            shown['span'] = (x[0], x[-1])
+
+        # Zooming a shared axis only fires the callback on the axis that was zoomed
+        for other in ax.get_shared_x_axes().get_siblings(ax):
+            other.callbacks.connect('xlim_changed', on_xlim_changed)
+        return line
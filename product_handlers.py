@@ -0,0 +1,102 @@
+import numpy as np
+import logging
+from packet_handlers import merge_sorted_runs
+
+def bus_timestamp(p):
+    ''' The spacecraft bus (header) timestamp of a product '''
+    return p.get('header_timestamp')
+
+def gps_timestamp(p):
+    ''' The first GPS timestamp of a product, or None if it hasn't got one '''
+    gps = p.get('GPS')
+    if gps and isinstance(gps[0], dict):
+        return gps[0].get('timestamp')
+    return None
+
+class ProductCatalog():
+    ''' A list of data products (survey, burst, or status entries), plus sorted
+        bus-time and GPS-time indexes into it.
+
+        The products themselves stay in the order they were added, so positional
+        lookups (e.g., the burst listbox) keep working; range, min / max, and nearest
+        queries are binary searches on the time indexes. Products added later are
+        merged into the indexes, rather than re-sorting.
+    '''
+    def __init__(self, products=None):
+        self.products = []
+        self.index = {'bus': (np.zeros(0), np.zeros(0, dtype=int)),
+                      'gps': (np.zeros(0), np.zeros(0, dtype=int))}
+        if products:
+            self.extend(products)
+
+    def __len__(self):
+        return len(self.products)
+
+    def __iter__(self):
+        return iter(self.products)
+
+    def __getitem__(self, ind):
+        return self.products[ind]
+
+    def extend(self, products):
+        ''' Adds products to the end of the catalog, and merges them into the indexes '''
+        logger = logging.getLogger(__name__ + '.extend')
+        products = list(products)
+        if not products:
+            return
+        first = len(self.products)
+        self.products.extend(products)
+
+        for axis, get_time in (('bus', bus_timestamp), ('gps', gps_timestamp)):
+            times = [get_time(p) for p in products]
+            inds = np.array([first + i for i, t in enumerate(times) if t is not None], dtype=int)
+            times = np.array([t for t in times if t is not None], dtype=float)
+            order = np.argsort(times, kind='stable')
+            times, inds = times[order], inds[order]
+
+            old_times, old_inds = self.index[axis]
+            pos_a, pos_b = merge_sorted_runs(old_times, times)
+            merged_times = np.empty(len(old_times) + len(times))
+            merged_inds = np.empty(len(merged_times), dtype=int)
+            merged_times[pos_a] = old_times
+            merged_times[pos_b] = times
+            merged_inds[pos_a] = old_inds
+            merged_inds[pos_b] = inds
+            self.index[axis] = (merged_times, merged_inds)
+
+        logger.debug(f'{len(self.products)} products, {len(self.index["gps"][0])} with GPS time')
+
+    def append(self, p):
+        self.extend([p])
+
+    def _index(self, gps):
+        return self.index['gps' if gps else 'bus']
+
+    def time_range(self, t1=None, t2=None, gps=False):
+        ''' Products with t1 <= timestamp <= t2 (unix timestamps), in time order.
+            gps selects the GPS timestamp instead of the bus timestamp; products without
+            one are left out. '''
+        times, inds = self._index(gps)
+        a = 0 if t1 is None else np.searchsorted(times, t1, side='left')
+        b = len(times) if t2 is None else np.searchsorted(times, t2, side='right')
+        return [self.products[i] for i in inds[a:b]]
+
+    def t_min(self, gps=False):
+        ''' The earliest timestamp in the catalog, or None if it's empty '''
+        times, _ = self._index(gps)
+        return times[0] if len(times) else None
+
+    def t_max(self, gps=False):
+        ''' The latest timestamp in the catalog, or None if it's empty '''
+        times, _ = self._index(gps)
+        return times[-1] if len(times) else None
+
+    def nearest(self, t, gps=False):
+        ''' The product closest in time to t, or None if there aren't any '''
+        times, inds = self._index(gps)
+        if len(times) == 0:
+            return None
+        i = np.searchsorted(times, t)
+        if i == len(times) or (i > 0 and (t - times[i-1]) <= (times[i] - t)):
+            i -= 1
+        return self.products[inds[i]]
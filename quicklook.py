@@ -0,0 +1,307 @@
+''' Headless quick-look plots: a PNG for every burst, every burst map, and every day of
+    survey data, rendered with the same plotting code as the GUI -- no Tk, no display.
+
+    e.g., after a batch_process.py run:
+        python quicklook.py --survey output/survey_data.npz --burst output/burst_data.npz --out_dir quicklooks
+
+    Plots are rendered in parallel worker processes (optionally with a memory cap on each).
+    The output directory gets an index (quicklook_index.json) of the images, with a digest
+    of the data behind each one; re-running skips any image whose data hasn't changed.
+    A JSON summary is printed to stdout, or written to --summary.
+'''
+import os
+import sys
+import time
+import json
+import pickle
+import hashlib
+import logging
+import argparse
+import datetime
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from file_handlers import read_survey_XML, read_burst_XML, read_survey_matlab, read_burst_matlab, read_products_npz
+from batch_process import timed_stage, EXIT_OK, EXIT_FAILED, EXIT_NO_DATA
+
+INDEX_FILE = 'quicklook_index.json'
+
+# Bump to re-render everything after a change to the plots themselves
+RENDER_VERSION = 1
+
+KINDS = ['burst', 'burst_map', 'survey']
+
+FIGSIZES = {'burst': (12,8), 'burst_map': (12,7), 'survey': (12,8)}
+
+def load_products(fname, kind):
+    ''' Reads survey or burst products from an xml, mat, pkl, or npz file '''
+    if fname.endswith('.xml'):
+        return read_survey_XML(fname) if kind == 'survey' else read_burst_XML(fname)
+    if fname.endswith('.mat'):
+        return read_survey_matlab(fname) if kind == 'survey' else read_burst_matlab(fname)
+    if fname.endswith('.pkl'):
+        with open(fname, 'rb') as file:
+            return pickle.load(file)
+    if fname.endswith('.npz'):
+        return read_products_npz(fname)
+    raise ValueError(f'unknown file type: {fname}')
+
+def survey_fingerprint(S_data):
+    ''' A digest of a list of survey products (timestamps, data, and GPS) '''
+    h = hashlib.blake2b(digest_size=16)
+    for S in sorted(S_data, key=lambda S: S['header_timestamp']):
+        h.update(repr(S['header_timestamp']).encode())
+        h.update(np.ascontiguousarray(S['E_data']).tobytes())
+        h.update(np.ascontiguousarray(S['B_data']).tobytes())
+        if 'GPS' in S:
+            h.update(repr(sorted(S['GPS'][0].items())).encode())
+    return h.hexdigest()
+
+def file_digest(fname):
+    ''' Digest of a file's contents (or '' with no file) '''
+    if not fname or not os.path.exists(fname):
+        return ''
+    with open(fname, 'rb') as file:
+        return hashlib.blake2b(file.read(), digest_size=16).hexdigest()
+
+def _utc(t):
+    return datetime.datetime.utcfromtimestamp(t)
+
+def burst_start(burst):
+    ''' Timestamp to name a burst by: its first GPS stamp, or its header timestamp '''
+    if burst.get('G'):
+        return burst['G'][0]['timestamp']
+    return burst.get('header_timestamp', 0)
+
+def plan_tasks(survey, bursts, kinds, cal_file=None):
+    ''' One render task per image. Each task is a dict with the output file, what goes
+        in it, and a digest of everything the image depends on. '''
+    logger = logging.getLogger(__name__ + '.plan_tasks')
+    from plots.spectrogram_cache import burst_fingerprint
+
+    cal_digest = file_digest(cal_file)
+    tasks = []
+
+    for k, burst in enumerate(bursts):
+        t = burst_start(burst)
+        stem = f'{_utc(t):%Y%m%d_%H%M%S}_{k:03d}'
+        fingerprint = burst_fingerprint(burst)
+        if 'burst' in kinds:
+            tasks.append(dict(kind='burst', file=f'burst_{stem}.png', data=burst, t1=t, t2=t,
+                              digest=f'{RENDER_VERSION}:{fingerprint}:{cal_digest}'))
+        if 'burst_map' in kinds:
+            if burst.get('G'):
+                tasks.append(dict(kind='burst_map', file=f'burst_map_{stem}.png', data=burst['G'], t1=t, t2=t,
+                                  digest=f'{RENDER_VERSION}:{fingerprint}'))
+            else:
+                logger.info(f'burst {k} has no GPS data; no map')
+
+    if 'survey' in kinds and survey:
+        # One plot per UTC day
+        days = dict()
+        for S in survey:
+            days.setdefault(int(S['header_timestamp']//86400), []).append(S)
+        for day, S_data in sorted(days.items()):
+            tasks.append(dict(kind='survey', file=f'survey_{_utc(day*86400):%Y%m%d}.png', data=S_data,
+                              t1=day*86400, t2=(day + 1)*86400,
+                              digest=f'{RENDER_VERSION}:{survey_fingerprint(S_data)}:{cal_digest}'))
+    return tasks
+
+def init_worker(mem_limit_mb=None):
+    ''' Process pool initializer: caps the worker's address space '''
+    if mem_limit_mb:
+        try:
+            import resource
+            limit = int(mem_limit_mb)*1024*1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError) as e:
+            logging.getLogger(__name__ + '.init_worker').warning(f'could not set memory limit: {e}')
+
+def render(task):
+    ''' Renders one image. (A process pool task: task is one of plan_tasks' dicts, plus
+        out_dir and cal_data.) Returns (file, error message or None, seconds) '''
+    tic = time.perf_counter()
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    path = os.path.join(task['out_dir'], task['file'])
+    tmp = path + '.part'
+    try:
+        fig = Figure(figsize=FIGSIZES[task['kind']])
+        FigureCanvasAgg(fig)
+
+        if task['kind'] == 'burst':
+            from plots.plot_burst_data import plot_burst_TD, plot_burst_FD
+            if task['data']['config']['TD_FD_SELECT'] == 1:
+                plot_burst_TD(fig, task['data'], cal_data=task['cal_data'])
+            else:
+                plot_burst_FD(fig, task['data'], cal_data=task['cal_data'])
+        elif task['kind'] == 'burst_map':
+            from plots.plot_burst_map import plot_burst_map
+            plot_burst_map(fig, task['data'])
+        elif task['kind'] == 'survey':
+            from plots.plot_survey_data_and_metadata import plot_survey_data_and_metadata
+            plot_survey_data_and_metadata(fig, task['data'], blit_map=False)
+
+        # Write under a temporary name, so an interrupted run never leaves a partial image
+        fig.savefig(tmp, format='png')
+        os.replace(tmp, path)
+        error = None
+    except MemoryError:
+        error = 'MemoryError (over the worker memory limit?)'
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return task['file'], error, round(time.perf_counter() - tic, 4)
+
+def read_index(out_dir):
+    ''' The image index from a previous run, as {file: entry} '''
+    try:
+        with open(os.path.join(out_dir, INDEX_FILE), 'r') as f:
+            return {entry['file']: entry for entry in json.load(f)['images']}
+    except (OSError, ValueError, KeyError):
+        return dict()
+
+def write_index(out_dir, entries):
+    path = os.path.join(out_dir, INDEX_FILE)
+    with open(path + '.part', 'w') as f:
+        json.dump({'generated': datetime.datetime.utcnow().isoformat(),
+                   'images': sorted(entries.values(), key=lambda e: e['file'])}, f, indent=2)
+    os.replace(path + '.part', path)
+
+def run(args):
+    ''' Renders everything that's out of date. Returns (exit code, summary dictionary) '''
+    logger = logging.getLogger(__name__ + '.run')
+
+    summary = {'survey': args.survey, 'burst': args.burst, 'out_dir': args.out_dir,
+               'workers': args.workers, 'mem_limit_mb': args.mem_limit_mb,
+               'stages': dict(), 'rendered': [], 'skipped': 0, 'failed': dict()}
+    tic = time.perf_counter()
+
+    try:
+        with timed_stage(summary, 'load') as stage:
+            survey = load_products(args.survey, 'survey') if args.survey else []
+            bursts = load_products(args.burst, 'burst') if args.burst else []
+            stage['survey'] = len(survey)
+            stage['burst'] = len(bursts)
+
+            cal_data = None
+            if args.cal_file and 'burst' in args.kinds:
+                with open(args.cal_file, 'rb') as file:
+                    cal_data = pickle.load(file)
+
+        if not (survey or bursts):
+            logger.warning('No products to plot')
+            summary['status'] = 'no_data'
+            return EXIT_NO_DATA, summary
+
+        with timed_stage(summary, 'plan') as stage:
+            os.makedirs(args.out_dir, exist_ok=True)
+            index = read_index(args.out_dir)
+            tasks = plan_tasks(survey, bursts, args.kinds, cal_file=args.cal_file)
+
+            todo = [t for t in tasks if args.force
+                    or index.get(t['file'], dict()).get('digest') != t['digest']
+                    or not os.path.exists(os.path.join(args.out_dir, t['file']))]
+            summary['skipped'] = len(tasks) - len(todo)
+            stage['images'] = len(tasks)
+            stage['out_of_date'] = len(todo)
+            logger.info(f'{len(todo)} of {len(tasks)} images to render')
+
+        with timed_stage(summary, 'render') as stage:
+            for t in todo:
+                t['out_dir'] = args.out_dir
+                t['cal_data'] = cal_data if t['kind'] == 'burst' else None
+
+            workers = max(1, min(args.workers or os.cpu_count() or 1, len(todo) or 1))
+            if workers == 1 and not args.mem_limit_mb:
+                results = map(render, todo)
+                executor = None
+            else:
+                executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                               initargs=(args.mem_limit_mb,))
+                results = executor.map(render, todo)
+
+            by_file = {t['file']: t for t in todo}
+            try:
+                for fname, error, seconds in results:
+                    t = by_file[fname]
+                    if error:
+                        logger.warning(f'{fname}: {error}')
+                        summary['failed'][fname] = error
+                        index.pop(fname, None)
+                        continue
+                    logger.info(f'{fname} ({seconds:.2f} sec)')
+                    summary['rendered'].append(fname)
+                    index[fname] = {'file': fname, 'kind': t['kind'], 'digest': t['digest'],
+                                    't1': _utc(t['t1']).isoformat(), 't2': _utc(t['t2']).isoformat()}
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+                write_index(args.out_dir, index)
+            stage['images'] = len(summary['rendered'])
+            stage['failed'] = len(summary['failed'])
+
+    except Exception as e:
+        logger.exception('Quick-look rendering failed')
+        summary['status'] = 'failed'
+        summary['error'] = f'{type(e).__name__}: {e}'
+        return EXIT_FAILED, summary
+
+    finally:
+        summary['total_seconds'] = round(time.perf_counter() - tic, 4)
+
+    if summary['failed']:
+        summary['status'] = 'failed'
+        return EXIT_FAILED, summary
+    summary['status'] = 'ok'
+    return EXIT_OK, summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="VPM Ground Support Software -- headless quick-look plots")
+
+    parser.add_argument("--survey", type=str, default=None, help="survey products file (xml, mat, pkl, or npz)")
+    parser.add_argument("--burst", type=str, default=None, help="burst products file (xml, mat, pkl, or npz)")
+    parser.add_argument("--out_dir", "--output", "-o", type=str, default='quicklooks', help="output directory")
+    parser.add_argument("--kinds", nargs='+', choices=KINDS, default=KINDS, help="which plots to make")
+    parser.add_argument("--cal_file", "--cal", type=str, default=os.path.join('resources', 'calibration_data.pkl'),
+                        help="calibration data for burst plots (a .pkl file); '' to plot volts at the ADCs")
+    parser.add_argument("--workers", "-j", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--mem_limit_mb", type=int, default=None, help="address space limit for each worker, in MB")
+    parser.add_argument("--force", action='store_true', help="re-render images even if they're up to date")
+
+    parser.add_argument("--summary", type=str, default='-', help="where to write the JSON summary ('-' for stdout)")
+    parser.add_argument("--logfile", type=str, default=None, help="log filename. If not provided, output is logged to stderr")
+    parser.add_argument("--debug", action='store_true', help="Debug mode (extra chatty)")
+
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO, filename=args.logfile,
+                        format='[%(name)s]\t%(levelname)s\t%(message)s')
+    logging.getLogger('matplotlib').setLevel(logging.WARNING)
+
+    # Catch what we can before doing any work
+    if not (args.survey or args.burst):
+        parser.error('nothing to plot: give --survey and/or --burst')
+    for fname in [args.survey, args.burst]:
+        if fname and not os.path.exists(fname):
+            parser.error(f'cannot find {fname}')
+    if args.cal_file and not os.path.exists(args.cal_file):
+        logging.warning(f'cannot find calibration file {args.cal_file}; plotting volts at the ADCs')
+        args.cal_file = None
+
+    code, summary = run(args)
+    summary['exit_code'] = code
+
+    if args.summary == '-':
+        json.dump(summary, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.summary, 'w') as f:
+            json.dump(summary, f, indent=2)
+    return code
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import numpy as np
+import logging
+from data_handlers import decode_status_fields, decode_burst_command, decode_uBBR_command
+
+# Filled in for config fields that don't apply to a given command
+# (e.g., SAMPLES_ON for a frequency-domain burst)
+MISSING_INT = -1
+MISSING_STR = ''
+
+class StatusTable():
+    ''' Decoded status messages, held as one typed numpy column per field, sorted by
+        header_timestamp. Column names match the decode_status keys; the decoded burst
+        and uBBR configurations get flattened into 'burst_config.<key>' and
+        'bbr_config.<key>' columns.
+
+        Build one with StatusTable.from_packets (straight from raw packets), or
+        StatusTable.from_messages (from decode_status / read_status_XML output).
+    '''
+    def __init__(self, columns=None):
+        columns = dict() if columns is None else dict(columns)
+        if 'header_timestamp' in columns:
+            order = np.argsort(columns['header_timestamp'], kind='stable')
+            columns = {k: v[order] for k, v in columns.items()}
+        self.columns = columns
+
+    def __len__(self):
+        if 'header_timestamp' not in self.columns:
+            return 0
+        return len(self.columns['header_timestamp'])
+
+    def __getitem__(self, key):
+        return self.columns[key]
+
+    def __contains__(self, key):
+        return key in self.columns
+
+    def keys(self):
+        return self.columns.keys()
+
+    @classmethod
+    def from_packets(cls, packets):
+        ''' Decode every status packet in a list of packets, in one go '''
+        columns = decode_status_fields(packets)
+        columns.update(_config_columns(columns['prev_burst_command'], decode_burst_command, 'burst_config'))
+        columns.update(_config_columns(columns['prev_bbr_command'], decode_uBBR_command, 'bbr_config'))
+        return cls(columns)
+
+    @classmethod
+    def from_messages(cls, messages):
+        ''' Build a table from a list of status dictionaries '''
+        # Every key seen, in first-seen order (a dict, for constant-time membership tests)
+        keys = dict()
+        for m in messages:
+            for k, v in m.items():
+                if isinstance(v, dict):
+                    keys.update((f'{k}.{kk}', None) for kk in v)
+                else:
+                    keys[k] = None
+
+        columns = dict()
+        for key in keys:
+            if '.' in key:
+                outer, inner = key.split('.', 1)
+                values = [(m.get(outer) or {}).get(inner) for m in messages]
+            else:
+                values = [m.get(key) for m in messages]
+            columns[key] = _column(values)
+        return cls(columns)
+
+    def to_messages(self):
+        ''' Back to a list of decode_status-style dictionaries '''
+        lists = {k: (v if v.ndim > 1 else v.tolist()) for k, v in self.columns.items()}
+        out = []
+        for i in range(len(self)):
+            d = dict()
+            for k, v in lists.items():
+                if '.' in k:
+                    outer, inner = k.split('.', 1)
+                    if v[i] != MISSING_INT and v[i] != MISSING_STR:
+                        d.setdefault(outer, dict())[inner] = v[i]
+                else:
+                    d[k] = v[i]
+            out.append(d)
+        return out
+
+    def time_slice(self, t1=None, t2=None):
+        ''' The status messages with t1 <= header_timestamp <= t2 (unix timestamps) '''
+        t = self.columns['header_timestamp']
+        a = 0 if t1 is None else np.searchsorted(t, t1, side='left')
+        b = len(t) if t2 is None else np.searchsorted(t, t2, side='right')
+        return StatusTable({k: v[a:b] for k, v in self.columns.items()})
+
+    def where(self, mask):
+        ''' The status messages selected by a boolean mask (or index array) '''
+        return StatusTable({k: v[mask] for k, v in self.columns.items()})
+
+    def downsample(self, key, max_points=2000):
+        ''' Returns (timestamps, values) for one field, thinned out for plotting.
+
+            Repeated values are dropped first (so step plots are unchanged). If that's
+            still more than max_points, what's left is binned, keeping the minimum and
+            maximum of each bin in time order. (Columns without an ordering -- strings,
+            or more than one value per message -- just keep the first point of each bin.)
+        '''
+        t = self.columns['header_timestamp']
+        v = self.columns[key]
+        if len(t) <= max_points:
+            return t, v
+
+        # Keep the change points, and the last point
+        keep = np.ones(len(v), dtype=bool)
+        keep[1:-1] = np.any((v[1:-1] != v[:-2]).reshape(len(v) - 2, -1), axis=1)
+        inds = np.flatnonzero(keep)
+
+        if len(inds) > max_points:
+            if v.ndim > 1 or v.dtype.kind not in 'biuf':
+                edges = np.linspace(0, len(inds), max_points + 1).astype(int)
+                inds = inds[np.unique(edges[:-1])]
+                return t[inds], v[inds]
+
+            n_bins = max(max_points//2, 1)
+            edges = np.linspace(0, len(inds), n_bins + 1).astype(int)
+            vals = v[inds]
+            mins = np.minimum.reduceat(vals, edges[:-1])
+            maxs = np.maximum.reduceat(vals, edges[:-1])
+            pick = []
+            for a, b, lo, hi in zip(edges[:-1], edges[1:], mins, maxs):
+                seg = vals[a:b]
+                i_lo = a + int(np.argmax(seg == lo))
+                i_hi = a + int(np.argmax(seg == hi))
+                pick.extend(sorted({i_lo, i_hi}))
+            inds = inds[pick]
+
+        return t[inds], v[inds]
+
+    def datetimes(self, t=None):
+        ''' Timestamps (default: every header_timestamp) as datetime64, for plotting '''
+        if t is None:
+            t = self.columns['header_timestamp']
+        return (np.asarray(t)*1e6).astype('datetime64[us]')
+
+    def save(self, filename):
+        ''' Saves the table to a compressed .npz file '''
+        np.savez_compressed(filename, **self.columns)
+
+    @classmethod
+    def load(cls, filename):
+        ''' Loads a table written by StatusTable.save '''
+        with np.load(filename, allow_pickle=False) as f:
+            return cls({k: f[k] for k in f.files})
+
+def _column(values):
+    ''' A typed numpy column from a list of per-message values, with None filled in '''
+    present = [v for v in values if v is not None]
+    if not present:
+        return np.full(len(values), MISSING_INT)
+    if isinstance(present[0], str):
+        return np.array([MISSING_STR if v is None else v for v in values])
+    if isinstance(present[0], (list, tuple, np.ndarray)):
+        width = len(present[0])
+        return np.array([np.zeros(width) if v is None else v for v in values], dtype=np.asarray(present[0]).dtype)
+    col = np.array(present)
+    if len(present) < len(values):
+        dtype = col.dtype
+        if dtype.kind in 'bu':
+            # Somewhere for MISSING_INT to go without wrapping around (or turning True)
+            dtype = np.result_type(dtype, np.int8)
+        fill = np.nan if dtype.kind in 'fc' else MISSING_INT
+        col = np.array([fill if v is None else v for v in values], dtype=dtype)
+    return col
+
+def _config_columns(commands, decoder, prefix):
+    ''' Columns of decoded configuration, from an (N, 3) array of command bytes.
+        Each distinct command is only decoded once. '''
+    logger = logging.getLogger(__name__ + '._config_columns')
+
+    words = (commands[:,0].astype(np.int64) << 16) | (commands[:,1].astype(np.int64) << 8) | commands[:,2]
+    unique_words, inverse = np.unique(words, return_inverse=True)
+    logger.debug(f'{len(unique_words)} distinct {prefix} commands')
+
+    configs = [decoder([(w >> 16) & 0xFF, (w >> 8) & 0xFF, w & 0xFF]) for w in unique_words.tolist()]
+    columns = dict()
+    for cfg in configs:
+        for k in cfg:
+            key = f'{prefix}.{k}'
+            if key not in columns:
+                columns[key] = _column([c.get(k) for c in configs])[inverse.ravel()]
+    return columns